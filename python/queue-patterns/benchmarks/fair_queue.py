@@ -0,0 +1,151 @@
+# Benchmark fair queueing in its two modes: two_hop, where each job is a concurrency
+# manager workflow on the partitioned queue that runs the job's work on the
+# concurrency queue, and single_queue, where the fair scheduler starts each job's work
+# directly from one queue.
+
+# For each mode, we create the system database afresh, start the app, and submit a
+# synthetic load of --items jobs across --tenants tenants, skewed by --skew, each
+# job's work taking --work-seconds. Until every job has finished, we sample how many
+# workflows are running and how many of them are doing work rather than waiting on
+# it. We report jobs per second, the rows written to the system database, the peak
+# number of running workflows, each holding a worker thread, and slot utilization:
+# the average number of jobs doing work, as a fraction of the global limit.
+
+# Usage: python3 -m benchmarks.fair_queue --items 200 --tenants 20
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import sqlalchemy as sa
+
+app_script = Path(__file__).parent.parent / "main.py"
+APP_URL = "http://localhost:8000"
+# The global limit on running jobs in both modes
+FAIR_QUEUE_CONCURRENCY = 4
+
+
+def create_database(url: str):
+    if url.startswith("sqlite"):
+        path = Path(sa.make_url(url).database)
+        for suffix in (
+            "",
+            "-wal",
+            "-shm",
+            ".fair-scheduler.lock",
+            ".fair-scheduler.lock-journal",
+        ):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+    else:
+        engine = sa.create_engine(url)
+        with engine.begin() as connection:
+            connection.execute(sa.text("DROP SCHEMA IF EXISTS dbos CASCADE"))
+        engine.dispose()
+
+
+def wait_for_app(timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{APP_URL}/api/fair_queue/pipeline")
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"App not up after {timeout} seconds")
+
+
+def count(engine: sa.Engine, table: str, where: str = "1 = 1") -> int:
+    schema = "" if engine.dialect.name == "sqlite" else "dbos."
+    with engine.connect() as connection:
+        return connection.execute(
+            sa.text(f"SELECT count(*) FROM {schema}{table} WHERE {where}")
+        ).scalar_one()
+
+
+def run(database_url: str, mode: str, args) -> dict:
+    create_database(database_url)
+    app = subprocess.Popen(
+        [sys.executable, str(app_script)],
+        env={
+            **os.environ,
+            "DBOS_SYSTEM_DATABASE_URL": database_url,
+            "FAIR_QUEUE_MODE": mode,
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    engine = sa.create_engine(database_url)
+    try:
+        wait_for_app()
+        start = time.perf_counter()
+        urllib.request.urlopen(
+            urllib.request.Request(
+                f"{APP_URL}/api/workflows/fair_queue/synthetic_load"
+                f"?items={args.items}&tenants={args.tenants}&skew={args.skew}"
+                f"&work_seconds={args.work_seconds}",
+                method="POST",
+            )
+        )
+        running_samples, working_samples = [], []
+        deadline = time.monotonic() + args.timeout
+        while count(engine, "workflow_status", "status IN ('ENQUEUED', 'PENDING')"):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Jobs not finished after {args.timeout} seconds")
+            running_samples.append(
+                count(engine, "workflow_status", "status = 'PENDING'")
+            )
+            working_samples.append(
+                count(
+                    engine,
+                    "workflow_status",
+                    "status = 'PENDING' AND name = 'fair_queue_workflow'",
+                )
+            )
+            time.sleep(args.sample_seconds)
+        elapsed = time.perf_counter() - start
+        return {
+            "mode": mode,
+            "database": engine.dialect.name,
+            "jobs_per_sec": round(args.items / elapsed, 2),
+            "workflow_rows": count(engine, "workflow_status"),
+            "operation_rows": count(engine, "operation_outputs"),
+            "peak_running_workflows": max(running_samples, default=0),
+            "slot_utilization": round(
+                sum(working_samples)
+                / max(len(working_samples), 1)
+                / FAIR_QUEUE_CONCURRENCY,
+                2,
+            ),
+        }
+    finally:
+        app.terminate()
+        app.wait()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--work-seconds", type=float, default=1.0)
+    parser.add_argument("--sample-seconds", type=float, default=0.5)
+    parser.add_argument("--sqlite-path", default="benchmark.sqlite")
+    parser.add_argument("--postgres-url")
+    parser.add_argument("--timeout", type=float, default=1800)
+    args = parser.parse_args()
+
+    database_urls = [f"sqlite:///{args.sqlite_path}"]
+    if args.postgres_url:
+        database_urls.append(args.postgres_url)
+    results = [
+        run(database_url, mode, args)
+        for database_url in database_urls
+        for mode in ("two_hop", "single_queue")
+    ]
+    print(json.dumps(results, indent=2))
@@ -1,20 +1,75 @@
+import asyncio
+import importlib.metadata
 import os
 import random
+import sqlite3
+import threading
 import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
 
+import sqlalchemy as sa
 import uvicorn
-from dbos import DBOS, DBOSConfig, Debouncer, SetEnqueueOptions
-from fastapi import APIRouter, FastAPI
+from dbos import (
+    DBOS,
+    DBOSClient,
+    DBOSConfig,
+    Debouncer,
+    EnqueueOptions,
+)
+from fastapi import APIRouter, FastAPI, Query
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Launch DBOS when the app starts, however it is served, and shut it
+    # down when the app stops. DBOS's setup calls block, so they run in a
+    # worker thread rather than on the event loop.
+    stop = await asyncio.to_thread(launch)
+    yield
+    stop.set()
+    await asyncio.to_thread(DBOS.destroy)
+    client.destroy()
+    system_database.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 api = APIRouter(prefix="/api")
 
+# By default, the system database is the SQLite database DBOS would use.
+system_database_url = os.environ.get(
+    "DBOS_SYSTEM_DATABASE_URL", "sqlite:///dbos-queue-patterns.sqlite"
+)
+# The system database engine and the DBOS client, created when the app
+# launches. Bulk submissions enqueue many workflows per transaction on the
+# system database through the client, instead of one transaction per
+# workflow.
+system_database: Optional[sa.Engine] = None
+client: Optional[DBOSClient] = None
+
+
+def create_system_database(url: str) -> sa.Engine:
+    # One engine on the system database, which DBOS, the client, and the
+    # app's own queries share. DBOS sets up the SQLite connections of only
+    # the engines it creates, so this one sets up its own as DBOS would:
+    # enqueueing then waits for, rather than fails on, the queue threads'
+    # locks.
+    engine = sa.create_engine(url, pool_size=20, pool_pre_ping=True)
+    if engine.dialect.name == "sqlite":
+
+        @sa.event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = "IMMEDIATE"
+            dbapi_connection.execute("PRAGMA busy_timeout=30000")
+            dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    return engine
+
 
 #######################
 ## Fair Queueing
@@ -23,14 +78,48 @@ api = APIRouter(prefix="/api")
 
 # The set of tenants the UI offers and the randomized batch draws from.
 FAIR_QUEUE_TENANTS = ["alice", "bob", "clark", "dave", "ed"]
+ENQUEUE_BATCH_SIZE = 1000
+# At most this many fair-queued workflows run at once per tenant,
+# and at most this many in all.
+FAIR_QUEUE_PARTITION_CONCURRENCY = 2
+FAIR_QUEUE_CONCURRENCY = 4
+FAIR_QUEUE_POLL_SECONDS = 1.0
+# In single-queue mode, paying tenants get a larger share. When tenants
+# compete for slots, each gets work time in proportion to its weight, and
+# may run as many jobs at once as its quota. Other tenants have weight 1
+# and a quota of FAIR_QUEUE_PARTITION_CONCURRENCY.
+FAIR_QUEUE_WEIGHTS = {"alice": 3}
+FAIR_QUEUE_QUOTAS = {"alice": 3}
+# The work time, in seconds, a weight-1 tenant may start per turn
+FAIR_QUEUE_QUANTUM_SECONDS = 5.0
+# The pipeline reports each tenant's share of the work finished this recently
+FAIR_SHARE_WINDOW_SECONDS = 60
+
+# Fair queueing runs in one of two modes, set by FAIR_QUEUE_MODE:
+# - two_hop (the default): each job is a "concurrency manager" workflow
+#   on the partitioned queue, which enforces the per-tenant limit, and
+#   which enqueues the job's work on the concurrency queue, which
+#   enforces the global limit, and waits for it. Every tenant has the
+#   same limit, so weights and quotas do not apply.
+# - single_queue: each job is its work alone, on one queue, and the fair
+#   scheduler below enforces both limits, and weights and quotas.
+FAIR_QUEUE_MODE = os.environ.get("FAIR_QUEUE_MODE", "two_hop")
+# The workflow each job starts as, in each mode, and the queue it is
+# enqueued on
+FAIR_QUEUE_ENTRY_WORKFLOW = {
+    "two_hop": "fair_queue_concurrency_manager",
+    "single_queue": "fair_queue_workflow",
+}[FAIR_QUEUE_MODE]
+FAIR_QUEUE_WORKFLOW_QUEUES = {
+    "fair_queue_concurrency_manager": "partitioned-queue",
+    "fair_queue_workflow": "fair-queue",
+}
 
 
 @api.post("/workflows/fair_queue")
 def submit_fair_queue(tenant_id: str):
-    # Enqueue a single "concurrency manager" workflow to the partitioned
-    # queue to enforce per-partition limits.
-    with SetEnqueueOptions(queue_partition_key=tenant_id):
-        DBOS.enqueue_workflow("partitioned-queue", fair_queue_concurrency_manager)
+    # Enqueue a single job for the tenant.
+    enqueue_partitioned([(tenant_id, FAIR_QUEUE_ENTRY_WORKFLOW)])
 
 
 @api.post("/workflows/fair_queue/random_mix")
@@ -39,26 +128,374 @@ def submit_fair_queue_random_mix():
     favored = random.choice(FAIR_QUEUE_TENANTS[0:4])  
     weights = [2 if t == favored else 1 for t in FAIR_QUEUE_TENANTS[0:4]]
     picks = random.choices(FAIR_QUEUE_TENANTS[0:4], weights=weights, k=total)
-    for tenant in picks:
-        with SetEnqueueOptions(queue_partition_key=tenant):
-            DBOS.enqueue_workflow("partitioned-queue", fair_queue_concurrency_manager)
-            time.sleep(0.01)
+    enqueue_partitioned([(tenant, FAIR_QUEUE_ENTRY_WORKFLOW) for tenant in picks])
     return {"total": total, "favored": favored}
 
 
+class PartitionedItem(BaseModel):
+    tenant_id: str
+    workflow_name: Literal["fair_queue_concurrency_manager", "fair_queue_workflow"] = (
+        FAIR_QUEUE_ENTRY_WORKFLOW
+    )
+
+
+@api.post("/workflows/fair_queue/bulk")
+def submit_fair_queue_bulk(items: List[PartitionedItem]):
+    enqueue_partitioned([(item.tenant_id, item.workflow_name) for item in items])
+    return {"total": len(items)}
+
+
+@api.post("/workflows/fair_queue/synthetic_load")
+def submit_fair_queue_synthetic_load(
+    items: int = Query(100_000, ge=1, le=1_000_000),
+    tenants: int = Query(2000, ge=1),
+    skew: float = Query(1.0, ge=0),
+    work_seconds: float = Query(0, ge=0, le=60),
+):
+    # Generate a load for benchmarking the partitioned queue: items spread
+    # across tenants tenant-0, tenant-1, ..., where tenant-k gets a share
+    # proportional to 1 / (k + 1) ** skew. Skew 0 spreads items evenly;
+    # the default gives a few heavy tenants and a long tail of light ones.
+    # Each item's work takes work_seconds instead of the usual 5.
+    names = [f"tenant-{k}" for k in range(tenants)]
+    weights = [1 / (k + 1) ** skew for k in range(tenants)]
+    picks = random.choices(names, weights=weights, k=items)
+    start = time.perf_counter()
+    enqueue_partitioned(
+        [(tenant, FAIR_QUEUE_ENTRY_WORKFLOW) for tenant in picks], work_seconds
+    )
+    return {
+        "total": items,
+        "tenants": len(set(picks)),
+        "enqueue_seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def enqueue_partitioned(items: List[Tuple[str, str]], *args):
+    # Enqueue a workflow, partitioned by tenant, for each (tenant_id,
+    # workflow_name) pair, ENQUEUE_BATCH_SIZE per transaction, so a
+    # large submission commits a few times instead of once per item.
+    for first in range(0, len(items), ENQUEUE_BATCH_SIZE):
+        with system_database.begin() as connection:
+            for tenant_id, workflow_name in items[first : first + ENQUEUE_BATCH_SIZE]:
+                options: EnqueueOptions = {
+                    "queue_name": FAIR_QUEUE_WORKFLOW_QUEUES[workflow_name],
+                    "workflow_name": workflow_name,
+                    "queue_partition_key": tenant_id,
+                }
+                client.enqueue_in_transaction(connection, options, *args)
+
+
 @DBOS.workflow()
-def fair_queue_concurrency_manager():
+def fair_queue_concurrency_manager(work_seconds: float = 5):
     # The "concurrency manager" workflow enqueues the
     # workflow on the non-partitioned queue and
     # awaits its results to enforce global flow control limits.
-    return DBOS.enqueue_workflow("concurrency-queue", fair_queue_workflow).get_result()
+    return DBOS.enqueue_workflow(
+        "concurrency-queue", fair_queue_workflow, work_seconds
+    ).get_result()
 
 
-# This workflow is fairly queued: at most five workflows can run concurrently,
-# but no more than one per tenant.
+# This workflow is fairly queued: at most FAIR_QUEUE_CONCURRENCY workflows can
+# run concurrently, but no more than FAIR_QUEUE_PARTITION_CONCURRENCY per tenant.
 @DBOS.workflow()
-def fair_queue_workflow():
-    time.sleep(5)
+def fair_queue_workflow(work_seconds: float = 5):
+    time.sleep(work_seconds)
+
+
+class SchedulerLock:
+    # A lock at most one process holds at a time, from when it takes it
+    # until it exits. On Postgres, it is a session advisory lock on a
+    # connection kept open for it. On SQLite, it is an exclusive
+    # transaction, left open, on a lock file next to the database.
+
+    def __init__(self, system_database: sa.Engine, name: str):
+        self.system_database = system_database
+        self.name = name
+        self.connection: Any = None
+
+    def acquire(self) -> bool:
+        # Whether this process holds the lock, taking it if it is free
+        if self.system_database.dialect.name == "sqlite":
+            return self.acquire_sqlite()
+        return self.acquire_postgres()
+
+    def acquire_postgres(self) -> bool:
+        if self.connection is not None:
+            try:
+                self.connection.exec_driver_sql("SELECT 1")
+                return True
+            except sa.exc.SQLAlchemyError:
+                # The connection, and the lock with it, was lost.
+                self.connection.invalidate()
+                self.connection.close()
+                self.connection = None
+        connection = self.system_database.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        )
+        locked = connection.execute(
+            sa.select(sa.func.pg_try_advisory_lock(sa.func.hashtext(self.name)))
+        ).scalar()
+        if locked:
+            self.connection = connection
+        else:
+            connection.close()
+        return bool(locked)
+
+    def acquire_sqlite(self) -> bool:
+        path = self.system_database.url.database
+        if self.connection is not None or path in (None, "", ":memory:"):
+            # An in-memory database has no other processes.
+            return True
+        connection = sqlite3.connect(
+            f"{path}.{self.name}.lock",
+            timeout=0,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        try:
+            connection.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            connection.close()
+            return False
+        self.connection = connection
+        return True
+
+
+# DBOS has no API to move a waiting workflow from one queue to another, so
+# the fair scheduler starts jobs by updating DBOS's workflow_status table
+# directly, and reads the waiting and running jobs it schedules from it
+# too. This depends on the table's layout, and on how DBOS dequeues
+# workflows, in the DBOS version pinned in pyproject.toml, so the scheduler
+# refuses to run with any other. Its tests run it against a real system
+# database; check it again before moving the pin.
+DBOS_VERSION = "2.30.0"
+
+
+def workflow_status_table(system_database: sa.Engine) -> sa.TableClause:
+    installed = importlib.metadata.version("dbos")
+    if installed != DBOS_VERSION:
+        raise RuntimeError(
+            f"DBOS {installed} is installed, but the fair scheduler updates"
+            f" DBOS's tables as DBOS {DBOS_VERSION} lays them out"
+        )
+    return sa.table(
+        "workflow_status",
+        sa.column("workflow_uuid"),
+        sa.column("status"),
+        sa.column("queue_name"),
+        sa.column("queue_partition_key"),
+        sa.column("created_at"),
+        sa.column("updated_at"),
+        schema=None if system_database.dialect.name == "sqlite" else "dbos",
+    )
+
+
+def move_waiting_workflows(
+    system_database: sa.Engine, workflow_ids: List[str], from_queue: str, to_queue: str
+) -> int:
+    # Move the workflows still waiting on from_queue to to_queue, in one
+    # statement, so any no longer waiting, for example because they were
+    # cancelled, stay as they are. Returns how many moved.
+    workflow_status = workflow_status_table(system_database)
+    with system_database.begin() as connection:
+        return connection.execute(
+            sa.update(workflow_status)
+            .where(workflow_status.c.workflow_uuid.in_(workflow_ids))
+            .where(workflow_status.c.queue_name == from_queue)
+            .where(workflow_status.c.status == "ENQUEUED")
+            .values(queue_name=to_queue, updated_at=int(time.time() * 1000))
+        ).rowcount
+
+
+class FairScheduler:
+    # Single-queue fair scheduling. Jobs wait on fair-queue, which no process
+    # dequeues from directly. Every FAIR_QUEUE_POLL_SECONDS, the scheduler
+    # counts each tenant's waiting and running jobs, and starts as many
+    # waiting jobs as FAIR_QUEUE_CONCURRENCY leaves room for, oldest first
+    # within a tenant, with no tenant running more jobs than its quota. A job
+    # starts by moving to fair-dispatch-queue, which runs whatever it is
+    # given. Each job is then a single workflow, holding a worker slot only
+    # while it runs.
+    #
+    # The limits, the turn order, and the deficits hold only if one process
+    # schedules, as they are kept in its memory. Every app process runs a
+    # scheduler, but only the one holding the scheduler lock starts jobs.
+    # The others stand by, and one takes over, starting afresh, if it exits.
+    #
+    # Tenants take turns in deficit round-robin order. On its turn, a tenant's
+    # deficit grows by FAIR_QUEUE_QUANTUM_SECONDS times its weight, and it
+    # starts jobs while their cost, the seconds of work they take, fits in its
+    # deficit. Whatever is left carries over to its next turn, so over time
+    # each tenant with waiting jobs gets work time in proportion to its
+    # weight, whether its jobs are short or long. A tenant with no waiting
+    # jobs leaves the rotation and forfeits its deficit.
+
+    def __init__(
+        self,
+        system_database: sa.Engine,
+        weights: Dict[str, float],
+        quotas: Dict[str, int],
+    ):
+        self.system_database = system_database
+        self.weights = weights
+        self.quotas = quotas
+        self.lock = SchedulerLock(system_database, "fair-scheduler")
+        # The tenants with waiting jobs in turn order, starting with the one
+        # whose turn it is, whether it has had its quantum for this turn,
+        # and each tenant's deficit
+        self.rotation: List[str] = []
+        self.topped_up = False
+        self.deficits: Dict[str, float] = {}
+        self.workflow_status = workflow_status_table(system_database)
+
+    def weight(self, tenant_id: str) -> float:
+        return self.weights.get(tenant_id, 1)
+
+    def quota(self, tenant_id: str) -> int:
+        return self.quotas.get(tenant_id, FAIR_QUEUE_PARTITION_CONCURRENCY)
+
+    def run(self, stop: threading.Event):
+        while not stop.wait(FAIR_QUEUE_POLL_SECONDS):
+            try:
+                if self.lock.acquire():
+                    self.dispatch()
+            except Exception as e:
+                DBOS.logger.error(f"Error scheduling fair-queued workflows: {e}")
+
+    def dispatch(self) -> int:
+        waiting, running = self.count_jobs()
+        free = FAIR_QUEUE_CONCURRENCY - sum(running.values())
+        return self.start(self.pick(waiting, running, free))
+
+    def pick(
+        self, waiting: Dict[str, int], running: Dict[str, int], free: int
+    ) -> List[str]:
+        # The IDs of the jobs to start, in deficit round-robin order.
+        self.update_rotation(waiting)
+        remaining = dict(waiting)
+        # How many more of each tenant's jobs may start within its quota,
+        # and, once read, its oldest waiting jobs with their costs
+        room = {
+            t: max(0, min(waiting[t], self.quota(t) - running.get(t, 0)))
+            for t in self.rotation
+        }
+        jobs: Dict[str, List[Tuple[str, float]]] = {}
+        started: List[str] = []
+        while free > 0 and any(room.values()):
+            tenant_id = self.rotation[0]
+            if room[tenant_id] and tenant_id not in jobs:
+                jobs[tenant_id] = self.oldest_waiting(tenant_id, room[tenant_id])
+                room[tenant_id] = len(jobs[tenant_id])
+            if room[tenant_id]:
+                if not self.topped_up:
+                    quantum = FAIR_QUEUE_QUANTUM_SECONDS * self.weight(tenant_id)
+                    self.deficits[tenant_id] += quantum
+                    self.topped_up = True
+                head = jobs[tenant_id]
+                while free > 0 and head and head[0][1] <= self.deficits[tenant_id]:
+                    workflow_id, cost = head.pop(0)
+                    started.append(workflow_id)
+                    self.deficits[tenant_id] -= cost
+                    room[tenant_id] -= 1
+                    remaining[tenant_id] -= 1
+                    free -= 1
+                if head and head[0][1] <= self.deficits[tenant_id]:
+                    # Out of slots mid-turn: the turn resumes next time.
+                    break
+                if remaining[tenant_id] == 0:
+                    # Its last waiting job started, so it forfeits its deficit.
+                    self.deficits[tenant_id] = 0.0
+            self.rotation.append(self.rotation.pop(0))
+            self.topped_up = False
+        return started
+
+    def update_rotation(self, waiting: Dict[str, int]):
+        # Tenants with no waiting jobs leave the rotation, and tenants with
+        # newly waiting jobs join its end. If the tenant whose turn it was
+        # left, the next tenant's turn starts.
+        current = self.rotation[0] if self.rotation else None
+        self.rotation = [t for t in self.rotation if waiting.get(t)] + sorted(
+            t for t in waiting if waiting[t] and t not in self.deficits
+        )
+        self.deficits = {t: self.deficits.get(t, 0.0) for t in self.rotation}
+        if not self.rotation or self.rotation[0] != current:
+            self.topped_up = False
+
+    def start(self, workflow_ids: List[str]) -> int:
+        # Start jobs by moving them to fair-dispatch-queue, skipping any
+        # cancelled since they were picked.
+        if not workflow_ids:
+            return 0
+        return move_waiting_workflows(
+            self.system_database, workflow_ids, "fair-queue", "fair-dispatch-queue"
+        )
+
+    def count_jobs(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        # Each tenant's waiting jobs, and its running jobs, including
+        # those started but not yet dequeued.
+        workflow_status = self.workflow_status
+        with self.system_database.connect() as connection:
+            rows = connection.execute(
+                sa.select(
+                    workflow_status.c.queue_name,
+                    workflow_status.c.queue_partition_key,
+                    sa.func.count(),
+                )
+                .where(
+                    workflow_status.c.queue_name.in_(
+                        ["fair-queue", "fair-dispatch-queue"]
+                    )
+                )
+                .where(workflow_status.c.status.in_(["ENQUEUED", "PENDING"]))
+                .group_by(
+                    workflow_status.c.queue_name, workflow_status.c.queue_partition_key
+                )
+            ).all()
+        waiting: Dict[str, int] = {}
+        running: Dict[str, int] = {}
+        for queue_name, tenant_id, count in rows:
+            counts = waiting if queue_name == "fair-queue" else running
+            counts[tenant_id] = count
+        return waiting, running
+
+    def oldest_waiting(self, tenant_id: str, count: int) -> List[Tuple[str, float]]:
+        # The tenant's oldest waiting jobs, with their costs
+        workflow_status = self.workflow_status
+        with self.system_database.connect() as connection:
+            workflow_ids = list(
+                connection.execute(
+                    sa.select(workflow_status.c.workflow_uuid)
+                    .where(workflow_status.c.queue_name == "fair-queue")
+                    .where(workflow_status.c.status == "ENQUEUED")
+                    .where(workflow_status.c.queue_partition_key == tenant_id)
+                    .order_by(
+                        workflow_status.c.created_at, workflow_status.c.workflow_uuid
+                    )
+                    .limit(count)
+                ).scalars()
+            )
+        if not workflow_ids:
+            return []
+        workflows = {
+            w.workflow_id: w
+            for w in DBOS.list_workflows(workflow_ids=workflow_ids, load_output=False)
+        }
+        return [
+            (workflow_id, work_seconds(workflows[workflow_id]))
+            for workflow_id in workflow_ids
+        ]
+
+
+def work_seconds(workflow) -> float:
+    # How long a fair_queue_workflow's work takes, from its input
+    args = (workflow.input or {}).get("args", [])
+    kwargs = (workflow.input or {}).get("kwargs", {})
+    return args[0] if args else kwargs.get("work_seconds", 5)
+
+
+# Created when the app launches
+fair_scheduler: Optional[FairScheduler] = None
 
 
 #######################
@@ -117,6 +554,10 @@ class WorkflowStatus(BaseModel):
 
 @api.get("/workflows")
 def list_workflows(workflow_name: str) -> List[WorkflowStatus]:
+    # The frontend lists fair-queued jobs by the concurrency manager's
+    # name, whichever workflow they start as.
+    if workflow_name == "fair_queue_concurrency_manager":
+        workflow_name = FAIR_QUEUE_ENTRY_WORKFLOW
     workflows = DBOS.list_workflows(name=workflow_name, sort_desc=True)
     statuses = []
     for w in workflows:
@@ -142,26 +583,49 @@ def list_workflows(workflow_name: str) -> List[WorkflowStatus]:
 
 @api.get("/fair_queue/pipeline")
 def fair_queue_pipeline():
+    if FAIR_QUEUE_MODE == "single_queue":
+        return single_queue_pipeline()
     # The "concurrency manager" workflows run on the partitioned queue and carry the
     # partition key (tenant_id) natively.
-    enqueued_mgrs = DBOS.list_workflows(name="fair_queue_concurrency_manager", status=["ENQUEUED", "PENDING"])
+    # Only partition keys are needed, so skip loading inputs and outputs, which
+    # dominate the cost once a synthetic load has enqueued many workflows.
+    enqueued_mgrs = DBOS.list_workflows(
+        name="fair_queue_concurrency_manager",
+        status=["ENQUEUED", "PENDING"],
+        load_input=False,
+        load_output=False,
+    )
     since = (datetime.now(timezone.utc) - timedelta(minutes=30)).isoformat()
     success_mgrs = DBOS.list_workflows(
-        name="fair_queue_concurrency_manager", status="SUCCESS", start_time=since
+        name="fair_queue_concurrency_manager",
+        status="SUCCESS",
+        start_time=since,
+        load_input=False,
+        load_output=False,
     )
 
     # The actual work runs on the concurrency queue. Those workflows have no partition
     # key of their own, so we inherit it from the parent manager that enqueued them.
-    pending_work = DBOS.list_workflows(name="fair_queue_workflow", status="PENDING")
+    pending_work = DBOS.list_workflows(
+        name="fair_queue_workflow",
+        status="PENDING",
+        load_input=False,
+        load_output=False,
+    )
     mgr_key = {m.workflow_id: m.queue_partition_key for m in enqueued_mgrs}
 
-    def counts_by_tenant(wfs):
-        counts: dict[str, int] = {}
-        for w in wfs:
-            tenant = w.queue_partition_key or "unknown"
-            counts[tenant] = counts.get(tenant, 0) + 1
-        return [{"tenant_id": t, "count": c} for t, c in counts.items()]
+    # Work finished in the share window, whose managers may have finished too.
+    finished_work = recently_finished_work()
+    finished_mgrs = []
+    if finished_work:
+        finished_mgrs = DBOS.list_workflows(
+            workflow_ids=list({w.parent_workflow_id for w in finished_work}),
+            load_input=False,
+            load_output=False,
+        )
+    finished_key = {m.workflow_id: m.queue_partition_key for m in finished_mgrs}
 
+    waiting = {t["tenant_id"]: t["count"] for t in counts_by_tenant(enqueued_mgrs)}
     return {
         "enqueued": counts_by_tenant(enqueued_mgrs),
         "pending_concurrency": [
@@ -172,9 +636,121 @@ def fair_queue_pipeline():
             for w in pending_work
         ],
         "success": counts_by_tenant(success_mgrs),
+        # Partitioned queues give every partition the same concurrency, so
+        # in this mode every tenant has weight 1.
+        "shares": tenant_shares(
+            waiting,
+            [
+                (finished_key.get(w.parent_workflow_id, "unknown"), w)
+                for w in finished_work
+            ],
+            weight=lambda tenant_id: 1,
+            quota=lambda tenant_id: FAIR_QUEUE_PARTITION_CONCURRENCY,
+        ),
+    }
+
+
+def single_queue_pipeline():
+    # In single-queue mode, jobs wait on fair-queue, then run on
+    # fair-dispatch-queue, and carry their partition key throughout.
+    waiting, _ = fair_scheduler.count_jobs()
+    running = DBOS.list_workflows(
+        queue_name="fair-dispatch-queue",
+        status="PENDING",
+        load_input=False,
+        load_output=False,
+    )
+    since = (datetime.now(timezone.utc) - timedelta(minutes=30)).isoformat()
+    succeeded = DBOS.list_workflows(
+        queue_name="fair-dispatch-queue",
+        status="SUCCESS",
+        start_time=since,
+        load_input=False,
+        load_output=False,
+    )
+    for w in running:
+        waiting.setdefault(w.queue_partition_key, 0)
+    return {
+        "enqueued": [{"tenant_id": t, "count": c} for t, c in waiting.items() if c],
+        "pending_concurrency": [
+            {"workflow_id": w.workflow_id, "tenant_id": w.queue_partition_key}
+            for w in running
+        ],
+        "success": counts_by_tenant(succeeded),
+        "shares": tenant_shares(
+            waiting,
+            [(w.queue_partition_key, w) for w in recently_finished_work()],
+            weight=fair_scheduler.weight,
+            quota=fair_scheduler.quota,
+        ),
     }
 
 
+def recently_finished_work():
+    # The fair_queue_workflow jobs finished in the last FAIR_SHARE_WINDOW_SECONDS
+    since = datetime.now(timezone.utc) - timedelta(seconds=FAIR_SHARE_WINDOW_SECONDS)
+    return DBOS.list_workflows(
+        name="fair_queue_workflow",
+        status="SUCCESS",
+        completed_after=since.isoformat(),
+        load_input=False,
+        load_output=False,
+    )
+
+
+def tenant_shares(
+    active: Dict[str, int],
+    finished: List[Tuple[str, Any]],
+    weight: Callable[[str], float],
+    quota: Callable[[str], int],
+) -> List[Dict[str, Any]]:
+    # Each tenant's achieved share of the work time spent on jobs finished in
+    # the share window, against its target share. Tenants with jobs waiting or
+    # running, or finished in the window, compete for FAIR_QUEUE_CONCURRENCY
+    # slots in proportion to their weights. A tenant cannot use more slots
+    # than its quota, though, so what it cannot use is shared by the others.
+    work: Dict[str, float] = {t: 0.0 for t in active}
+    for tenant_id, w in finished:
+        seconds = (w.completed_at - (w.dequeued_at or w.completed_at)) / 1000
+        work[tenant_id] = work.get(tenant_id, 0.0) + seconds
+    total_work = sum(work.values())
+    target: Dict[str, float] = {}
+    remaining = 1.0
+    uncapped = set(work)
+    while uncapped:
+        total_weight = sum(weight(t) for t in uncapped)
+        capped = {
+            t
+            for t in uncapped
+            if remaining * weight(t) / total_weight > quota(t) / FAIR_QUEUE_CONCURRENCY
+        }
+        if not capped:
+            for t in uncapped:
+                target[t] = remaining * weight(t) / total_weight
+            break
+        for t in capped:
+            target[t] = quota(t) / FAIR_QUEUE_CONCURRENCY
+            remaining -= target[t]
+        uncapped -= capped
+    return [
+        {
+            "tenant_id": t,
+            "weight": weight(t),
+            "target_share": round(target[t], 3),
+            "achieved_share": round(work[t] / total_work, 3) if total_work else 0.0,
+        }
+        for t in sorted(work)
+    ]
+
+
+def counts_by_tenant(wfs):
+    counts: dict[str, int] = {}
+    for w in wfs:
+        tenant = w.queue_partition_key or "unknown"
+        counts[tenant] = counts.get(tenant, 0) + 1
+    return [{"tenant_id": t, "count": c} for t, c in counts.items()]
+
+
 @api.get("/debouncer/pipeline")
 def debouncer_pipeline():
     # A debounced workflow is DELAYED while its debounce window is still open,
@@ -238,17 +814,57 @@ async def serve_index():
     return FileResponse(STATIC_DIR / "index.html")
 
 
-if __name__ == "__main__":
+def launch() -> threading.Event:
+    # Create the system database engine, the client, and the fair scheduler,
+    # launch DBOS, and start the scheduler. Returns an event that stops it.
+    global system_database, client, fair_scheduler
+    system_database = create_system_database(system_database_url)
+    client = DBOSClient(system_database_engine=system_database)
+    fair_scheduler = FairScheduler(
+        system_database, FAIR_QUEUE_WEIGHTS, FAIR_QUEUE_QUOTAS
+    )
     config: DBOSConfig = {
         "name": "dbos-queue-patterns",
-        "system_database_url": os.environ.get("DBOS_SYSTEM_DATABASE_URL"),
+        "system_database_url": system_database_url,
         "application_version": "0.1.0",
         "conductor_key": os.environ.get("DBOS_CONDUCTOR_KEY"),
+        "system_database_engine": system_database,
     }
     DBOS(config=config)
+    if FAIR_QUEUE_MODE == "two_hop" and (FAIR_QUEUE_WEIGHTS or FAIR_QUEUE_QUOTAS):
+        DBOS.logger.warning(
+            "FAIR_QUEUE_WEIGHTS and FAIR_QUEUE_QUOTAS apply only in single_queue"
+            " mode. In two_hop mode, every tenant has weight 1 and a quota of"
+            f" {FAIR_QUEUE_PARTITION_CONCURRENCY}."
+        )
+    # Dequeue from every queue but fair-queue, from which the fair
+    # scheduler starts workflows instead.
+    DBOS.listen_queues(
+        [
+            "concurrency-queue",
+            "partitioned-queue",
+            "fair-dispatch-queue",
+            "rate-limited-queue",
+            "debouncer-queue",
+        ]
+    )
     DBOS.launch()
-    DBOS.register_queue("concurrency-queue", worker_concurrency=4)
-    DBOS.register_queue("partitioned-queue", partition_queue=True, concurrency=2)
+    DBOS.register_queue("concurrency-queue", worker_concurrency=FAIR_QUEUE_CONCURRENCY)
+    DBOS.register_queue(
+        "partitioned-queue",
+        partition_queue=True,
+        concurrency=FAIR_QUEUE_PARTITION_CONCURRENCY,
+    )
+    DBOS.register_queue("fair-queue", partition_queue=True)
+    # The scheduler has already applied the limits, so start workflows
+    # as soon as they arrive.
+    DBOS.register_queue("fair-dispatch-queue", polling_interval_sec=0.1)
     DBOS.register_queue("rate-limited-queue", limiter={"limit": 2, "period": 10})
     DBOS.register_queue("debouncer-queue")
+    stop = threading.Event()
+    threading.Thread(target=fair_scheduler.run, args=(stop,), daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,65 @@
+from typing import Dict, List, Tuple
+
+import pytest
+import sqlalchemy as sa
+from dbos import DBOS, DBOSConfig
+
+from main import FairScheduler, create_system_database
+
+
+class FakeFairScheduler(FairScheduler):
+    # A fair scheduler whose waiting jobs are given to it, rather than read
+    # from the system database. Each tenant's jobs are (workflow ID, cost)
+    # pairs, oldest first.
+
+    def __init__(self, jobs: Dict[str, List[Tuple[str, float]]], **kwargs):
+        super().__init__(sa.create_engine("sqlite://"), **kwargs)
+        self.jobs = jobs
+
+    def waiting(self) -> Dict[str, int]:
+        return {t: len(jobs) for t, jobs in self.jobs.items() if jobs}
+
+    def oldest_waiting(self, tenant_id: str, count: int) -> List[Tuple[str, float]]:
+        return list(self.jobs[tenant_id][:count])
+
+    def pick_and_start(self, running: Dict[str, int], free: int) -> List[str]:
+        # Pick jobs to start, and take them off the waiting jobs.
+        started = self.pick(self.waiting(), running, free)
+        for tenant_id in self.jobs:
+            self.jobs[tenant_id] = [
+                job for job in self.jobs[tenant_id] if job[0] not in started
+            ]
+        return started
+
+
+@pytest.fixture()
+def make_scheduler():
+    def make_scheduler(
+        jobs: Dict[str, List[Tuple[str, float]]],
+        weights: Dict[str, float] = {},
+        quotas: Dict[str, int] = {},
+    ) -> FakeFairScheduler:
+        return FakeFairScheduler(jobs, weights=weights, quotas=quotas)
+
+    return make_scheduler
+
+
+@pytest.fixture()
+def system_database(tmp_path):
+    # A fresh SQLite system database, set up by launching DBOS on it, in a
+    # process that dequeues from no queue.
+    engine = create_system_database(f"sqlite:///{tmp_path / 'dbos.sqlite'}")
+    DBOS.destroy()
+    config: DBOSConfig = {
+        "name": "dbos-queue-patterns",
+        "system_database_url": str(engine.url),
+        "application_version": "0.1.0",
+        "system_database_engine": engine,
+    }
+    DBOS(config=config)
+    DBOS.listen_queues([])
+    DBOS.launch()
+    DBOS.register_queue("fair-queue", partition_queue=True)
+    yield engine
+    DBOS.destroy()
+    engine.dispose()
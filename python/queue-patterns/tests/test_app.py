@@ -0,0 +1,58 @@
+import time
+
+from dbos import DBOS
+from fastapi.testclient import TestClient
+
+import main
+
+
+def wait_until(condition, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.2)
+
+
+def test_app_launches_dbos(tmp_path, monkeypatch):
+    # Serving the app, as uvicorn main:app does, launches DBOS with the
+    # system database engine and client that submissions use.
+    monkeypatch.setattr(
+        main, "system_database_url", f"sqlite:///{tmp_path / 'dbos.sqlite'}"
+    )
+    with TestClient(main.app) as api:
+        response = api.post(
+            "/api/workflows/fair_queue/synthetic_load",
+            params={"items": 3, "tenants": 1, "work_seconds": 0},
+        )
+        assert response.status_code == 200
+
+        def succeeded():
+            pipeline = api.get("/api/fair_queue/pipeline").json()
+            return pipeline["success"] == [{"tenant_id": "tenant-0", "count": 3}]
+
+        wait_until(succeeded)
+
+
+def test_single_queue_jobs_run(tmp_path, monkeypatch):
+    # In single_queue mode, every job the scheduler moves to
+    # fair-dispatch-queue runs there to completion.
+    monkeypatch.setattr(
+        main, "system_database_url", f"sqlite:///{tmp_path / 'dbos.sqlite'}"
+    )
+    monkeypatch.setattr(main, "FAIR_QUEUE_MODE", "single_queue")
+    monkeypatch.setattr(main, "FAIR_QUEUE_ENTRY_WORKFLOW", "fair_queue_workflow")
+    with TestClient(main.app) as api:
+        response = api.post(
+            "/api/workflows/fair_queue/synthetic_load",
+            params={"items": 10, "tenants": 3, "work_seconds": 0},
+        )
+        assert response.status_code == 200
+
+        def jobs():
+            return DBOS.list_workflows(
+                name="fair_queue_workflow", load_input=False, load_output=False
+            )
+
+        wait_until(lambda: {w.status for w in jobs()} == {"SUCCESS"})
+        assert len(jobs()) == 10
+        assert {w.queue_name for w in jobs()} == {"fair-dispatch-queue"}
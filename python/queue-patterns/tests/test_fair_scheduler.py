@@ -0,0 +1,159 @@
+import importlib.metadata
+
+import pytest
+from dbos import DBOS, DBOSClient, EnqueueOptions
+
+import main
+from main import FAIR_QUEUE_QUANTUM_SECONDS, FairScheduler, SchedulerLock
+
+
+def jobs(tenant_id: str, count: int, cost: float):
+    return [(f"{tenant_id}-{i}", cost) for i in range(count)]
+
+
+def test_turns_take_quantum(make_scheduler):
+    # Each turn, a tenant starts as many jobs as fit in its deficit, and
+    # keeps what is left of it for its next turn.
+    scheduler = make_scheduler(
+        {"alice": jobs("alice", 3, 2), "bob": jobs("bob", 3, 2)},
+        quotas={"alice": 100, "bob": 100},
+    )
+    assert scheduler.pick_and_start(running={}, free=100) == [
+        "alice-0",
+        "alice-1",
+        "bob-0",
+        "bob-1",
+        "alice-2",
+        "bob-2",
+    ]
+    # Both tenants started their last waiting jobs, with deficit to spare,
+    # and forfeited it.
+    assert scheduler.deficits == {"alice": 0.0, "bob": 0.0}
+    assert scheduler.pick_and_start(running={}, free=100) == []
+    assert scheduler.rotation == []
+
+
+def test_weights(make_scheduler):
+    # A tenant's quantum is proportional to its weight.
+    scheduler = make_scheduler(
+        {"alice": jobs("alice", 30, 5), "bob": jobs("bob", 30, 5)},
+        weights={"alice": 3},
+        quotas={"alice": 100, "bob": 100},
+    )
+    started = scheduler.pick_and_start(running={}, free=8)
+    assert started == [
+        "alice-0",
+        "alice-1",
+        "alice-2",
+        "bob-0",
+        "alice-3",
+        "alice-4",
+        "alice-5",
+        "bob-1",
+    ]
+
+
+def test_long_jobs_carry_deficit(make_scheduler):
+    # A tenant whose job costs more than its quantum builds up its deficit
+    # over several turns, so it gets no more work time than others.
+    scheduler = make_scheduler(
+        {
+            "alice": jobs("alice", 5, 3 * FAIR_QUEUE_QUANTUM_SECONDS),
+            "bob": jobs("bob", 5, FAIR_QUEUE_QUANTUM_SECONDS),
+        },
+        quotas={"alice": 100, "bob": 100},
+    )
+    assert scheduler.pick_and_start(running={}, free=2) == ["bob-0", "bob-1"]
+    assert scheduler.deficits == {
+        "alice": 2 * FAIR_QUEUE_QUANTUM_SECONDS,
+        "bob": 0.0,
+    }
+    # On its third turn, alice's first job fits.
+    assert scheduler.pick_and_start(running={}, free=2) == ["alice-0", "bob-2"]
+    assert scheduler.deficits == {"alice": 0.0, "bob": 0.0}
+
+
+def test_turn_resumes(make_scheduler):
+    # A turn cut short by a lack of free slots resumes at the next dispatch,
+    # without a second quantum.
+    scheduler = make_scheduler(
+        {"alice": jobs("alice", 10, 1), "bob": jobs("bob", 10, 1)},
+        quotas={"alice": 100, "bob": 100},
+    )
+    assert scheduler.pick_and_start(running={}, free=3) == [
+        "alice-0",
+        "alice-1",
+        "alice-2",
+    ]
+    assert scheduler.deficits["alice"] == FAIR_QUEUE_QUANTUM_SECONDS - 3
+    assert scheduler.pick_and_start(running={}, free=4) == [
+        "alice-3",
+        "alice-4",
+        "bob-0",
+        "bob-1",
+    ]
+    assert scheduler.deficits == {"alice": 0.0, "bob": FAIR_QUEUE_QUANTUM_SECONDS - 2}
+
+
+def test_quotas(make_scheduler):
+    # A tenant already running as many jobs as its quota is skipped, and
+    # earns nothing for its turn.
+    scheduler = make_scheduler(
+        {"alice": jobs("alice", 5, 1), "bob": jobs("bob", 5, 1)},
+        quotas={"alice": 3, "bob": 2},
+    )
+    started = scheduler.pick_and_start(running={"alice": 3, "bob": 1}, free=4)
+    assert started == ["bob-0"]
+    assert scheduler.deficits == {"alice": 0.0, "bob": FAIR_QUEUE_QUANTUM_SECONDS - 1}
+
+
+def test_new_tenants_join_the_end(make_scheduler):
+    scheduler = make_scheduler(
+        {"bob": jobs("bob", 10, 5)}, quotas={"alice": 100, "bob": 100}
+    )
+    assert scheduler.pick_and_start(running={}, free=1) == ["bob-0"]
+    scheduler.jobs["alice"] = jobs("alice", 10, 5)
+    assert scheduler.rotation == ["bob"]
+    assert scheduler.pick_and_start(running={}, free=3) == [
+        "bob-1",
+        "alice-0",
+        "bob-2",
+    ]
+
+
+def test_start_skips_cancelled_jobs(system_database):
+    # Starting a job that was cancelled after it was picked leaves it cancelled.
+    client = DBOSClient(system_database_engine=system_database)
+    options: EnqueueOptions = {
+        "queue_name": "fair-queue",
+        "workflow_name": "fair_queue_workflow",
+        "queue_partition_key": "alice",
+    }
+    handles = [client.enqueue(options, 0) for _ in range(3)]
+    DBOS.cancel_workflow(handles[1].workflow_id)
+
+    scheduler = FairScheduler(system_database, weights={}, quotas={})
+    assert scheduler.count_jobs() == ({"alice": 2}, {})
+    assert scheduler.start([handle.workflow_id for handle in handles]) == 2
+    assert scheduler.count_jobs() == ({}, {"alice": 2})
+    assert handles[1].get_status().status == "CANCELLED"
+
+
+def test_scheduler_lock(system_database):
+    # Only one scheduler lock on a database can be held at a time.
+    lock = SchedulerLock(system_database, "fair-scheduler")
+    other = SchedulerLock(system_database, "fair-scheduler")
+    assert lock.acquire()
+    assert not other.acquire()
+    assert lock.acquire()
+    lock.connection.close()
+    assert other.acquire()
+
+
+def test_dbos_version_pin(system_database, monkeypatch):
+    # The scheduler runs only with the DBOS version whose tables it was
+    # written for, the one pyproject.toml pins.
+    assert importlib.metadata.version("dbos") == main.DBOS_VERSION
+    monkeypatch.setattr(main, "DBOS_VERSION", "0.0.0")
+    with pytest.raises(RuntimeError):
+        FairScheduler(system_database, weights={}, quotas={})
@@ -0,0 +1,36 @@
+import threading
+
+import sqlalchemy as sa
+from dbos import DBOS
+
+from database import promote_waiting_jobs
+
+
+# Workers dequeue jobs lowest priority number first, oldest first
+# within a priority. Jobs enqueued without a priority have priority
+# 0, the highest. On its own, that lets a steady stream of higher
+# priority jobs keep lower priority jobs waiting forever. Aging
+# makes sure they progress: for every aging_seconds a job waits,
+# its priority number drops by one, down to 0, where it competes
+# with every other job by age alone.
+class PriorityAging:
+
+    def __init__(self, engine: sa.Engine, queue_name: str, aging_seconds: float):
+        self.engine = engine
+        self.queue_name = queue_name
+        self.aging_seconds = aging_seconds
+
+    def run(self, stop: threading.Event):
+        while not stop.wait(self.aging_seconds / 4):
+            try:
+                self.promote()
+            except Exception as e:
+                DBOS.logger.error(f"Error aging priorities: {e}")
+
+    def promote(self) -> int:
+        # Promote the jobs not updated for aging_seconds. A promotion
+        # updates a job, so each job is promoted once per aging_seconds,
+        # however many workers age the queue.
+        return promote_waiting_jobs(
+            self.engine, self.queue_name, int(self.aging_seconds * 1000)
+        )
@@ -0,0 +1,91 @@
+# Benchmark how long a pool of workers takes to drain a backlog: a fixed pool of
+# --fixed-workers workers, and a pool the supervisor autoscales between
+# --min-workers and --max-workers.
+
+# For each pool, we enqueue --jobs jobs of --steps steps, each step taking
+# --step-seconds, start the supervisor, and wait until every job has finished. We
+# report how long the backlog took to drain and how many workers ran its jobs.
+
+# Point DBOS_SYSTEM_DATABASE_URL at a scratch system database first, with no
+# worker or supervisor running.
+
+# Usage: python3 -m benchmarks.autoscale --jobs 10000 --fixed-workers 1 --max-workers 4
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import sqlalchemy as sa
+from dbos import DBOSClient
+
+from .common import enqueue_backlog, wait_until_drained
+
+supervisor_script = Path(__file__).parent.parent / "supervisor.py"
+
+
+def run(
+    client: DBOSClient, engine: sa.Engine, args, min_workers: int, max_workers: int
+) -> dict:
+    run_id = str(uuid.uuid4())
+    enqueue_backlog(client, engine, run_id, args.jobs, args.steps)
+    env = {
+        **os.environ,
+        "WORKER_MIN_PROCESSES": str(min_workers),
+        "WORKER_MAX_PROCESSES": str(max_workers),
+        "WORKER_CONCURRENCY": str(args.concurrency),
+        "WORKER_STEP_SECONDS": str(args.step_seconds),
+    }
+    start = time.perf_counter()
+    supervisor = subprocess.Popen(
+        [sys.executable, str(supervisor_script)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_drained(client, run_id, args.timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        supervisor.terminate()
+        supervisor.wait()
+    workflows = client.list_workflows(
+        workflow_id_prefix=run_id, load_input=False, load_output=False
+    )
+    return {
+        "pool": "fixed" if min_workers == max_workers else "autoscaled",
+        "min_workers": min_workers,
+        "max_workers": max_workers,
+        "drain_seconds": round(elapsed, 1),
+        "jobs_per_sec": round(args.jobs / elapsed, 1),
+        "workers_used": len({workflow.executor_id for workflow in workflows}),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--steps", type=int, default=1)
+    parser.add_argument("--step-seconds", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--fixed-workers", type=int, default=1)
+    parser.add_argument("--min-workers", type=int, default=1)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=3600)
+    args = parser.parse_args()
+
+    system_database_url = os.environ.get(
+        "DBOS_SYSTEM_DATABASE_URL", "sqlite:///dbos_queue_worker.sqlite"
+    )
+    client = DBOSClient(system_database_url=system_database_url)
+    engine = sa.create_engine(system_database_url)
+    results = [
+        run(client, engine, args, args.fixed_workers, args.fixed_workers),
+        run(client, engine, args, args.min_workers, args.max_workers),
+    ]
+    print(json.dumps(results, indent=2))
+    client.destroy()
@@ -0,0 +1,119 @@
+# Helpers shared by the benchmarks.
+
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional
+
+import sqlalchemy as sa
+from dbos import DBOSClient, EnqueueOptions
+
+ENQUEUE_BATCH_SIZE = 1000
+
+
+class Database:
+    # A scratch system database, which create() empties and migrates.
+
+    def __init__(self, name: str, url: str, performance_mode: bool = False):
+        self.name = name
+        self.url = url
+        self.performance_mode = performance_mode
+        self.schema = None if url.startswith("sqlite") else "dbos"
+
+    def create(self):
+        if self.url.startswith("sqlite"):
+            path = Path(sa.make_url(self.url).database)
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{path}{suffix}").unlink(missing_ok=True)
+        else:
+            engine = sa.create_engine(self.url)
+            with engine.begin() as connection:
+                connection.execute(sa.text("DROP SCHEMA IF EXISTS dbos CASCADE"))
+            engine.dispose()
+        subprocess.run(
+            ["dbos", "migrate", "--sys-db-url", self.url],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def env(self) -> dict:
+        # The environment for a service to use this database.
+        return {
+            **os.environ,
+            "DBOS_SYSTEM_DATABASE_URL": self.url,
+            "SQLITE_PERFORMANCE_MODE": "1" if self.performance_mode else "0",
+        }
+
+    def size_bytes(self, engine: sa.Engine) -> int:
+        if self.url.startswith("sqlite"):
+            path = Path(sa.make_url(self.url).database)
+            return sum(
+                Path(f"{path}{suffix}").stat().st_size
+                for suffix in ("", "-wal")
+                if Path(f"{path}{suffix}").exists()
+            )
+        with engine.connect() as connection:
+            return connection.execute(
+                sa.text("SELECT pg_database_size(current_database())")
+            ).scalar_one()
+
+
+def enqueue_backlog(
+    client: DBOSClient,
+    engine: sa.Engine,
+    run_id: str,
+    num_jobs: int,
+    num_steps: int,
+    output_bytes: int = 0,
+    priority: Optional[int] = None,
+) -> None:
+    # Enqueue num_jobs jobs, in transactions of ENQUEUE_BATCH_SIZE, with
+    # workflow IDs starting with run_id.
+    for first in range(0, num_jobs, ENQUEUE_BATCH_SIZE):
+        with engine.begin() as connection:
+            for index in range(first, min(first + ENQUEUE_BATCH_SIZE, num_jobs)):
+                options: EnqueueOptions = {
+                    "queue_name": "workflow-queue",
+                    "workflow_name": "workflow",
+                    "workflow_id": f"{run_id}-{index}",
+                }
+                if priority is not None:
+                    options["priority"] = priority
+                client.enqueue_in_transaction(
+                    connection, options, num_steps, output_bytes
+                )
+
+
+def wait_until_drained(client: DBOSClient, run_id: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        unfinished = client.list_workflows(
+            workflow_id_prefix=run_id,
+            status=["ENQUEUED", "PENDING"],
+            limit=1,
+            load_input=False,
+            load_output=False,
+        )
+        if not unfinished:
+            return
+        time.sleep(0.5)
+    raise TimeoutError(f"Backlog not drained after {timeout} seconds")
+
+
+def count_workflows(engine: sa.Engine, schema, run_id: str, statuses) -> int:
+    # How many of a run's workflows have one of these statuses.
+    workflow_status = sa.table(
+        "workflow_status",
+        sa.column("workflow_uuid"),
+        sa.column("status"),
+        schema=schema,
+    )
+    with engine.connect() as connection:
+        return connection.execute(
+            sa.select(sa.func.count())
+            .select_from(workflow_status)
+            .where(workflow_status.c.workflow_uuid.startswith(run_id))
+            .where(workflow_status.c.status.in_(statuses))
+        ).scalar_one()
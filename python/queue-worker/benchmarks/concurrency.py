@@ -0,0 +1,118 @@
+# Benchmark how many I/O-bound jobs one worker runs at once, and the memory each
+# in-flight job costs, in thread mode and in async mode.
+
+# For each --modes mode and each --concurrency level, we start one worker with that
+# WORKER_MODE and WORKER_CONCURRENCY, let it launch, then enqueue as many jobs as the
+# concurrency level, each of --steps steps that wait --step-seconds, as an HTTP call
+# would. Until every job has finished, we sample how many jobs are in flight and the
+# worker's resident memory and thread count. We report the most jobs in flight at
+# once, how long the jobs took, and the worker's memory per in-flight job above its
+# idle memory.
+
+# Point DBOS_SYSTEM_DATABASE_URL at a scratch system database first, with no worker
+# running. Memory is read from /proc, so this runs on Linux only.
+
+# Usage: python3 -m benchmarks.concurrency --modes thread async --concurrency 100 1000
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict
+
+import sqlalchemy as sa
+from dbos import DBOSClient
+
+from .common import count_workflows, enqueue_backlog
+
+worker_script = Path(__file__).parent.parent / "worker.py"
+
+
+def read_process_status(pid: int) -> Dict[str, int]:
+    # The worker's resident memory in kB and its thread count.
+    status = {}
+    with open(f"/proc/{pid}/status") as file:
+        for line in file:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "Threads"):
+                status[name] = int(value.split()[0])
+    return status
+
+
+def run(
+    client: DBOSClient, engine: sa.Engine, schema, args, mode: str, concurrency: int
+) -> dict:
+    env = {
+        **os.environ,
+        "WORKER_MODE": mode,
+        "WORKER_CONCURRENCY": str(concurrency),
+        "WORKER_STEP_SECONDS": str(args.step_seconds),
+    }
+    worker = subprocess.Popen(
+        [sys.executable, str(worker_script)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        time.sleep(args.warmup_seconds)
+        idle = read_process_status(worker.pid)
+        run_id = str(uuid.uuid4())
+        enqueue_backlog(client, engine, run_id, concurrency, args.steps)
+        start = time.perf_counter()
+        peak_in_flight = 0
+        peak = dict(idle)
+        deadline = time.monotonic() + args.timeout
+        while count_workflows(engine, schema, run_id, ["ENQUEUED", "PENDING"]):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Jobs not finished after {args.timeout} seconds")
+            in_flight = count_workflows(engine, schema, run_id, ["PENDING"])
+            peak_in_flight = max(peak_in_flight, in_flight)
+            status = read_process_status(worker.pid)
+            peak = {name: max(peak[name], status[name]) for name in peak}
+            time.sleep(0.5)
+        elapsed = time.perf_counter() - start
+    finally:
+        worker.terminate()
+        worker.wait()
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "peak_in_flight": peak_in_flight,
+        "seconds": round(elapsed, 1),
+        "idle_rss_mb": round(idle["VmRSS"] / 1024, 1),
+        "peak_rss_mb": round(peak["VmRSS"] / 1024, 1),
+        "kb_per_in_flight_job": round(
+            (peak["VmRSS"] - idle["VmRSS"]) / max(peak_in_flight, 1), 1
+        ),
+        "peak_threads": peak["Threads"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", default=["thread", "async"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--steps", type=int, default=1)
+    parser.add_argument("--step-seconds", type=float, default=10.0)
+    parser.add_argument("--warmup-seconds", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    system_database_url = os.environ.get(
+        "DBOS_SYSTEM_DATABASE_URL", "sqlite:///dbos_queue_worker.sqlite"
+    )
+    client = DBOSClient(system_database_url=system_database_url)
+    engine = sa.create_engine(system_database_url)
+    schema = None if engine.dialect.name == "sqlite" else "dbos"
+    results = [
+        run(client, engine, schema, args, mode, concurrency)
+        for mode in args.modes
+        for concurrency in args.concurrency
+    ]
+    print(json.dumps(results, indent=2))
+    client.destroy()
@@ -0,0 +1,140 @@
+# Benchmark enqueue and dequeue throughput on SQLite, on SQLite in performance mode,
+# and on Postgres, to show when to switch from SQLite to Postgres.
+
+# For each database, we measure three phases, each with --jobs jobs of one step
+# that takes no time:
+# - enqueue: --enqueuers threads enqueue the jobs one per transaction, as the web
+#   server does for POST /api/workflows, with no worker running,
+# - dequeue: one worker, running up to --concurrency workflows at once, dequeues
+#   and runs the jobs,
+# - mixed: the threads enqueue more jobs while the worker runs them, so the server
+#   and worker processes contend for the database.
+# We report jobs per second enqueued and run in each phase, and how many enqueues
+# failed. SQLite databases are created afresh at --sqlite-path. Postgres is
+# benchmarked only if --postgres-url points at a scratch database, whose DBOS
+# schema is dropped and recreated.
+
+# Usage: python3 -m benchmarks.databases --jobs 2000 \
+#   --postgres-url "postgresql+psycopg://postgres@localhost:5432/queue_worker_bench"
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import sqlalchemy as sa
+from dbos import DBOSClient, EnqueueOptions
+
+from database import sqlite_performance_engine
+
+from .common import Database, count_workflows
+
+worker_script = Path(__file__).parent.parent / "worker.py"
+
+
+def enqueue(client: DBOSClient, run_id: str, args) -> dict:
+    def enqueue_job(index: int) -> bool:
+        options: EnqueueOptions = {
+            "queue_name": "workflow-queue",
+            "workflow_name": "workflow",
+            "workflow_id": f"{run_id}-{index}",
+        }
+        try:
+            client.enqueue(options, 1)
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.enqueuers) as executor:
+        enqueued = sum(executor.map(enqueue_job, range(args.jobs)))
+    elapsed = time.perf_counter() - start
+    return {
+        "enqueues_per_sec": round(enqueued / elapsed, 1),
+        "failed_enqueues": args.jobs - enqueued,
+    }
+
+
+def wait_until_run(engine: sa.Engine, database: Database, run_id: str, args) -> float:
+    # Wait until the worker has run every job of the run, returning how long that
+    # took from when it dequeued the first.
+    deadline = time.monotonic() + args.timeout
+    start: Optional[float] = None
+    while time.monotonic() < deadline:
+        enqueued = count_workflows(engine, database.schema, run_id, ["ENQUEUED"])
+        if start is None and enqueued < args.jobs:
+            start = time.perf_counter()
+        if start is not None and not count_workflows(
+            engine, database.schema, run_id, ["ENQUEUED", "PENDING"]
+        ):
+            return time.perf_counter() - start
+        time.sleep(0.1)
+    raise TimeoutError(f"Jobs not run after {args.timeout} seconds")
+
+
+def run(database: Database, args) -> dict:
+    database.create()
+    sqlite_engine = sqlite_performance_engine(
+        database.url, args.enqueuers, database.performance_mode
+    )
+    client = DBOSClient(
+        system_database_url=database.url,
+        system_database_engine=sqlite_engine,
+        system_database_pool_size=args.enqueuers,
+    )
+    engine = sqlite_engine or sa.create_engine(database.url)
+    result: dict = {"database": database.name}
+
+    run_id = str(uuid.uuid4())
+    result["enqueue"] = enqueue(client, run_id, args)
+    worker = subprocess.Popen(
+        [sys.executable, str(worker_script)],
+        env={
+            **database.env(),
+            "WORKER_CONCURRENCY": str(args.concurrency),
+            "WORKER_STEP_SECONDS": "0",
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        elapsed = wait_until_run(engine, database, run_id, args)
+        result["dequeue"] = {"runs_per_sec": round(args.jobs / elapsed, 1)}
+
+        run_id = str(uuid.uuid4())
+        start = time.perf_counter()
+        result["mixed"] = enqueue(client, run_id, args)
+        wait_until_run(engine, database, run_id, args)
+        result["mixed"]["runs_per_sec"] = round(
+            args.jobs / (time.perf_counter() - start), 1
+        )
+    finally:
+        worker.terminate()
+        worker.wait()
+        client.destroy()
+        engine.dispose()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--enqueuers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--sqlite-path", default="benchmark.sqlite")
+    parser.add_argument("--postgres-url")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    databases = [
+        Database("sqlite", f"sqlite:///{args.sqlite_path}"),
+        Database("sqlite_performance_mode", f"sqlite:///{args.sqlite_path}", True),
+    ]
+    if args.postgres_url:
+        databases.append(Database("postgres", args.postgres_url))
+    print(json.dumps([run(database, args) for database in databases], indent=2))
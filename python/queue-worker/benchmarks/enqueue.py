@@ -0,0 +1,55 @@
+# Benchmark how fast the web server enqueues workflows: one per request with
+# POST /api/workflows, and in batches of each size with POST /api/workflows/batch.
+
+# Start the web server (python3 server.py) against a scratch system database first,
+# without the worker, so the enqueued workflows stay enqueued.
+
+# Usage: python3 -m benchmarks.enqueue --jobs 10000 --batch-sizes 1 100 1000
+
+import argparse
+import json
+import time
+import uuid
+
+import httpx
+
+
+def enqueue_one_by_one(client: httpx.Client, num_jobs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(num_jobs):
+        client.post("/api/workflows").raise_for_status()
+    return time.perf_counter() - start
+
+
+def enqueue_in_batches(client: httpx.Client, num_jobs: int, batch_size: int) -> float:
+    start = time.perf_counter()
+    for first in range(0, num_jobs, batch_size):
+        jobs = [{"num_steps": 10}] * min(batch_size, num_jobs - first)
+        batch = {"batch_id": str(uuid.uuid4()), "jobs": jobs}
+        client.post("/api/workflows/batch", json=batch).raise_for_status()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    results = []
+    with httpx.Client(base_url=args.url, timeout=300) as client:
+        elapsed = enqueue_one_by_one(client, args.jobs)
+        results.append(
+            {"mode": "one_by_one", "enqueues_per_sec": round(args.jobs / elapsed, 1)}
+        )
+        for batch_size in args.batch_sizes:
+            elapsed = enqueue_in_batches(client, args.jobs, batch_size)
+            results.append(
+                {
+                    "mode": "batch",
+                    "batch_size": batch_size,
+                    "enqueues_per_sec": round(args.jobs / elapsed, 1),
+                }
+            )
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,133 @@
+# Benchmark listing workflows whose steps produce large outputs, with the outputs
+# kept in the system database and with them offloaded to the blob store.
+
+# For each database and each mode, we create the database afresh, have a worker run
+# --jobs jobs of --steps steps, each step producing --output-bytes of output, and
+# then list the most recent --page-size workflows --repeats times, with their
+# inputs and outputs as DBOS lists them by default, and without. We report the
+# median latency of each listing, of fetching one workflow's result, reading its
+# outputs back from the blob store if they were offloaded, and the size of the
+# system database.
+
+# SQLite databases are created afresh at --sqlite-path. Postgres is benchmarked only
+# if --postgres-url points at a scratch database, whose DBOS schema is dropped and
+# recreated.
+
+# Usage: python3 -m benchmarks.offload --jobs 200 --output-bytes 1000000
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Callable
+
+import sqlalchemy as sa
+from dbos import DBOSClient
+
+from blobs import BlobStore
+
+from .common import Database, enqueue_backlog, wait_until_drained
+
+worker_script = Path(__file__).parent.parent / "worker.py"
+
+
+def median_ms(function: Callable[[], object], repeats: int) -> float:
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    return round(statistics.median(latencies) * 1000, 2)
+
+
+def run(database: Database, args, offload: bool) -> dict:
+    database.create()
+    blob_directory = Path(tempfile.mkdtemp())
+    blob_store = BlobStore(blob_directory, args.offload_bytes if offload else None)
+    client = DBOSClient(system_database_url=database.url)
+    engine = sa.create_engine(database.url)
+    env = {
+        **database.env(),
+        "WORKER_CONCURRENCY": str(args.concurrency),
+        "WORKER_STEP_SECONDS": "0",
+        "BLOB_STORE_DIR": str(blob_directory),
+    }
+    if offload:
+        env["BLOB_OFFLOAD_BYTES"] = str(args.offload_bytes)
+    worker = subprocess.Popen(
+        [sys.executable, str(worker_script)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    run_id = str(uuid.uuid4())
+    try:
+        enqueue_backlog(
+            client, engine, run_id, args.jobs, args.steps, args.output_bytes
+        )
+        wait_until_drained(client, run_id, args.timeout)
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    def list_with_outputs():
+        client.list_workflows(sort_desc=True, limit=args.page_size)
+
+    def list_without_outputs():
+        client.list_workflows(
+            sort_desc=True, limit=args.page_size, load_input=False, load_output=False
+        )
+
+    def fetch_result():
+        [workflow] = client.list_workflows(
+            workflow_ids=[f"{run_id}-0"], load_input=False
+        )
+        return [blob_store.resolve(output) for output in workflow.output]
+
+    assert all(len(output) == args.output_bytes for output in fetch_result())
+    result = {
+        "database": database.name,
+        "offload": offload,
+        "list_with_outputs_ms": median_ms(list_with_outputs, args.repeats),
+        "list_without_outputs_ms": median_ms(list_without_outputs, args.repeats),
+        "fetch_result_ms": median_ms(fetch_result, args.repeats),
+        "system_database_mb": round(database.size_bytes(engine) / 1e6, 1),
+        "blob_store_mb": round(
+            sum(path.stat().st_size for path in blob_directory.iterdir()) / 1e6, 1
+        ),
+    }
+    client.destroy()
+    engine.dispose()
+    shutil.rmtree(blob_directory)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=1)
+    parser.add_argument("--output-bytes", type=int, default=1_000_000)
+    parser.add_argument("--offload-bytes", type=int, default=65536)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sqlite-path", default="benchmark.sqlite")
+    parser.add_argument("--postgres-url")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    databases = [Database("sqlite", f"sqlite:///{args.sqlite_path}")]
+    if args.postgres_url:
+        databases.append(Database("postgres", args.postgres_url))
+    results = [
+        run(database, args, offload)
+        for database in databases
+        for offload in (False, True)
+    ]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,136 @@
+# Benchmark how long interactive and backfill jobs wait in the queue when they
+# share it, in three modes:
+# - fifo: every job is enqueued without a priority, so jobs run in arrival order,
+# - priorities: backfill jobs are enqueued with priority --backfill-priority, and
+#   never age,
+# - aging: backfill jobs are enqueued with that priority, and the worker ages them
+#   every --aging-seconds.
+
+# For each mode, we create the database afresh, enqueue --backfill jobs at once, and
+# then enqueue interactive jobs, without a priority, at --interactive-rate per second
+# for --duration seconds, while one worker runs up to --concurrency jobs at once.
+# Every job has one step taking --step-seconds. When the interactive load ends, we
+# report, for each lane, how many jobs started and the p50, p99, and max time jobs
+# waited from being enqueued to being dequeued. Jobs still waiting count with how
+# long they have waited so far.
+
+# Usage: python3 -m benchmarks.priorities --backfill 300 --interactive-rate 4
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import sqlalchemy as sa
+from dbos import DBOSClient, EnqueueOptions
+
+from .common import Database, enqueue_backlog
+
+worker_script = Path(__file__).parent.parent / "worker.py"
+
+
+def enqueue_interactive(client: DBOSClient, run_id: str, args):
+    # Enqueue interactive jobs at a steady rate until the load ends.
+    start = time.monotonic()
+    for index in range(int(args.interactive_rate * args.duration)):
+        time.sleep(max(0, start + index / args.interactive_rate - time.monotonic()))
+        options: EnqueueOptions = {
+            "queue_name": "workflow-queue",
+            "workflow_name": "workflow",
+            "workflow_id": f"{run_id}-interactive-{index}",
+        }
+        client.enqueue(options, 1)
+
+
+def lane_waits(client: DBOSClient, prefix: str) -> dict:
+    now_ms = time.time() * 1000
+    workflows = client.list_workflows(
+        workflow_id_prefix=prefix, load_input=False, load_output=False
+    )
+    waits = sorted(
+        ((workflow.dequeued_at or now_ms) - workflow.created_at) / 1000
+        for workflow in workflows
+    )
+    return {
+        "jobs": len(workflows),
+        "started": sum(workflow.dequeued_at is not None for workflow in workflows),
+        "p50_wait_seconds": round(statistics.median(waits), 2),
+        "p99_wait_seconds": round(waits[int(len(waits) * 0.99)], 2),
+        "max_wait_seconds": round(waits[-1], 2),
+    }
+
+
+def run(database: Database, args, mode: str) -> dict:
+    database.create()
+    client = DBOSClient(system_database_url=database.url)
+    engine = sa.create_engine(database.url)
+    worker = subprocess.Popen(
+        [sys.executable, str(worker_script)],
+        env={
+            **database.env(),
+            "WORKER_CONCURRENCY": str(args.concurrency),
+            "WORKER_STEP_SECONDS": str(args.step_seconds),
+            "WORKER_SHUTDOWN_TIMEOUT_SECONDS": "0",
+            "WORKER_PRIORITY_AGING_SECONDS": str(
+                args.aging_seconds if mode == "aging" else 10**9
+            ),
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    run_id = str(uuid.uuid4())
+    try:
+        enqueue_backlog(
+            client,
+            engine,
+            f"{run_id}-backfill",
+            args.backfill,
+            1,
+            priority=None if mode == "fifo" else args.backfill_priority,
+        )
+        interactive = threading.Thread(
+            target=enqueue_interactive, args=(client, run_id, args)
+        )
+        interactive.start()
+        interactive.join()
+        result = {
+            "database": database.name,
+            "mode": mode,
+            "interactive": lane_waits(client, f"{run_id}-interactive"),
+            "backfill": lane_waits(client, f"{run_id}-backfill"),
+        }
+    finally:
+        worker.terminate()
+        worker.wait()
+        client.destroy()
+        engine.dispose()
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill", type=int, default=300)
+    parser.add_argument("--backfill-priority", type=int, default=5)
+    parser.add_argument("--interactive-rate", type=float, default=4)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--aging-seconds", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--step-seconds", type=float, default=1)
+    parser.add_argument("--sqlite-path", default="benchmark.sqlite")
+    parser.add_argument("--postgres-url")
+    args = parser.parse_args()
+
+    databases = [Database("sqlite", f"sqlite:///{args.sqlite_path}")]
+    if args.postgres_url:
+        databases.append(Database("postgres", args.postgres_url))
+    results = [
+        run(database, args, mode)
+        for database in databases
+        for mode in ("fifo", "priorities", "aging")
+    ]
+    print(json.dumps(results, indent=2))
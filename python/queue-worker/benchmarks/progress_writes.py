@@ -0,0 +1,83 @@
+# Benchmark how many system database writes reporting workflow progress costs.
+
+# We run the worker's workflow in this process, with steps that take no time, once
+# per --max-updates setting. Setting it to --steps publishes progress after every
+# step, as the worker used to. For each setting, we report the rows the jobs added
+# to the system tables that record each progress update (operation_outputs also
+# records each step), in total and per job, and how long the jobs took.
+
+# Point DBOS_SYSTEM_DATABASE_URL at a scratch system database first.
+
+# Usage: python3 -m benchmarks.progress_writes --jobs 100 --steps 100 --max-updates 100 10
+
+import argparse
+import json
+import os
+import time
+from typing import Dict
+
+import sqlalchemy as sa
+from dbos import DBOS, DBOSConfig
+
+import worker
+
+# Every progress update adds a row to each of these tables, and upserts the
+# workflow's row in workflow_events.
+PROGRESS_TABLES = ["operation_outputs", "workflow_events_history"]
+
+
+def count_rows(engine: sa.Engine, schema) -> Dict[str, int]:
+    with engine.connect() as connection:
+        return {
+            table: connection.execute(
+                sa.select(sa.func.count()).select_from(sa.table(table, schema=schema))
+            ).scalar_one()
+            for table in PROGRESS_TABLES
+        }
+
+
+def run(engine: sa.Engine, schema, args, max_updates: int) -> dict:
+    worker.MAX_PROGRESS_UPDATES = max_updates
+    before = count_rows(engine, schema)
+    start = time.perf_counter()
+    handles = [
+        DBOS.start_workflow(worker.workflow, args.steps) for _ in range(args.jobs)
+    ]
+    for handle in handles:
+        handle.get_result()
+    elapsed = time.perf_counter() - start
+    after = count_rows(engine, schema)
+    rows = {table: after[table] - before[table] for table in PROGRESS_TABLES}
+    return {
+        "max_updates": max_updates,
+        "progress_updates_per_job": rows["workflow_events_history"] / args.jobs,
+        "rows_per_job": round(sum(rows.values()) / args.jobs, 1),
+        "rows_written": rows,
+        "jobs_per_sec": round(args.jobs / elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--max-updates", type=int, nargs="+", default=[100, 10])
+    args = parser.parse_args()
+
+    system_database_url = os.environ.get(
+        "DBOS_SYSTEM_DATABASE_URL", "sqlite:///dbos_queue_worker.sqlite"
+    )
+    config: DBOSConfig = {
+        "name": "dbos-queue-worker",
+        "system_database_url": system_database_url,
+        "application_version": "0.1.0",
+    }
+    DBOS(config=config)
+    DBOS.launch()
+    worker.STEP_SECONDS = 0
+
+    engine = sa.create_engine(system_database_url)
+    schema = None if system_database_url.startswith("sqlite") else "dbos"
+    results = [run(engine, schema, args, n) for n in args.max_updates]
+    print(json.dumps(results, indent=2))
+    DBOS.destroy()
@@ -0,0 +1,56 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+# Every step output is checkpointed in the system database, so multi-MB
+# outputs bloat it and slow down listing workflows. With BLOB_OFFLOAD_BYTES
+# set, step outputs larger than that are stored as files in BLOB_STORE_DIR
+# instead, and the system database keeps only a reference to each, which
+# is read back only when a workflow's result is fetched. The server and
+# workers must share the directory.
+BLOB_STORE_DIR = Path(os.environ.get("BLOB_STORE_DIR", Path(__file__).parent / "blobs"))
+BLOB_OFFLOAD_BYTES = (
+    int(os.environ["BLOB_OFFLOAD_BYTES"])
+    if "BLOB_OFFLOAD_BYTES" in os.environ
+    else None
+)
+
+
+class BlobStore:
+    # Blobs are named by the SHA-256 of their contents. Storing the same
+    # output twice, as a step retried after a crash may, writes one file.
+
+    def __init__(self, directory: Path, offload_bytes: Optional[int]):
+        self.directory = directory
+        self.offload_bytes = offload_bytes
+
+    def offload(self, data: str) -> Any:
+        # The data itself if it is small enough to keep in the system
+        # database, else a reference to it in the blob store.
+        if self.offload_bytes is None or len(data) <= self.offload_bytes:
+            return data
+        encoded = data.encode()
+        digest = hashlib.sha256(encoded).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            # Write to a temporary file first, so a reader never sees
+            # a partly written blob.
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as file:
+                file.write(encoded)
+            os.replace(file.name, path)
+        return {"blob": digest, "size": len(encoded)}
+
+    def resolve(self, value: Any) -> Any:
+        # The data a value returned by offload stands for.
+        if isinstance(value, dict) and "blob" in value:
+            return self.path(value["blob"]).read_text()
+        return value
+
+    def path(self, digest: str) -> Path:
+        return self.directory / digest
+
+
+blob_store = BlobStore(BLOB_STORE_DIR, BLOB_OFFLOAD_BYTES)
@@ -0,0 +1,116 @@
+import importlib.metadata
+import os
+import time
+from typing import Any, Optional
+
+import sqlalchemy as sa
+
+# On SQLite, the server and every worker process share one database
+# file, and each write takes its lock. With SQLITE_PERFORMANCE_MODE=1,
+# the file uses write-ahead logging, so readers no longer block the
+# writer or each other, and commits sync to disk only at checkpoints.
+# A commit can then be lost in a power failure or OS crash, though
+# the database is never corrupted. An application crash loses nothing.
+SQLITE_PERFORMANCE_MODE = os.environ.get("SQLITE_PERFORMANCE_MODE") == "1"
+
+
+def sqlite_performance_engine(
+    system_database_url: str,
+    pool_size: int,
+    performance_mode: bool = SQLITE_PERFORMANCE_MODE,
+) -> Optional[sa.Engine]:
+    # A system database engine for DBOS and DBOSClient to use instead of
+    # creating their own, or None if the database is not SQLite or the
+    # performance mode is off.
+    if not (performance_mode and system_database_url.startswith("sqlite")):
+        return None
+    engine = sa.create_engine(
+        system_database_url, pool_size=pool_size, max_overflow=0, pool_timeout=30
+    )
+
+    @sa.event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any):
+        # The settings DBOS applies to its own SQLite connections
+        dbapi_connection.isolation_level = "IMMEDIATE"
+        dbapi_connection.execute("PRAGMA busy_timeout=30000")
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+        # The performance mode
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+
+    return engine
+
+
+# DBOS has no API for two changes the queue makes to its jobs: moving
+# the jobs a retired worker left running back onto the queue without
+# reviving any cancelled meanwhile, and aging the priorities of waiting
+# jobs. These helpers make them by updating DBOS's workflow_status table
+# directly, so they depend on its schema and on how DBOS dequeues jobs
+# in the version pinned in pyproject.toml, and refuse to run with any
+# other. The tests run them against a real system database; check them
+# again before moving the pin.
+DBOS_VERSION = "2.30.0"
+
+
+def check_dbos_version():
+    installed = importlib.metadata.version("dbos")
+    if installed != DBOS_VERSION:
+        raise RuntimeError(
+            f"DBOS {installed} is installed, but the queue updates DBOS's"
+            f" tables as DBOS {DBOS_VERSION} lays them out"
+        )
+
+
+def workflow_status_table(engine: sa.Engine) -> sa.TableClause:
+    check_dbos_version()
+    return sa.table(
+        "workflow_status",
+        sa.column("executor_id"),
+        sa.column("queue_name"),
+        sa.column("status"),
+        sa.column("priority"),
+        # When a job was dequeued
+        sa.column("started_at_epoch_ms"),
+        sa.column("updated_at"),
+        schema=None if engine.dialect.name == "sqlite" else "dbos",
+    )
+
+
+def requeue_running_jobs(engine: sa.Engine, queue_name: str, executor_id: str) -> int:
+    # Put the jobs an executor was running back on their queue, as DBOS
+    # recovery would, for any worker to dequeue. Only jobs still running
+    # are moved, checked in the same statement, so a job that has since
+    # been cancelled or finished is never revived.
+    workflow_status = workflow_status_table(engine)
+    with engine.begin() as connection:
+        return connection.execute(
+            sa.update(workflow_status)
+            .where(workflow_status.c.queue_name == queue_name)
+            .where(workflow_status.c.executor_id == executor_id)
+            .where(workflow_status.c.status == "PENDING")
+            .values(
+                status="ENQUEUED",
+                started_at_epoch_ms=None,
+                updated_at=int(time.time() * 1000),
+            )
+        ).rowcount
+
+
+def promote_waiting_jobs(engine: sa.Engine, queue_name: str, waited_ms: int) -> int:
+    # Lower by one, down to 0, the priority number of every job waiting
+    # on the queue that has not been updated, as by its last promotion,
+    # for waited_ms.
+    now_ms = int(time.time() * 1000)
+    workflow_status = workflow_status_table(engine)
+    with engine.begin() as connection:
+        return connection.execute(
+            sa.update(workflow_status)
+            .where(workflow_status.c.queue_name == queue_name)
+            .where(workflow_status.c.status == "ENQUEUED")
+            .where(workflow_status.c.priority > 0)
+            .where(workflow_status.c.updated_at <= now_ms - waited_ms)
+            .values(
+                priority=workflow_status.c.priority - 1,
+                updated_at=now_ms,
+            )
+        ).rowcount
@@ -1,5 +1,17 @@
 import { useState, useEffect } from 'react'
 
+// Replace workflows we already show with their updates, and show new
+// workflows first, as the server lists the most recent first.
+function mergeWorkflows(current, updates) {
+  const byId = new Map(updates.map(function(wf) { return [wf.workflow_id, wf] }))
+  const merged = current.map(function(wf) {
+    const update = byId.get(wf.workflow_id)
+    byId.delete(wf.workflow_id)
+    return update || wf
+  })
+  return [...byId.values(), ...merged]
+}
+
 function App() {
   const [workflows, setWorkflows] = useState([])
   const [loading, setLoading] = useState(false)
@@ -27,14 +39,23 @@ function App() {
   }
 
   useEffect(function() {
-    console.log('Component mounted, starting polling')
+    console.log('Component mounted, subscribing to updates')
     fetchWorkflows()
-    const id = setInterval(function() {
-      fetchWorkflows()
-    }, 1000)
+    // The server pushes the workflows whose status or progress changed
+    const events = new EventSource('/api/workflows/events')
+    events.onmessage = function(event) {
+      const updates = JSON.parse(event.data)
+      setWorkflows(function(current) {
+        return mergeWorkflows(current, updates)
+      })
+      setError(null)
+    }
+    events.onerror = function() {
+      console.error('Lost connection to updates, reconnecting')
+    }
     return function() {
       console.log('Cleanup')
-      clearInterval(id)
+      events.close()
     }
   }, [])
 
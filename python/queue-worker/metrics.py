@@ -0,0 +1,164 @@
+import threading
+import time
+from typing import List, Sequence
+
+import sqlalchemy as sa
+
+# DBOS already records when each job was enqueued and dequeued, and
+# when each of its steps and events started and finished, so the
+# server measures jobs from the system database, with nothing extra
+# for workers to write. Each time the metrics are read, the server
+# adds the jobs finished since the last read to its histograms.
+
+# Operations DBOS records for DBOS.set_event calls. Every other
+# operation a job records is one of its steps.
+SET_EVENT_OPERATION = "DBOS.setEvent"
+# Jobs are read only once they have been finished this long, so a
+# job committed late by a worker whose clock lags is not missed.
+SETTLE_MS = 5000
+READ_BATCH_SIZE = 1000
+
+
+class Histogram:
+    # A Prometheus histogram, rendered in the text exposition format.
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class JobMetrics:
+
+    def __init__(self, engine: sa.Engine, workflow_name: str):
+        self.engine = engine
+        self.workflow_name = workflow_name
+        schema = None if engine.dialect.name == "sqlite" else "dbos"
+        self.workflow_status = sa.table(
+            "workflow_status",
+            sa.column("workflow_uuid"),
+            sa.column("status"),
+            sa.column("name"),
+            sa.column("created_at"),
+            # When a job was dequeued
+            sa.column("started_at_epoch_ms"),
+            sa.column("completed_at"),
+            schema=schema,
+        )
+        self.operation_outputs = sa.table(
+            "operation_outputs",
+            sa.column("workflow_uuid"),
+            sa.column("function_name"),
+            sa.column("started_at_epoch_ms"),
+            sa.column("completed_at_epoch_ms"),
+            schema=schema,
+        )
+        self.queue_wait = Histogram(
+            "queue_worker_job_queue_wait_seconds",
+            "Time from a job being enqueued to being dequeued.",
+            [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600],
+        )
+        self.step_duration = Histogram(
+            "queue_worker_step_duration_seconds",
+            "Time each step of a job took to run and checkpoint.",
+            [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60],
+        )
+        self.set_event_cost = Histogram(
+            "queue_worker_job_set_event_seconds",
+            "Time each job spent setting events, such as its progress.",
+            [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+        )
+        # The last job read, by when it finished and its ID. Like any
+        # process's Prometheus metrics, the histograms start empty, with
+        # the jobs that finish after the server starts.
+        self._cursor = (int(time.time() * 1000), "")
+        self._lock = threading.Lock()
+
+    def render(self) -> str:
+        with self._lock:
+            while self._read_finished_jobs() == READ_BATCH_SIZE:
+                pass
+            histograms = [self.queue_wait, self.step_duration, self.set_event_cost]
+            return "\n".join(line for h in histograms for line in h.render()) + "\n"
+
+    def _read_finished_jobs(self) -> int:
+        workflow_status = self.workflow_status
+        operation_outputs = self.operation_outputs
+        settled_ms = int(time.time() * 1000) - SETTLE_MS
+        with self.engine.connect() as connection:
+            jobs = connection.execute(
+                sa.select(
+                    workflow_status.c.workflow_uuid,
+                    workflow_status.c.created_at,
+                    workflow_status.c.started_at_epoch_ms,
+                    workflow_status.c.completed_at,
+                )
+                .where(workflow_status.c.name == self.workflow_name)
+                .where(workflow_status.c.status.in_(["SUCCESS", "ERROR"]))
+                .where(workflow_status.c.completed_at <= settled_ms)
+                .where(
+                    sa.tuple_(
+                        workflow_status.c.completed_at, workflow_status.c.workflow_uuid
+                    )
+                    > sa.tuple_(*self._cursor)
+                )
+                .order_by(
+                    workflow_status.c.completed_at, workflow_status.c.workflow_uuid
+                )
+                .limit(READ_BATCH_SIZE)
+            ).all()
+            if not jobs:
+                return 0
+            operations = connection.execute(
+                sa.select(
+                    operation_outputs.c.workflow_uuid,
+                    operation_outputs.c.function_name,
+                    operation_outputs.c.started_at_epoch_ms,
+                    operation_outputs.c.completed_at_epoch_ms,
+                ).where(
+                    operation_outputs.c.workflow_uuid.in_(
+                        [job.workflow_uuid for job in jobs]
+                    )
+                )
+            ).all()
+        set_event_ms = {job.workflow_uuid: 0 for job in jobs}
+        for operation in operations:
+            if None in (
+                operation.started_at_epoch_ms,
+                operation.completed_at_epoch_ms,
+            ):
+                continue
+            duration_ms = (
+                operation.completed_at_epoch_ms - operation.started_at_epoch_ms
+            )
+            if operation.function_name == SET_EVENT_OPERATION:
+                set_event_ms[operation.workflow_uuid] += duration_ms
+            else:
+                self.step_duration.observe(duration_ms / 1000)
+        for job in jobs:
+            if job.started_at_epoch_ms is not None:
+                self.queue_wait.observe(
+                    (job.started_at_epoch_ms - job.created_at) / 1000
+                )
+            self.set_event_cost.observe(set_event_ms[job.workflow_uuid] / 1000)
+        self._cursor = (jobs[-1].completed_at, jobs[-1].workflow_uuid)
+        return len(jobs)
@@ -1,13 +1,22 @@
+import asyncio
+import base64
+import json
 import os
+import time
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
+import sqlalchemy as sa
 import uvicorn
 from dbos import DBOSClient, EnqueueOptions
-from fastapi import APIRouter, FastAPI
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from blobs import blob_store
+from database import sqlite_performance_engine
+from metrics import SET_EVENT_OPERATION, JobMetrics
 
 # Create a FastAPI app and API router
 app = FastAPI()
@@ -17,12 +26,64 @@ api = APIRouter(prefix="/api")
 system_database_url = os.environ.get(
     "DBOS_SYSTEM_DATABASE_URL", "sqlite:///dbos_queue_worker.sqlite"
 )
-client = DBOSClient(system_database_url=system_database_url)
+# In SQLite performance mode, the client and the server's own queries
+# share an engine that sets up each connection for it.
+sqlite_engine = sqlite_performance_engine(system_database_url, pool_size=20)
+client = DBOSClient(
+    system_database_url=system_database_url, system_database_engine=sqlite_engine
+)
+# Batches of workflows are enqueued in transactions on the system database,
+# and workflows are listed with their progress by querying it directly
+system_database = sqlite_engine or sa.create_engine(system_database_url)
+system_schema = None if system_database.dialect.name == "sqlite" else "dbos"
+workflow_status = sa.table(
+    "workflow_status",
+    sa.column("workflow_uuid"),
+    sa.column("status"),
+    sa.column("name"),
+    sa.column("created_at"),
+    # When a workflow was dequeued
+    sa.column("started_at_epoch_ms"),
+    schema=system_schema,
+)
+workflow_events = sa.table(
+    "workflow_events",
+    sa.column("workflow_uuid"),
+    sa.column("key"),
+    sa.column("value"),
+    sa.column("serialization"),
+    schema=system_schema,
+)
+operation_outputs = sa.table(
+    "operation_outputs",
+    sa.column("workflow_uuid"),
+    sa.column("function_name"),
+    sa.column("started_at_epoch_ms"),
+    sa.column("completed_at_epoch_ms"),
+    schema=system_schema,
+)
 
 
 # Define constants and models
 WF_PROGRESS_KEY = "workflow_progress"
 frontend_dist = Path(__file__).parent / "frontend" / "dist"
+ENQUEUE_BATCH_SIZE = 1000
+WORKFLOWS_PAGE_SIZE = 100
+PROGRESS_POLL_SECONDS = 1.0
+MAX_PRIORITY = 2**31 - 1
+
+
+class Job(BaseModel):
+    num_steps: int = 10
+    # How large an output each step produces
+    output_bytes: int = 0
+    # Lower numbers run first. Jobs without a priority run first of all.
+    priority: Optional[int] = Field(None, ge=1, le=MAX_PRIORITY)
+
+
+class JobBatch(BaseModel):
+    batch_id: str
+    jobs: List[Job]
 
 
 class WorkflowStatus(BaseModel):
@@ -30,47 +91,306 @@ class WorkflowStatus(BaseModel):
     workflow_status: str
     steps_completed: Optional[int]
     num_steps: Optional[int]
+    # Once a workflow finishes, how long it waited in the queue,
+    # and how long it spent in its steps and setting events
+    queue_seconds: Optional[float] = None
+    step_seconds: Optional[float] = None
+    set_event_seconds: Optional[float] = None
+
+
+class WorkflowResult(BaseModel):
+    workflow_id: str
+    workflow_status: str
+    # Steps that produce no output return None
+    outputs: Optional[List[Optional[str]]]
 
 
 # Use the DBOS client to enqueue a workflow
 # for execution on the worker.
 @api.post("/workflows")
-def enqueue_workflow():
+def enqueue_workflow(priority: Optional[int] = Query(None, ge=1, le=MAX_PRIORITY)):
     options: EnqueueOptions = {
         "queue_name": "workflow-queue",
         "workflow_name": "workflow",
     }
+    if priority is not None:
+        options["priority"] = priority
     num_steps = 10
     client.enqueue(options, num_steps)
     return {"status": "enqueued"}
 
 
-# List all workflows and their progress to display on the frontend
+# Enqueue many workflows at once, for example to backfill.
+# Every ENQUEUE_BATCH_SIZE workflows are enqueued in a single
+# transaction, rather than one transaction per workflow. DBOS
+# inserts each workflow with its own statement, checking it
+# against any existing workflow with its ID, and has no API to
+# insert several at once, so the batch saves commits, not statements.
+# Each job's workflow ID is derived from the batch ID, so
+# resubmitting a batch doesn't enqueue any of its jobs twice. Jobs
+# whose workflows already exist are skipped, and the count returned
+# is the number of workflows this request actually enqueued.
+@api.post("/workflows/batch")
+def enqueue_workflows(batch: JobBatch):
+    jobs = [(f"{batch.batch_id}-{index}", job) for index, job in enumerate(batch.jobs)]
+    count = 0
+    for start in range(0, len(jobs), ENQUEUE_BATCH_SIZE):
+        chunk = jobs[start : start + ENQUEUE_BATCH_SIZE]
+        with system_database.begin() as connection:
+            lock_batch(connection, batch.batch_id)
+            existing = set(
+                connection.execute(
+                    sa.select(workflow_status.c.workflow_uuid).where(
+                        workflow_status.c.workflow_uuid.in_(
+                            [workflow_id for workflow_id, _ in chunk]
+                        )
+                    )
+                ).scalars()
+            )
+            for workflow_id, job in chunk:
+                if workflow_id in existing:
+                    continue
+                options: EnqueueOptions = {
+                    "queue_name": "workflow-queue",
+                    "workflow_name": "workflow",
+                    "workflow_id": workflow_id,
+                }
+                if job.priority is not None:
+                    options["priority"] = job.priority
+                client.enqueue_in_transaction(
+                    connection, options, job.num_steps, job.output_bytes
+                )
+                count += 1
+    return {"status": "enqueued", "count": count}
+
+
+def lock_batch(connection: sa.Connection, batch_id: str) -> None:
+    # Serialize concurrent submissions of the same batch until this
+    # transaction ends, so only one of them counts each workflow as
+    # enqueued. On SQLite, transactions already can't interleave their
+    # writes: the performance mode begins each by taking the database's
+    # write lock, and otherwise one that has read can't then write
+    # once another has.
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            sa.select(sa.func.pg_advisory_xact_lock(sa.func.hashtext(batch_id)))
+        )
+
+
+# List workflows and their progress to display on the frontend,
+# most recently created first, a page at a time. One query reads
+# a whole page, joining each workflow's status with its progress
+# event. If there are more workflows after this page, the cursor
+# for the next page is returned in the X-Next-Cursor header.
 @api.get("/workflows")
-def list_workflows() -> List[WorkflowStatus]:
-    # Use the DBOS client to list all workflows
-    workflows = client.list_workflows(name="workflow", sort_desc=True)
-    statuses: List[WorkflowStatus] = []
-    for workflow in workflows:
-        # Query each workflow's progress event. This may not be available
-        # if the workflow has not yet started executing.
-        progress = client.get_event(
-            workflow.workflow_id, WF_PROGRESS_KEY, timeout_seconds=0
+def list_workflows(
+    response: Response,
+    limit: int = Query(WORKFLOWS_PAGE_SIZE, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+) -> List[WorkflowStatus]:
+    rows = fetch_workflows(limit, decode_cursor(cursor), status)
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return [to_workflow_status(row) for row in rows]
+
+
+# Fetch a workflow's result, the outputs of its steps. Outputs
+# offloaded to the blob store are read from it only here, never
+# when workflows are listed.
+@api.get("/workflows/{workflow_id}/result")
+def get_workflow_result(workflow_id: str) -> WorkflowResult:
+    workflows = client.list_workflows(workflow_ids=[workflow_id], load_input=False)
+    if not workflows:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    workflow = workflows[0]
+    outputs = None
+    if workflow.status == "SUCCESS":
+        outputs = [blob_store.resolve(output) for output in workflow.output or []]
+    return WorkflowResult(
+        workflow_id=workflow_id, workflow_status=workflow.status, outputs=outputs
+    )
+
+
+# Rather than polling the list endpoint, the frontend can subscribe
+# to this Server-Sent Events stream. The server reads the first page
+# of workflows every PROGRESS_POLL_SECONDS, in one query however many
+# subscribers there are, and pushes each subscriber only the
+# workflows whose status or progress changed since it last heard.
+@api.get("/workflows/events")
+async def workflow_events_endpoint(
+    request: Request, status: Optional[List[str]] = Query(None)
+):
+    async def events() -> AsyncIterator[str]:
+        sent: Dict[str, WorkflowStatus] = {}
+        while not await request.is_disconnected():
+            page = await workflow_pages.get(tuple(status or ()))
+            changed = [
+                workflow
+                for workflow in page
+                if sent.get(workflow.workflow_id) != workflow
+            ]
+            sent = {workflow.workflow_id: workflow for workflow in page}
+            if changed:
+                data = json.dumps([workflow.model_dump() for workflow in changed])
+                yield f"data: {data}\n\n"
+            await asyncio.sleep(PROGRESS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+class WorkflowPages:
+    # The first page of workflows for each status filter, re-read
+    # at most every PROGRESS_POLL_SECONDS and shared by all
+    # subscribers with that filter.
+
+    def __init__(self):
+        self._pages: Dict[Tuple[str, ...], Tuple[float, List[WorkflowStatus]]] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, statuses: Tuple[str, ...]) -> List[WorkflowStatus]:
+        async with self._lock:
+            read_at, page = self._pages.get(statuses, (0.0, []))
+            if time.monotonic() - read_at >= PROGRESS_POLL_SECONDS:
+                page = await asyncio.to_thread(self._read, statuses)
+                self._pages[statuses] = (time.monotonic(), page)
+            return page
+
+    def _read(self, statuses: Tuple[str, ...]) -> List[WorkflowStatus]:
+        rows = fetch_workflows(WORKFLOWS_PAGE_SIZE, None, list(statuses))
+        return [to_workflow_status(row) for row in rows]
+
+
+workflow_pages = WorkflowPages()
+
+
+def fetch_workflows(
+    limit: int,
+    after: Optional[Tuple[int, str]] = None,
+    statuses: Optional[List[str]] = None,
+) -> List[sa.Row]:
+    query = (
+        sa.select(
+            workflow_status.c.workflow_uuid,
+            workflow_status.c.status,
+            workflow_status.c.created_at,
+            workflow_status.c.started_at_epoch_ms,
+            workflow_events.c.value,
+            workflow_events.c.serialization,
+            operations_ms(
+                operation_outputs.c.function_name != SET_EVENT_OPERATION
+            ).label("step_ms"),
+            operations_ms(
+                operation_outputs.c.function_name == SET_EVENT_OPERATION
+            ).label("set_event_ms"),
         )
-        status = WorkflowStatus(
-            workflow_id=workflow.workflow_id,
-            workflow_status=workflow.status,
-            steps_completed=progress.get("steps_completed") if progress else None,
-            num_steps=progress.get("num_steps") if progress else None,
+        .select_from(
+            workflow_status.outerjoin(
+                workflow_events,
+                sa.and_(
+                    workflow_events.c.workflow_uuid == workflow_status.c.workflow_uuid,
+                    workflow_events.c.key == WF_PROGRESS_KEY,
+                ),
+            )
         )
-        statuses.append(status)
-    return statuses
+        .where(workflow_status.c.name == "workflow")
+        .order_by(
+            workflow_status.c.created_at.desc(), workflow_status.c.workflow_uuid.desc()
+        )
+        .limit(limit)
+    )
+    if statuses:
+        query = query.where(workflow_status.c.status.in_(statuses))
+    if after is not None:
+        query = query.where(
+            sa.tuple_(workflow_status.c.created_at, workflow_status.c.workflow_uuid)
+            < sa.tuple_(*after)
+        )
+    with system_database.connect() as connection:
+        return list(connection.execute(query).all())
+
+
+def operations_ms(condition: sa.ColumnElement) -> sa.ScalarSelect:
+    # The total milliseconds a workflow spent in the operations DBOS
+    # recorded for it that meet the condition.
+    return (
+        sa.select(
+            sa.func.sum(
+                operation_outputs.c.completed_at_epoch_ms
+                - operation_outputs.c.started_at_epoch_ms
+            )
+        )
+        .where(operation_outputs.c.workflow_uuid == workflow_status.c.workflow_uuid)
+        .where(condition)
+        .scalar_subquery()
+    )
+
+
+def to_workflow_status(row: sa.Row) -> WorkflowStatus:
+    # A workflow has no progress until it starts executing.
+    progress = read_progress(row.workflow_uuid, row.value, row.serialization)
+    workflow = WorkflowStatus(
+        workflow_id=row.workflow_uuid,
+        workflow_status=row.status,
+        steps_completed=progress.get("steps_completed") if progress else None,
+        num_steps=progress.get("num_steps") if progress else None,
+    )
+    # Timings are reported only once a workflow finishes, so they
+    # do not change, and stream to subscribers, with every step.
+    if row.status in ("SUCCESS", "ERROR"):
+        if row.started_at_epoch_ms is not None:
+            workflow.queue_seconds = (row.started_at_epoch_ms - row.created_at) / 1000
+        workflow.step_seconds = (row.step_ms or 0) / 1000
+        workflow.set_event_seconds = (row.set_event_ms or 0) / 1000
+    return workflow
+
+
+def read_progress(
+    workflow_id: str, value: Optional[str], serialization: Optional[str]
+) -> Optional[dict]:
+    # The worker publishes progress as portable JSON. Progress published
+    # in any other format is read through the DBOS client instead.
+    if value is None:
+        return None
+    if serialization == "portable_json":
+        return json.loads(value)
+    return client.get_event(workflow_id, WF_PROGRESS_KEY, timeout_seconds=0)
+
+
+def encode_cursor(row) -> str:
+    key = f"{row.created_at}|{row.workflow_uuid}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[int, str]]:
+    if cursor is None:
+        return None
+    try:
+        created_at, workflow_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        )
+        return int(created_at), workflow_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 # Serve the API router from the FastAPI app
 app.include_router(api)
 
 
+# Expose histograms of how long jobs wait in the queue, how long
+# their steps take, and how long each spends setting events, for
+# Prometheus to scrape.
+job_metrics = JobMetrics(system_database, "workflow")
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(
+        job_metrics.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 # Serve index.html for root
 @app.get("/")
 async def serve_index():
@@ -0,0 +1,169 @@
+import itertools
+import math
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+import sqlalchemy as sa
+from dbos import DBOSClient
+
+from database import requeue_running_jobs, sqlite_performance_engine
+
+# Define constants
+QUEUE_NAME = "workflow-queue"
+# How many worker processes to run
+MIN_WORKERS = int(os.environ.get("WORKER_MIN_PROCESSES", "1"))
+MAX_WORKERS = int(os.environ.get("WORKER_MAX_PROCESSES", "4"))
+# How many workflows each worker runs at once
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "10"))
+# Add a worker whenever the oldest enqueued job has waited this long
+MAX_WAIT_SECONDS = float(os.environ.get("WORKER_MAX_WAIT_SECONDS", "10"))
+# Retire a worker only once the pool has had more workers than
+# it needs for this long, so it does not shrink between bursts
+SCALE_DOWN_AFTER_SECONDS = float(
+    os.environ.get("WORKER_SCALE_DOWN_AFTER_SECONDS", "30")
+)
+CHECK_INTERVAL_SECONDS = float(os.environ.get("WORKER_CHECK_INTERVAL_SECONDS", "2"))
+worker_script = Path(__file__).parent / "worker.py"
+
+
+# The supervisor runs a pool of worker processes, growing and
+# shrinking it with the work on the queue. Each worker runs in
+# a slot whose number is part of its executor ID. A worker that
+# crashes is restarted in the same slot, and recovers its own
+# workflows when it launches. A worker that is retired stops
+# dequeuing and finishes the workflows it is running. If any
+# are still running when it exits, the supervisor puts them
+# back on the queue, so another worker runs them.
+class Supervisor:
+
+    def __init__(self, client: DBOSClient, engine: sa.Engine):
+        self.client = client
+        self.engine = engine
+        self.workers: Dict[int, subprocess.Popen] = {}
+        self.retiring: Dict[int, subprocess.Popen] = {}
+        self.over_provisioned_since: Optional[float] = None
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            self.reap()
+            queued, running, oldest_wait = self.check_queue()
+            self.scale(self.desired_workers(queued, running, oldest_wait))
+            stop.wait(CHECK_INTERVAL_SECONDS)
+        for worker in [*self.workers.values(), *self.retiring.values()]:
+            worker.terminate()
+        for worker in [*self.workers.values(), *self.retiring.values()]:
+            worker.wait()
+
+    def check_queue(self) -> Tuple[int, int, float]:
+        # How many jobs are enqueued and running, and how long the
+        # oldest enqueued job has waited. Jobs beyond what the largest
+        # pool runs at once would not change its size, so neither is
+        # counted beyond that.
+        limit = MAX_WORKERS * WORKER_CONCURRENCY
+        queued = self.client.list_queued_workflows(
+            queue_name=QUEUE_NAME,
+            status="ENQUEUED",
+            limit=limit,
+            load_input=False,
+            load_output=False,
+        )
+        running = self.client.list_queued_workflows(
+            queue_name=QUEUE_NAME,
+            status="PENDING",
+            limit=limit,
+            load_input=False,
+            load_output=False,
+        )
+        oldest_wait = 0.0
+        if queued and queued[0].created_at is not None:
+            oldest_wait = time.time() - queued[0].created_at / 1000
+        return len(queued), len(running), oldest_wait
+
+    def desired_workers(self, queued: int, running: int, oldest_wait: float) -> int:
+        # Enough workers to run every queued and running job at once,
+        # and one more than now whenever jobs wait too long.
+        desired = math.ceil((queued + running) / WORKER_CONCURRENCY)
+        if oldest_wait > MAX_WAIT_SECONDS:
+            desired = max(desired, len(self.workers) + 1)
+        return min(max(desired, MIN_WORKERS), MAX_WORKERS)
+
+    def scale(self, desired: int):
+        while len(self.workers) < desired:
+            in_use = self.slots_in_use()
+            self.start(next(slot for slot in itertools.count() if slot not in in_use))
+        if len(self.workers) <= desired:
+            self.over_provisioned_since = None
+            return
+        # Retire one worker at a time, the one in the highest slot.
+        now = time.monotonic()
+        if self.over_provisioned_since is None:
+            self.over_provisioned_since = now
+        elif now - self.over_provisioned_since >= SCALE_DOWN_AFTER_SECONDS:
+            self.retire(max(self.workers))
+            self.over_provisioned_since = now
+
+    def slots_in_use(self) -> Set[int]:
+        return set(self.workers) | set(self.retiring)
+
+    def start(self, slot: int):
+        print(f"Starting worker {slot}")
+        env = {
+            **os.environ,
+            "WORKER_EXECUTOR_ID": executor_id(slot),
+            "WORKER_CONCURRENCY": str(WORKER_CONCURRENCY),
+        }
+        self.workers[slot] = subprocess.Popen(
+            [sys.executable, str(worker_script)], env=env
+        )
+
+    def retire(self, slot: int):
+        print(f"Retiring worker {slot}")
+        worker = self.workers.pop(slot)
+        worker.terminate()
+        self.retiring[slot] = worker
+
+    def reap(self):
+        for slot, worker in list(self.retiring.items()):
+            if worker.poll() is not None:
+                del self.retiring[slot]
+                self.requeue_workflows(executor_id(slot))
+        for slot, worker in list(self.workers.items()):
+            if worker.poll() is not None:
+                print(f"Worker {slot} exited with code {worker.returncode}")
+                self.start(slot)
+
+    def requeue_workflows(self, executor: str):
+        # Workflows a retired worker left running are enqueued again,
+        # on the queue, so they still run by priority and within each
+        # worker's concurrency. The worker next started in its slot
+        # would recover them, but that might never happen.
+        requeued = requeue_running_jobs(self.engine, QUEUE_NAME, executor)
+        if requeued:
+            print(f"Requeued {requeued} workflows left running by {executor}")
+
+
+def executor_id(slot: int) -> str:
+    return f"worker-{slot}"
+
+
+if __name__ == "__main__":
+    system_database_url = os.environ.get(
+        "DBOS_SYSTEM_DATABASE_URL", "sqlite:///dbos_queue_worker.sqlite"
+    )
+    sqlite_engine = sqlite_performance_engine(system_database_url, pool_size=5)
+    client = DBOSClient(
+        system_database_url=system_database_url,
+        system_database_engine=sqlite_engine,
+    )
+    engine = sqlite_engine or sa.create_engine(system_database_url)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    Supervisor(client, engine).run(stop)
+    client.destroy()
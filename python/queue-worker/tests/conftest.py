@@ -0,0 +1,52 @@
+import importlib
+import sys
+
+import pytest
+from dbos import DBOS, DBOSConfig
+
+from database import sqlite_performance_engine
+
+
+@pytest.fixture()
+def system_database_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'dbos_queue_worker.sqlite'}"
+
+
+@pytest.fixture()
+def sqlite_engine(system_database_url):
+    engine = sqlite_performance_engine(
+        system_database_url, pool_size=5, performance_mode=True
+    )
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def dbos(system_database_url, sqlite_engine):
+    # Launch DBOS on a fresh SQLite system database in performance mode,
+    # as the worker does with SQLITE_PERFORMANCE_MODE=1.
+    DBOS.destroy()
+    config: DBOSConfig = {
+        "name": "dbos-queue-worker",
+        "system_database_url": system_database_url,
+        "application_version": "0.1.0",
+        "system_database_engine": sqlite_engine,
+    }
+    DBOS(config=config)
+    DBOS.launch()
+    yield
+    DBOS.destroy()
+
+
+@pytest.fixture()
+def server(dbos, system_database_url, monkeypatch):
+    # The server connects to the system database when imported, so
+    # import it again for each test's database.
+    monkeypatch.setenv("DBOS_SYSTEM_DATABASE_URL", system_database_url)
+    if "server" in sys.modules:
+        server = importlib.reload(sys.modules["server"])
+    else:
+        server = importlib.import_module("server")
+    yield server
+    server.client.destroy()
+    server.system_database.dispose()
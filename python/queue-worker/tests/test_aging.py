@@ -0,0 +1,71 @@
+import time
+
+import sqlalchemy as sa
+from dbos import DBOS, DBOSClient, EnqueueOptions
+
+import worker
+from aging import PriorityAging
+
+
+def test_promote(dbos, system_database_url, sqlite_engine, monkeypatch):
+    # Enqueue jobs on the workflow queue, which nothing dequeues yet,
+    # and leave all but one as if they had waited for a minute.
+    client = DBOSClient(
+        system_database_url=system_database_url, system_database_engine=sqlite_engine
+    )
+    jobs = {
+        "waiting": ("workflow-queue", 3, "ENQUEUED"),
+        "fresh": ("workflow-queue", 3, "ENQUEUED"),
+        "running": ("workflow-queue", 3, "PENDING"),
+        "other-queue": ("other-queue", 3, "ENQUEUED"),
+        "top": ("workflow-queue", None, "ENQUEUED"),
+    }
+    for workflow_id, (queue_name, priority, _) in jobs.items():
+        options: EnqueueOptions = {
+            "queue_name": queue_name,
+            "workflow_name": "workflow",
+            "workflow_id": workflow_id,
+        }
+        if priority is not None:
+            options["priority"] = priority
+        client.enqueue(options, 1)
+    workflow_status = sa.table(
+        "workflow_status",
+        sa.column("workflow_uuid"),
+        sa.column("status"),
+        sa.column("updated_at"),
+    )
+    waited = int(time.time() * 1000) - 61_000
+    with sqlite_engine.begin() as connection:
+        for workflow_id, (_, _, status) in jobs.items():
+            if workflow_id != "fresh":
+                connection.execute(
+                    sa.update(workflow_status)
+                    .where(workflow_status.c.workflow_uuid == workflow_id)
+                    .values(status=status, updated_at=waited)
+                )
+
+    def priorities():
+        return {
+            workflow.workflow_id: workflow.priority
+            for workflow in client.list_workflows(load_input=False, load_output=False)
+        }
+
+    # Only the job waiting on the queue for a minute is promoted, once
+    aging = PriorityAging(sqlite_engine, "workflow-queue", 60)
+    assert aging.promote() == 1
+    assert priorities() == {
+        "waiting": 2,
+        "fresh": 3,
+        "running": 3,
+        "other-queue": 3,
+        "top": 0,
+    }
+    assert aging.promote() == 0
+    assert priorities()["waiting"] == 2
+
+    # A promoted job still runs
+    monkeypatch.setattr(worker, "STEP_SECONDS", 0)
+    DBOS.register_queue("workflow-queue", priority_enabled=True)
+    assert DBOS.retrieve_workflow("waiting").get_result() == [None]
+    client.destroy()
@@ -0,0 +1,36 @@
+from blobs import BlobStore
+
+
+def test_small_outputs_stay_inline(tmp_path):
+    store = BlobStore(tmp_path / "blobs", offload_bytes=10)
+    assert store.offload("0123456789") == "0123456789"
+    assert store.resolve("0123456789") == "0123456789"
+    assert not (tmp_path / "blobs").exists()
+
+    # Without a threshold, nothing is offloaded
+    store = BlobStore(tmp_path / "blobs", offload_bytes=None)
+    assert store.offload("x" * 10_000) == "x" * 10_000
+    assert not (tmp_path / "blobs").exists()
+
+
+def test_blob_round_trip(tmp_path):
+    store = BlobStore(tmp_path / "blobs", offload_bytes=10)
+    data = "abcdef" * 100
+    reference = store.offload(data)
+    assert reference == {"blob": reference["blob"], "size": len(data)}
+    assert store.resolve(reference) == data
+    # Another store on the same directory, such as the server's, reads it
+    assert BlobStore(tmp_path / "blobs", offload_bytes=None).resolve(reference) == data
+
+
+def test_blob_dedup(tmp_path):
+    # Storing the same data twice, as a retried step may, writes one
+    # file, and leaves no temporary files behind.
+    store = BlobStore(tmp_path / "blobs", offload_bytes=10)
+    first = store.offload("a" * 100)
+    assert store.offload("a" * 100) == first
+    other = store.offload("b" * 100)
+    assert other != first
+    assert sorted(path.name for path in (tmp_path / "blobs").iterdir()) == sorted(
+        [first["blob"], other["blob"]]
+    )
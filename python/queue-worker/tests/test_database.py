@@ -0,0 +1,93 @@
+import importlib
+import importlib.metadata
+
+import pytest
+import sqlalchemy as sa
+from dbos import DBOS, DBOSClient, EnqueueOptions
+
+import database
+from database import sqlite_performance_engine
+
+
+@DBOS.workflow()
+def double(number: int) -> int:
+    return number * 2
+
+
+def test_performance_mode_off(system_database_url):
+    # With the mode off, or on Postgres, DBOS creates its own engine.
+    assert sqlite_performance_engine(system_database_url, pool_size=5) is None
+    assert (
+        sqlite_performance_engine(
+            "postgresql://postgres@localhost/queue_worker",
+            pool_size=5,
+            performance_mode=True,
+        )
+        is None
+    )
+
+
+def test_performance_mode_env_var(monkeypatch):
+    try:
+        monkeypatch.setenv("SQLITE_PERFORMANCE_MODE", "1")
+        assert importlib.reload(database).SQLITE_PERFORMANCE_MODE
+        monkeypatch.setenv("SQLITE_PERFORMANCE_MODE", "true")
+        assert not importlib.reload(database).SQLITE_PERFORMANCE_MODE
+        monkeypatch.delenv("SQLITE_PERFORMANCE_MODE")
+        assert not importlib.reload(database).SQLITE_PERFORMANCE_MODE
+    finally:
+        monkeypatch.undo()
+        importlib.reload(database)
+
+
+def test_performance_mode_pragmas(sqlite_engine):
+    # Every connection is set up for the performance mode, and with the
+    # settings DBOS applies to its own SQLite connections.
+    with sqlite_engine.connect() as connection:
+
+        def pragma(name: str):
+            return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+        assert pragma("journal_mode") == "wal"
+        # NORMAL
+        assert pragma("synchronous") == 1
+        assert pragma("busy_timeout") == 30000
+        assert pragma("foreign_keys") == 1
+        assert connection.connection.dbapi_connection.isolation_level == "IMMEDIATE"
+    assert sqlite_engine.pool.size() == 5
+
+
+def test_performance_mode_workflows(dbos, system_database_url, sqlite_engine):
+    # A client sharing the engine enqueues workflows, including in a
+    # transaction of its own, and DBOS runs them.
+    DBOS.register_queue("workflow-queue")
+    client = DBOSClient(
+        system_database_url=system_database_url, system_database_engine=sqlite_engine
+    )
+    options: EnqueueOptions = {
+        "queue_name": "workflow-queue",
+        "workflow_name": "double",
+    }
+    handle = client.enqueue(options, 1)
+    with sqlite_engine.begin() as connection:
+        handles = [
+            client.enqueue_in_transaction(connection, options, number)
+            for number in range(2, 5)
+        ]
+    assert handle.get_result() == 2
+    assert [handle.get_result() for handle in handles] == [4, 6, 8]
+
+    # The database file itself is in write-ahead logging mode,
+    # so its other users read it that way too.
+    with sa.create_engine(system_database_url).connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+
+
+def test_dbos_version_pin(sqlite_engine, monkeypatch):
+    # The helpers that update DBOS's tables directly run only with the
+    # DBOS version they were written for, the one pyproject.toml pins.
+    assert importlib.metadata.version("dbos") == database.DBOS_VERSION
+    database.workflow_status_table(sqlite_engine)
+    monkeypatch.setattr(database, "DBOS_VERSION", "0.0.0")
+    with pytest.raises(RuntimeError):
+        database.workflow_status_table(sqlite_engine)
@@ -0,0 +1,61 @@
+import time
+
+from dbos import DBOS
+from fastapi.testclient import TestClient
+
+import metrics
+import worker
+
+
+def read_metrics(api: TestClient) -> dict:
+    response = api.get("/metrics")
+    assert response.status_code == 200
+    return dict(
+        line.rsplit(" ", 1)
+        for line in response.text.splitlines()
+        if not line.startswith("#")
+    )
+
+
+def test_job_metrics(server, monkeypatch):
+    # The histograms start empty, with the jobs that finish after the
+    # server starts, which SQLite may record to the second.
+    api = TestClient(server.app)
+    time.sleep(1)
+    monkeypatch.setattr(metrics, "SETTLE_MS", 0)
+    monkeypatch.setattr(worker, "STEP_SECONDS", 0)
+    assert read_metrics(api)["queue_worker_job_queue_wait_seconds_count"] == "0"
+
+    # Run a job of two steps, which sets its progress three times
+    DBOS.register_queue("workflow-queue", priority_enabled=True)
+    response = api.post(
+        "/api/workflows/batch", json={"batch_id": "metrics", "jobs": [{"num_steps": 2}]}
+    )
+    assert response.json()["count"] == 1
+    DBOS.retrieve_workflow("metrics-0").get_result()
+    lines = read_metrics(api)
+
+    # It waited in the queue once, for less than the queue's polling
+    # interval plus SQLite's rounding
+    wait = "queue_worker_job_queue_wait_seconds"
+    assert lines[f"{wait}_count"] == "1"
+    assert lines[f'{wait}_bucket{{le="+Inf"}}'] == "1"
+    assert lines[f'{wait}_bucket{{le="5"}}'] == "1"
+    assert lines[f'{wait}_bucket{{le="3600"}}'] == "1"
+
+    # Each step took well under a second, and setting events is not
+    # counted as a step
+    step = "queue_worker_step_duration_seconds"
+    assert lines[f"{step}_count"] == "2"
+    assert lines[f'{step}_bucket{{le="1"}}'] == "2"
+    assert lines[f'{step}_bucket{{le="60"}}'] == "2"
+    assert lines[f'{step}_bucket{{le="+Inf"}}'] == "2"
+
+    # Its event-setting time is observed once, for the whole job
+    set_event = "queue_worker_job_set_event_seconds"
+    assert lines[f"{set_event}_count"] == "1"
+    assert lines[f'{set_event}_bucket{{le="2.5"}}'] == "1"
+    assert lines[f'{set_event}_bucket{{le="+Inf"}}'] == "1"
+
+    # Each job is counted only once
+    assert read_metrics(api) == lines
@@ -0,0 +1,127 @@
+import asyncio
+
+from dbos import SetWorkflowID
+from fastapi.testclient import TestClient
+
+import worker
+
+
+def enqueue_batch(api: TestClient, batch_id: str, jobs: int) -> int:
+    response = api.post(
+        "/api/workflows/batch",
+        json={"batch_id": batch_id, "jobs": [{"num_steps": 1}] * jobs},
+    )
+    assert response.status_code == 200
+    return response.json()["count"]
+
+
+def test_batch_resubmission(server):
+    # Resubmitting a batch enqueues none of its jobs again, and
+    # resubmitting it with more jobs enqueues only the new ones.
+    api = TestClient(server.app)
+    assert enqueue_batch(api, "backfill", 3) == 3
+    assert enqueue_batch(api, "backfill", 3) == 0
+    assert enqueue_batch(api, "backfill", 5) == 2
+    assert enqueue_batch(api, "other", 2) == 2
+    workflows = server.client.list_workflows(
+        name="workflow", load_input=False, load_output=False
+    )
+    assert sorted(workflow.workflow_id for workflow in workflows) == [
+        *(f"backfill-{index}" for index in range(5)),
+        "other-0",
+        "other-1",
+    ]
+    assert {workflow.status for workflow in workflows} == {"ENQUEUED"}
+
+
+def test_workflow_pages(server):
+    # Pages follow one another without gaps or repeats, even among
+    # workflows created at the same time, and the last full page is
+    # followed by an empty one.
+    api = TestClient(server.app)
+    enqueue_batch(api, "batch", 4)
+    workflow_ids = []
+    cursors = []
+    params = {"limit": 2}
+    while True:
+        response = api.get("/api/workflows", params=params)
+        assert response.status_code == 200
+        workflow_ids.append([w["workflow_id"] for w in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        cursors.append(cursor)
+        params["cursor"] = cursor
+    assert [len(page) for page in workflow_ids] == [2, 2, 0]
+    assert sorted(sum(workflow_ids, [])) == [f"batch-{index}" for index in range(4)]
+    assert len(cursors) == 2
+
+    # Newest first, with ties broken by ID
+    rows = server.fetch_workflows(4)
+    assert [row.workflow_uuid for row in rows] == sum(workflow_ids, [])
+    keys = [(row.created_at, row.workflow_uuid) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_invalid_cursor(server):
+    api = TestClient(server.app)
+    for cursor in ["not base64!", "bm8gc2VwYXJhdG9y", "YWJjfGJhdGNoLTA="]:
+        response = api.get("/api/workflows", params={"cursor": cursor})
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Invalid cursor"}
+
+
+def test_workflow_progress(server, monkeypatch):
+    # Progress the worker publishes as portable JSON is read in the
+    # same query as the workflows, without the DBOS client.
+    monkeypatch.setattr(worker, "STEP_SECONDS", 0)
+    with SetWorkflowID("progress-0"):
+        worker.workflow(3)
+    api = TestClient(server.app)
+    enqueue_batch(api, "waiting", 1)
+
+    def get_event(*args, **kwargs):
+        raise AssertionError("Progress was read through the client")
+
+    monkeypatch.setattr(server.client, "get_event", get_event)
+    response = api.get("/api/workflows")
+    workflows = {w["workflow_id"]: w for w in response.json()}
+    assert workflows["waiting-0"]["workflow_status"] == "ENQUEUED"
+    assert workflows["waiting-0"]["steps_completed"] is None
+    assert workflows["waiting-0"]["num_steps"] is None
+    assert workflows["progress-0"]["workflow_status"] == "SUCCESS"
+    assert workflows["progress-0"]["steps_completed"] == 3
+    assert workflows["progress-0"]["num_steps"] == 3
+
+    # Subscribers to the event stream share one read of the first
+    # page every PROGRESS_POLL_SECONDS.
+    pages = server.WorkflowPages()
+    first = asyncio.run(pages.get(()))
+    enqueue_batch(api, "later", 1)
+    assert asyncio.run(pages.get(())) == first
+    monkeypatch.setattr(server, "PROGRESS_POLL_SECONDS", 0)
+    assert {w.workflow_id for w in asyncio.run(pages.get(()))} == {
+        "progress-0",
+        "waiting-0",
+        "later-0",
+    }
+
+
+def test_workflow_result(server, monkeypatch, tmp_path):
+    # Outputs offloaded to the blob store are read back, and steps
+    # that produce no output return None.
+    monkeypatch.setattr(worker, "STEP_SECONDS", 0)
+    monkeypatch.setattr(worker.blob_store, "directory", tmp_path / "blobs")
+    monkeypatch.setattr(worker.blob_store, "offload_bytes", 10)
+    with SetWorkflowID("outputs"):
+        outputs = worker.workflow(2, 100)
+    with SetWorkflowID("no-outputs"):
+        worker.workflow(2)
+    assert all("blob" in output for output in outputs)
+    api = TestClient(server.app)
+    result = api.get("/api/workflows/outputs/result").json()
+    assert result["workflow_status"] == "SUCCESS"
+    assert [len(output) for output in result["outputs"]] == [100, 100]
+    result = api.get("/api/workflows/no-outputs/result").json()
+    assert result["outputs"] == [None, None]
+    assert api.get("/api/workflows/missing/result").status_code == 404
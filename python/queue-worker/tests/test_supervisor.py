@@ -0,0 +1,65 @@
+import sqlalchemy as sa
+from dbos import DBOS, DBOSClient, EnqueueOptions
+
+import worker
+from supervisor import QUEUE_NAME, Supervisor, executor_id
+
+
+def test_requeue_workflows(dbos, system_database_url, sqlite_engine, monkeypatch):
+    # Leave jobs as a retired worker might: one it was still running,
+    # one cancelled since, and one it finished. Another worker is
+    # running a job too, and so is the retired worker, on another queue.
+    client = DBOSClient(
+        system_database_url=system_database_url, system_database_engine=sqlite_engine
+    )
+    jobs = {
+        "running": (executor_id(1), QUEUE_NAME, "PENDING"),
+        "cancelled": (executor_id(1), QUEUE_NAME, "CANCELLED"),
+        "finished": (executor_id(1), QUEUE_NAME, "SUCCESS"),
+        "other-worker": (executor_id(0), QUEUE_NAME, "PENDING"),
+        "other-queue": (executor_id(1), "other-queue", "PENDING"),
+    }
+    for workflow_id, (_, queue_name, _) in jobs.items():
+        options: EnqueueOptions = {
+            "queue_name": queue_name,
+            "workflow_name": "workflow",
+            "workflow_id": workflow_id,
+        }
+        client.enqueue(options, 1)
+    workflow_status = sa.table(
+        "workflow_status",
+        sa.column("workflow_uuid"),
+        sa.column("executor_id"),
+        sa.column("status"),
+        sa.column("started_at_epoch_ms"),
+    )
+    with sqlite_engine.begin() as connection:
+        for workflow_id, (executor, _, status) in jobs.items():
+            connection.execute(
+                sa.update(workflow_status)
+                .where(workflow_status.c.workflow_uuid == workflow_id)
+                .values(executor_id=executor, status=status, started_at_epoch_ms=1)
+            )
+
+    # Only the job the retired worker was still running is requeued
+    supervisor = Supervisor(client, sqlite_engine)
+    supervisor.requeue_workflows(executor_id(1))
+    statuses = {
+        workflow.workflow_id: (workflow.status, workflow.queue_name)
+        for workflow in client.list_workflows(load_input=False, load_output=False)
+    }
+    assert statuses == {
+        "running": ("ENQUEUED", QUEUE_NAME),
+        "cancelled": ("CANCELLED", QUEUE_NAME),
+        "finished": ("SUCCESS", QUEUE_NAME),
+        "other-worker": ("PENDING", QUEUE_NAME),
+        "other-queue": ("PENDING", "other-queue"),
+    }
+
+    # A worker then dequeues and finishes it
+    monkeypatch.setattr(worker, "STEP_SECONDS", 0)
+    DBOS.register_queue(QUEUE_NAME, priority_enabled=True)
+    handle = DBOS.retrieve_workflow("running")
+    assert handle.get_result() == [None]
+    assert handle.get_status().executor_id == DBOS.executor_id
+    client.destroy()
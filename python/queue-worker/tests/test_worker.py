@@ -0,0 +1,54 @@
+import pytest
+
+import worker
+
+
+def published_steps(num_steps: int) -> list:
+    # The steps after which a workflow of num_steps publishes progress,
+    # starting with 0, when it starts.
+    progress = worker.ProgressReporter(num_steps)
+    published = []
+    for steps_completed in range(num_steps + 1):
+        if progress.due(steps_completed):
+            published.append(steps_completed)
+            progress.published = steps_completed
+    return published
+
+
+def test_progress_updates_default():
+    # By default, a 10-step job publishes every other step.
+    assert worker.MAX_PROGRESS_UPDATES == 5
+    assert published_steps(10) == [0, 2, 4, 6, 8, 10]
+
+
+@pytest.mark.parametrize(
+    "num_steps, max_updates, expected",
+    [
+        (10, 10, list(range(11))),
+        (10, 3, [0, 4, 8, 10]),
+        (100, 5, [0, 20, 40, 60, 80, 100]),
+        (3, 5, [0, 1, 2, 3]),
+        (1, 5, [0, 1]),
+        (0, 5, [0]),
+    ],
+)
+def test_progress_due(monkeypatch, num_steps, max_updates, expected):
+    # Progress is published when a workflow starts, every so many steps,
+    # and always after the last step, at most max_updates times after
+    # it starts.
+    monkeypatch.setattr(worker, "MAX_PROGRESS_UPDATES", max_updates)
+    published = published_steps(num_steps)
+    assert published == expected
+    assert len(published) - 1 <= max_updates
+
+
+def test_no_output(monkeypatch):
+    # Steps asked for no output return None, without the blob store.
+    def offload(data):
+        raise AssertionError("Offloaded an empty output")
+
+    monkeypatch.setattr(worker, "STEP_SECONDS", 0)
+    monkeypatch.setattr(worker.blob_store, "offload", offload)
+    assert worker.make_output(0) is None
+    assert worker.step(0, 0) is None
+    assert len(worker.make_output(10)) == 10
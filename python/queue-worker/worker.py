@@ -1,36 +1,150 @@
+import asyncio
+import math
 import os
+import signal
 import threading
 import time
+from typing import Optional
 
-from dbos import DBOS, DBOSConfig
+import sqlalchemy as sa
+from dbos import DBOS, DBOSConfig, WorkflowSerializationFormat
+
+from aging import PriorityAging
+from blobs import blob_store
+from database import sqlite_performance_engine
 
 # Define constants and models
 WF_PROGRESS_KEY = "workflow_progress"
+# How long each step takes
+STEP_SECONDS = float(os.environ.get("WORKER_STEP_SECONDS", "1"))
+# Each workflow publishes its progress at most this many
+# times, plus once when it starts, so a job of the default
+# 10 steps publishes every other step. Every worker must use
+# the same value, so recovered workflows replay exactly.
+MAX_PROGRESS_UPDATES = int(os.environ.get("WORKER_MAX_PROGRESS_UPDATES", "5"))
+# How many workflows this worker runs at once. By default, as
+# many as it dequeues. The supervisor sets this for its workers.
+WORKER_CONCURRENCY = (
+    int(os.environ["WORKER_CONCURRENCY"])
+    if "WORKER_CONCURRENCY" in os.environ
+    else None
+)
+# On SIGTERM, how long to wait for running workflows to finish
+SHUTDOWN_TIMEOUT_SECONDS = int(os.environ.get("WORKER_SHUTDOWN_TIMEOUT_SECONDS", "30"))
+# A waiting job's priority number drops by one every this many seconds
+PRIORITY_AGING_SECONDS = float(os.environ.get("WORKER_PRIORITY_AGING_SECONDS", "60"))
+
+
+# Workflows run in threads or, with WORKER_MODE=async, as
+# asyncio tasks. Each in-flight workflow in thread mode holds
+# a thread while its steps wait. In async mode, all in-flight
+# workflows share one event loop, so a single worker can wait
+# on thousands of I/O-bound steps, such as HTTP calls, at once.
+WORKER_MODE = os.environ.get("WORKER_MODE", "thread")
+
+
+# The server can query the progress event to obtain the
+# current progress of the workflow. It is published as
+# portable JSON, so the server can read many workflows'
+# progress in one query. Publishing progress after every
+# step would write to the system database as often as the
+# steps themselves, so updates are coalesced: progress is
+# published when the workflow starts, every so many steps,
+# and always on completion. Coalescing by step count rather
+# than by time keeps the workflow deterministic, so it
+# replays the same way.
+class ProgressReporter:
+
+    def __init__(self, num_steps: int):
+        self.num_steps = num_steps
+        self.every = max(1, math.ceil(num_steps / MAX_PROGRESS_UPDATES))
+        self.published = None
+
+    def due(self, steps_completed: int) -> bool:
+        return (
+            self.published is None
+            or steps_completed == self.num_steps
+            or steps_completed - self.published >= self.every
+        )
+
+    def update(self, steps_completed: int):
+        if self.due(steps_completed):
+            DBOS.set_event(
+                WF_PROGRESS_KEY,
+                self.progress(steps_completed),
+                serialization_type=WorkflowSerializationFormat.PORTABLE,
+            )
+            self.published = steps_completed
+
+    async def update_async(self, steps_completed: int):
+        if self.due(steps_completed):
+            await DBOS.set_event_async(
+                WF_PROGRESS_KEY,
+                self.progress(steps_completed),
+                serialization_type=WorkflowSerializationFormat.PORTABLE,
+            )
+            self.published = steps_completed
+
+    def progress(self, steps_completed: int) -> dict:
+        return {"steps_completed": steps_completed, "num_steps": self.num_steps}
 
 
 # This background workflow is submitted by the
 # web server. It runs a number of steps,
-# periodically reporting its progress.
-@DBOS.workflow()
-def workflow(num_steps: int):
-    progress = {
-        "steps_completed": 0,
-        "num_steps": num_steps,
-    }
-    # The server can query this event to obtain
-    # the current progress of the workflow
-    DBOS.set_event(WF_PROGRESS_KEY, progress)
-    for i in range(num_steps):
-        step(i)
-        # Update workflow progress each time a step completes
-        progress["steps_completed"] = i + 1
-        DBOS.set_event(WF_PROGRESS_KEY, progress)
+# periodically reporting its progress, and
+# returns the steps' outputs.
+if WORKER_MODE == "async":
+
+    @DBOS.workflow()
+    async def workflow(num_steps: int, output_bytes: int = 0):
+        progress = ProgressReporter(num_steps)
+        await progress.update_async(0)
+        outputs = []
+        for i in range(num_steps):
+            outputs.append(await step(i, output_bytes))
+            # Report workflow progress each time a step completes
+            await progress.update_async(i + 1)
+        return outputs
+
+    @DBOS.step()
+    async def step(i: int, output_bytes: int = 0):
+        print(f"Step {i} completed!")
+        await asyncio.sleep(STEP_SECONDS)
+        output = make_output(output_bytes)
+        if output is None:
+            return None
+        return await asyncio.to_thread(blob_store.offload, output)
+
+else:
 
+    @DBOS.workflow()
+    def workflow(num_steps: int, output_bytes: int = 0):
+        progress = ProgressReporter(num_steps)
+        progress.update(0)
+        outputs = []
+        for i in range(num_steps):
+            outputs.append(step(i, output_bytes))
+            # Report workflow progress each time a step completes
+            progress.update(i + 1)
+        return outputs
 
-@DBOS.step()
-def step(i: int):
-    print(f"Step {i} completed!")
-    time.sleep(1)
+    @DBOS.step()
+    def step(i: int, output_bytes: int = 0):
+        print(f"Step {i} completed!")
+        time.sleep(STEP_SECONDS)
+        output = make_output(output_bytes)
+        if output is None:
+            return None
+        return blob_store.offload(output)
+
+
+# Stands in for what a real step produces, such as the body
+# of an HTTP response. Large outputs go to the blob store.
+# Steps asked for no output produce none.
+def make_output(output_bytes: int) -> Optional[str]:
+    if output_bytes == 0:
+        return None
+    return os.urandom(output_bytes // 2).hex()
 
 
 # Configure and launch DBOS
@@ -38,16 +152,34 @@ if __name__ == "__main__":
     system_database_url = os.environ.get(
         "DBOS_SYSTEM_DATABASE_URL", "sqlite:///dbos_queue_worker.sqlite"
     )
+    sqlite_engine = sqlite_performance_engine(system_database_url, pool_size=20)
     config: DBOSConfig = {
         "name": "dbos-queue-worker",
         "system_database_url": system_database_url,
         "application_version": "0.1.0",
+        "system_database_engine": sqlite_engine,
+        # When run by the supervisor, each worker has its own
+        # executor ID, so it recovers only its own workflows.
+        "executor_id": os.environ.get("WORKER_EXECUTOR_ID"),
     }
     DBOS(config=config)
     DBOS.launch()
-    # Define a queue on which the web server
-    # can submit workflows for execution.
-    DBOS.register_queue("workflow-queue")
-    # After launching DBOS, the worker waits indefinitely,
-    # dequeuing and executing workflows.
-    threading.Event().wait()
+    # Define a queue on which the web server can submit
+    # workflows for execution, highest priority first.
+    DBOS.register_queue(
+        "workflow-queue", worker_concurrency=WORKER_CONCURRENCY, priority_enabled=True
+    )
+    # After launching DBOS, the worker dequeues and executes
+    # workflows until it is terminated. It then stops dequeuing
+    # and waits for the workflows it is running to finish.
+    # Meanwhile, it ages the priorities of waiting workflows.
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    aging = PriorityAging(
+        sqlite_engine or sa.create_engine(system_database_url),
+        "workflow-queue",
+        PRIORITY_AGING_SECONDS,
+    )
+    threading.Thread(target=aging.run, args=(stop,), daemon=True).start()
+    stop.wait()
+    DBOS.destroy(workflow_completion_timeout_sec=SHUTDOWN_TIMEOUT_SECONDS)
@@ -0,0 +1,132 @@
+# Multi-line cart checkout across a large catalog.
+
+# We stock a catalog of many SKUs, then many concurrent customers each check out a
+# cart of random SKUs, exactly as the /checkout endpoint does, once per cart size
+# and reservation mode. We report checkouts per second, p50 and p99 latency until
+# the checkout is ready for payment, and how many checkouts reserved their whole
+# cart. Carts overlap at random, so without locking products in a consistent
+# order, concurrent checkouts would deadlock. Afterwards, every checkout's payment
+# is failed so its inventory is returned.
+
+# Usage: python3 -m benchmarks.cart_checkout --skus 10000 --lines 1 5 20
+
+import argparse
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import List
+
+from dbos import DBOS, SetWorkflowID
+from sqlalchemy.dialects.postgresql import insert
+
+import widget_store.main as store
+from widget_store.schema import products
+
+from .common import launch, percentile, write_results
+
+MODES = ["separate", "combined", "group_commit"]
+
+# Enough inventory that no run sells out.
+SKU_INVENTORY = 1_000_000
+# SKUs get their own range of product IDs, clear of the store's real products.
+FIRST_SKU_ID = 1_000_000
+
+
+def stock_catalog(num_skus: int) -> List[int]:
+    # Create any missing SKUs and (re)stock all of them.
+    skus = list(range(FIRST_SKU_ID, FIRST_SKU_ID + num_skus))
+    rows = insert(products).values(
+        [
+            {
+                "product_id": product_id,
+                "product": f"SKU {product_id}",
+                "description": "A benchmark SKU",
+                "inventory": SKU_INVENTORY,
+                "price": Decimal("9.99"),
+            }
+            for product_id in skus
+        ]
+    )
+    with store.ds.engine.begin() as connection:
+        connection.execute(
+            rows.on_conflict_do_update(
+                index_elements=[products.c.product_id],
+                set_={"inventory": rows.excluded.inventory},
+            )
+        )
+    return skus
+
+
+def checkout(checkout_id: str, cart: store.Cart) -> float:
+    start = time.perf_counter()
+    with SetWorkflowID(checkout_id):
+        handle = DBOS.start_workflow(store.checkout_workflow, cart)
+    DBOS.get_event(handle.workflow_id, store.PAYMENT_ID)
+    return time.perf_counter() - start
+
+
+def reserved(checkout_id: str) -> bool:
+    # Checkouts that reserved their cart wait for payment; the others have finished.
+    return DBOS.get_workflow_status(checkout_id).status == "PENDING"
+
+
+def fail_payment(checkout_id: str) -> None:
+    DBOS.send(checkout_id, "failed", store.PAYMENT_STATUS)
+    DBOS.get_event(checkout_id, store.ORDER_ID)
+
+
+def run(
+    mode: str,
+    skus: List[int],
+    num_lines: int,
+    num_checkouts: int,
+    concurrency: int,
+):
+    store.RESERVATION_MODE = mode
+    checkout_ids = [str(uuid.uuid4()) for _ in range(num_checkouts)]
+    carts = [
+        [(sku, random.randint(1, 3)) for sku in random.sample(skus, num_lines)]
+        for _ in range(num_checkouts)
+    ]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        latencies = list(executor.map(checkout, checkout_ids, carts))
+        elapsed = time.perf_counter() - start
+        num_reserved = sum(executor.map(reserved, checkout_ids))
+        list(executor.map(fail_payment, checkout_ids))
+
+    return {
+        "mode": mode,
+        "skus": len(skus),
+        "lines_per_cart": num_lines,
+        "checkouts": num_checkouts,
+        "concurrency": concurrency,
+        "reserved": num_reserved,
+        "checkouts_per_sec": round(num_checkouts / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--skus", type=int, default=10_000)
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--checkouts", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    launch()
+    skus = stock_catalog(args.skus)
+    results = [
+        run(mode, skus, num_lines, args.checkouts, args.concurrency)
+        for num_lines in args.lines
+        for mode in args.modes
+    ]
+    DBOS.destroy()
+    write_results(results, args.output)
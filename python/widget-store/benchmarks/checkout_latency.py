@@ -0,0 +1,92 @@
+# Checkout latency and database commits per checkout, for each reservation mode.
+
+# For each mode, many concurrent customers start a checkout workflow and wait for
+# its payment ID, exactly as the /checkout endpoint does. We report p50 and p99
+# checkout latency and how many database commits each checkout made before it was
+# ready for payment, both in total and to the app database alone. Afterwards, every checkout's
+# payment is failed so its inventory is returned.
+
+# Usage: python3 -m benchmarks.checkout_latency --checkouts 1000 --concurrency 50
+
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dbos import DBOS, SetWorkflowID
+
+import widget_store.main as store
+
+from .common import CommitCounter, launch, percentile, write_results
+
+MODES = ["separate", "combined", "group_commit"]
+
+
+def checkout(checkout_id: str) -> float:
+    start = time.perf_counter()
+    with SetWorkflowID(checkout_id):
+        handle = DBOS.start_workflow(store.checkout_workflow)
+    DBOS.get_event(handle.workflow_id, store.PAYMENT_ID)
+    return time.perf_counter() - start
+
+
+def fail_payment(checkout_id: str) -> None:
+    DBOS.send(checkout_id, "failed", store.PAYMENT_STATUS)
+    DBOS.get_event(checkout_id, store.ORDER_ID)
+
+
+def run(
+    mode: str,
+    all_commits: CommitCounter,
+    app_commits: CommitCounter,
+    num_checkouts: int,
+    concurrency: int,
+):
+    store.RESERVATION_MODE = mode
+    store.ds.run_tx_step(
+        {"name": "consolidate_inventory"},
+        store.consolidate_inventory,
+        store.WIDGET_ID,
+        num_checkouts,
+    )
+    checkout_ids = [str(uuid.uuid4()) for _ in range(num_checkouts)]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        commits_before = all_commits.commits, app_commits.commits
+        start = time.perf_counter()
+        latencies = list(executor.map(checkout, checkout_ids))
+        elapsed = time.perf_counter() - start
+        commits = all_commits.commits - commits_before[0]
+        commits_to_app = app_commits.commits - commits_before[1]
+        list(executor.map(fail_payment, checkout_ids))
+
+    return {
+        "mode": mode,
+        "checkouts": num_checkouts,
+        "concurrency": concurrency,
+        "checkouts_per_sec": round(num_checkouts / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "commits_per_checkout": round(commits / num_checkouts, 2),
+        "app_commits_per_checkout": round(commits_to_app / num_checkouts, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--checkouts", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    launch()
+    all_commits = CommitCounter()
+    app_commits = CommitCounter(store.ds.engine)
+    results = [
+        run(mode, all_commits, app_commits, args.checkouts, args.concurrency)
+        for mode in args.modes
+    ]
+    store.ds.run_tx_step({"name": "restock"}, store.restock)
+    DBOS.destroy()
+    write_results(results, args.output)
@@ -0,0 +1,133 @@
+# Helpers shared by the widget store benchmarks.
+
+# The benchmarks drive the app's own database operations against a real Postgres,
+# so run them against a scratch database: they reset the widget's inventory.
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dbos import DBOS, DBOSConfig, SQLAlchemyDatasource
+from sqlalchemy import Engine, event, text
+
+import widget_store.main as store
+
+
+def get_database_url() -> str:
+    database_url = os.environ.get("DBOS_DATABASE_URL")
+    if database_url is None:
+        raise Exception("DBOS_DATABASE_URL not set")
+    return database_url
+
+
+def connect() -> SQLAlchemyDatasource:
+    # Point the app's datasource at the benchmark database, as main.py does at startup.
+    store.ds = SQLAlchemyDatasource.create(
+        get_database_url(), engine_kwargs={"pool_size": 64, "max_overflow": 0}
+    )
+    return store.ds
+
+
+def launch() -> None:
+    # Connect the app's datasource and launch DBOS in this process, so benchmarks
+    # can run the app's workflows directly.
+    connect()
+    config: DBOSConfig = {
+        "name": "widget-store",
+        "application_version": "0.1.0",
+        "system_database_url": get_database_url(),
+    }
+    DBOS(config=config)
+    DBOS.launch()
+
+
+class App:
+    # The app, run as a separate process (by default, on port 8000) so benchmarks can
+    # configure it through its environment, crash it, and restart it.
+
+    def __init__(self, log_path: str, env: Optional[Dict[str, str]] = None) -> None:
+        self.log = open(log_path, "a")
+        self.env = {**os.environ, **(env or {})}
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "widget_store.main"],
+            env=self.env,
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+
+    async def wait_until_up(self, client: httpx.AsyncClient) -> None:
+        while True:
+            try:
+                (await client.get("/metrics")).raise_for_status()
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+
+    async def crash(self, client: httpx.AsyncClient) -> None:
+        try:
+            await client.post("/crash_application")
+        except httpx.HTTPError:
+            pass
+        await asyncio.to_thread(self.process.wait)
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.wait()
+        self.log.close()
+
+
+class CommitCounter:
+    # Counts database commits made by this process through one engine or, by
+    # default, through every engine (the app's datasource and the system database).
+
+    def __init__(self, target: Any = Engine) -> None:
+        self.commits = 0
+        event.listen(target, "commit", self._on_commit)
+
+    def _on_commit(self, connection) -> None:
+        self.commits += 1
+
+
+# The DBOS system tables that grow with every workflow.
+SYSTEM_TABLES = [
+    "workflow_status",
+    "operation_outputs",
+    "datasource_outputs",
+    "notifications",
+    "workflow_events",
+    "workflow_events_history",
+]
+
+
+def count_system_rows() -> Dict[str, int]:
+    with store.ds.engine.connect() as connection:
+        return {
+            table: connection.execute(
+                text(f"SELECT count(*) FROM dbos.{table}")
+            ).scalar_one()
+            for table in SYSTEM_TABLES
+        }
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def write_results(results: Any, output: Optional[str]) -> None:
+    # Print results and, if requested, save them as JSON for run-to-run comparison.
+    text = json.dumps(results, indent=2, default=str)
+    print(text)
+    if output is not None:
+        with open(output, "w") as file:
+            file.write(text + "\n")
@@ -0,0 +1,116 @@
+# How many checkouts a running widget store keeps in flight at once.
+
+# Each /checkout request waits until its checkout workflow has reserved inventory and
+# published a payment ID. To make every request wait, we lock the widget's inventory,
+# fire many concurrent checkouts over HTTP, and count how many checkout workflows the
+# server starts while the lock is held. A server whose checkout endpoint holds a
+# threadpool thread per request starts at most one workflow per thread (40 by
+# default); the async endpoint starts one for every request. We then release the
+# lock and report checkout latency, and finally fail every payment so its inventory
+# is returned.
+
+# Start the app first (python3 -m widget_store.main), pointing both it and this
+# benchmark at the same scratch database.
+
+# Usage: python3 -m benchmarks.concurrent_checkouts --checkouts 1000 --hold 5
+
+import argparse
+import asyncio
+import time
+import uuid
+from typing import List
+
+import httpx
+from sqlalchemy import text
+
+import widget_store.main as store
+from widget_store.schema import inventory_shards, products
+
+from .common import connect, percentile, write_results
+
+STARTED_CHECKOUTS = text(
+    "SELECT count(*) FROM dbos.workflow_status"
+    " WHERE name LIKE '%checkout_workflow' AND created_at >= :since"
+)
+
+
+async def checkout(client: httpx.AsyncClient, checkout_id: str) -> float:
+    start = time.perf_counter()
+    response = await client.post(f"/checkout/{checkout_id}")
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def fail_payment(client: httpx.AsyncClient, checkout_id: str) -> None:
+    await client.post(f"/payment_webhook/{checkout_id}/failed")
+
+
+async def run(url: str, num_checkouts: int, hold_seconds: float, timeout: float):
+    ds = connect()
+    ds.run_tx_step(
+        {"name": "consolidate_inventory"},
+        store.consolidate_inventory,
+        store.WIDGET_ID,
+        num_checkouts,
+    )
+    checkout_ids = [str(uuid.uuid4()) for _ in range(num_checkouts)]
+    # One connection per request, so no request waits on another's connection
+    # and none reuses a connection the server has since closed as idle.
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+
+    async with httpx.AsyncClient(
+        base_url=url, limits=limits, timeout=timeout
+    ) as client:
+        with ds.engine.connect() as lock_connection:
+            # Lock the widget's inventory (including any shards) so no checkout
+            # can reserve it, and so none can return to its caller, until we let go.
+            lock_connection.execute(
+                products.select()
+                .where(products.c.product_id == store.WIDGET_ID)
+                .with_for_update()
+            )
+            lock_connection.execute(
+                inventory_shards.select()
+                .where(inventory_shards.c.product_id == store.WIDGET_ID)
+                .with_for_update()
+            )
+            since = int(time.time() * 1000)
+            start = time.perf_counter()
+            tasks = [
+                asyncio.create_task(checkout(client, checkout_id))
+                for checkout_id in checkout_ids
+            ]
+            await asyncio.sleep(hold_seconds)
+            with ds.engine.connect() as connection:
+                in_flight = connection.execute(
+                    STARTED_CHECKOUTS, {"since": since}
+                ).scalar_one()
+            lock_connection.rollback()
+
+        latencies: List[float] = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(
+            *[fail_payment(client, checkout_id) for checkout_id in checkout_ids]
+        )
+
+    return {
+        "checkouts": num_checkouts,
+        "hold_seconds": hold_seconds,
+        "in_flight_while_locked": in_flight,
+        "checkouts_per_sec": round(num_checkouts / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--checkouts", type=int, default=1000)
+    parser.add_argument("--hold", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.url, args.checkouts, args.hold, args.timeout))
+    write_results(results, args.output)
@@ -0,0 +1,200 @@
+# Crash the widget store mid-load and measure how long it takes to recover.
+
+# We start the app ourselves, then simulated customers, --customers at a time,
+# repeatedly check out and, --pay-after seconds later, pay. Waiting to pay keeps many
+# checkouts pending, as a crash would find them in production. After --crash-after
+# seconds, we crash the app through /crash_application and immediately restart it,
+# while the customers keep shopping and paying for the checkouts they started before
+# the crash. We report:
+# - how many workflows were pending when the app crashed,
+# - how long the app was down,
+# - how long the app took to recover them all, as its /metrics report,
+# - time to steady state: how long after the restart it took until a whole second
+#   of checkouts had a p50 latency within --tolerance of the pre-crash p50, and
+#   throughput within --tolerance of the pre-crash throughput.
+
+# Usage: python3 -m benchmarks.crash_recovery --customers 100 --crash-after 20
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import text
+
+import widget_store.main as store
+
+from .common import App, connect, percentile, write_results
+
+PENDING_WORKFLOWS = text(
+    "SELECT count(*) FROM dbos.workflow_status WHERE status IN ('PENDING', 'ENQUEUED')"
+)
+
+
+class Customers:
+
+    def __init__(self, client: httpx.AsyncClient, pay_after: float) -> None:
+        self.client = client
+        self.pay_after = pay_after
+        # (time completed, latency) of every successful checkout
+        self.checkouts: List[Tuple[float, float]] = []
+        self.payments = set()
+        self.errors = 0
+
+    async def shop(self, until: float) -> None:
+        while time.monotonic() < until:
+            try:
+                payment_id = await self.check_out()
+            except httpx.HTTPError:
+                self.errors += 1
+                await asyncio.sleep(0.1)
+                continue
+            self.payments.add(asyncio.create_task(self.pay(payment_id)))
+
+    async def check_out(self) -> str:
+        start = time.monotonic()
+        response = await self.client.post(f"/checkout/{uuid.uuid4()}")
+        response.raise_for_status()
+        self.checkouts.append((time.monotonic(), time.monotonic() - start))
+        return response.text
+
+    async def pay(self, payment_id: str) -> None:
+        # Retry until the payment goes through, including while the app is down.
+        await asyncio.sleep(random.uniform(0, 2 * self.pay_after))
+        while True:
+            try:
+                response = await self.client.post(f"/payment_webhook/{payment_id}/paid")
+                response.raise_for_status()
+                return
+            except httpx.HTTPError:
+                self.errors += 1
+                await asyncio.sleep(0.5)
+
+
+def by_second(
+    checkouts: List[Tuple[float, float]], start: float, end: float
+) -> Dict[int, List[float]]:
+    # The latencies of checkouts completed in each whole second from start to end.
+    seconds: Dict[int, List[float]] = defaultdict(list)
+    for completed, latency in checkouts:
+        if start <= completed < end:
+            seconds[int(completed - start)].append(latency)
+    return seconds
+
+
+def time_to_steady_state(
+    checkouts: List[Tuple[float, float]],
+    restarted: float,
+    end: float,
+    baseline_p50: float,
+    baseline_throughput: float,
+    tolerance: float,
+) -> Optional[int]:
+    seconds = by_second(checkouts, restarted, end)
+    for second in range(int(end - restarted)):
+        latencies = seconds.get(second, [])
+        enough = len(latencies) >= baseline_throughput * (1 - tolerance)
+        fast = percentile(latencies, 50) <= baseline_p50 * (1 + tolerance)
+        if enough and fast:
+            return second
+    return None
+
+
+def count_pending_workflows() -> int:
+    with store.ds.engine.connect() as connection:
+        return connection.execute(PENDING_WORKFLOWS).scalar_one()
+
+
+async def run(args) -> dict:
+    ds = connect()
+    # Enough widgets that nobody runs out, whatever happens during recovery.
+    ds.run_tx_step(
+        {"name": "consolidate_inventory"},
+        store.consolidate_inventory,
+        store.WIDGET_ID,
+        1_000_000,
+    )
+    # One connection per request, so none reuses a connection to the crashed app.
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+    app = App(args.log)
+
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=args.timeout
+    ) as client:
+        app.start()
+        await app.wait_until_up(client)
+        customers = Customers(client, args.pay_after)
+        start = time.monotonic()
+        end = start + args.crash_after + args.duration_after_crash
+        shopping = asyncio.gather(*[customers.shop(end) for _ in range(args.customers)])
+
+        await asyncio.sleep(args.crash_after)
+        # The pre-crash baseline skips the first few seconds, while the app warms up.
+        warm = start + args.crash_after / 4
+        crashed = time.monotonic()
+        before = [
+            latency
+            for completed, latency in customers.checkouts
+            if warm <= completed < crashed
+        ]
+        baseline_p50 = percentile(before, 50)
+        baseline_throughput = len(before) / (crashed - warm)
+        await app.crash(client)
+        pending_at_crash = await asyncio.to_thread(count_pending_workflows)
+
+        app.start()
+        await app.wait_until_up(client)
+        restarted = time.monotonic()
+        while not (recovery := (await client.get("/metrics")).json()["recovery"])[
+            "finished"
+        ]:
+            await asyncio.sleep(0.5)
+
+        await shopping
+        await asyncio.gather(*customers.payments)
+        app.stop()
+
+    steady = time_to_steady_state(
+        customers.checkouts,
+        restarted,
+        end,
+        baseline_p50,
+        baseline_throughput,
+        args.tolerance,
+    )
+    return {
+        "parameters": {
+            "customers": args.customers,
+            "pay_after": args.pay_after,
+            "crash_after": args.crash_after,
+            "tolerance": args.tolerance,
+        },
+        "pre_crash_checkouts_per_sec": round(baseline_throughput, 1),
+        "pre_crash_checkout_p50_ms": round(baseline_p50 * 1000, 2),
+        "pending_workflows_at_crash": pending_at_crash,
+        "downtime_seconds": round(restarted - crashed, 1),
+        "recovered_workflows": recovery["recovered"],
+        "recovery_seconds": recovery["seconds"],
+        "time_to_steady_state_seconds": steady,
+        "errors": customers.errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--pay-after", type=float, default=5.0)
+    parser.add_argument("--crash-after", type=float, default=20.0)
+    parser.add_argument("--duration-after-crash", type=float, default=40.0)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--log", default="crash_recovery.log")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    write_results(asyncio.run(run(args)), args.output)
@@ -0,0 +1,100 @@
+# System database write volume of the two order dispatch modes.
+
+# For each mode, we mark a batch of orders as paid and dispatch them all: in
+# "workflow" mode by starting one dispatch workflow per order, and in "sweeper"
+# mode by running the dispatch sweeper once per second (as its schedule would)
+# until every order is dispatched. We report the database commits made and the
+# rows written to the DBOS system tables while dispatching.
+
+# Usage: python3 -m benchmarks.dispatch_writes --orders 1000
+
+import argparse
+import time
+from datetime import datetime, timezone
+
+from dbos import DBOS
+from sqlalchemy import func, select
+
+import widget_store.main as store
+from widget_store.schema import OrderStatus, orders
+
+from .common import (
+    SYSTEM_TABLES,
+    CommitCounter,
+    count_system_rows,
+    launch,
+    write_results,
+)
+
+MODES = ["workflow", "sweeper"]
+
+
+def create_paid_orders(num_orders: int) -> list:
+    with store.ds.engine.begin() as connection:
+        return (
+            connection.execute(
+                orders.insert()
+                .values([{"order_status": OrderStatus.PAID.value}] * num_orders)
+                .returning(orders.c.order_id)
+            )
+            .scalars()
+            .all()
+        )
+
+
+def count_undispatched(order_ids: list) -> int:
+    with store.ds.engine.connect() as connection:
+        return connection.execute(
+            select(func.count())
+            .select_from(orders)
+            .where(orders.c.order_id.in_(order_ids))
+            .where(orders.c.order_status != OrderStatus.DISPATCHED.value)
+        ).scalar_one()
+
+
+def run(mode: str, commits: CommitCounter, num_orders: int) -> dict:
+    order_ids = create_paid_orders(num_orders)
+    rows_before = count_system_rows()
+    commits_before = commits.commits
+    start = time.perf_counter()
+
+    if mode == "workflow":
+        handles = [
+            DBOS.start_workflow(store.dispatch_order_workflow, order_id)
+            for order_id in order_ids
+        ]
+        for handle in handles:
+            handle.get_result()
+    else:
+        while count_undispatched(order_ids) > 0:
+            now = datetime.now(timezone.utc)
+            DBOS.start_workflow(store.dispatch_sweeper_workflow, now, now).get_result()
+            time.sleep(1)
+
+    elapsed = time.perf_counter() - start
+    rows_after = count_system_rows()
+    rows_written = {
+        table: rows_after[table] - rows_before[table] for table in SYSTEM_TABLES
+    }
+    return {
+        "mode": mode,
+        "orders": num_orders,
+        "seconds": round(elapsed, 1),
+        "commits": commits.commits - commits_before,
+        "system_rows_written": rows_written,
+        "system_rows_per_order": round(sum(rows_written.values()) / num_orders, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    launch()
+    commits = CommitCounter()
+    results = [run(mode, commits, args.orders) for mode in args.modes]
+    DBOS.destroy()
+    write_results(results, args.output)
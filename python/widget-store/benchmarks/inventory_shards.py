@@ -0,0 +1,78 @@
+# Inventory reservation throughput versus shard count.
+
+# Many threads repeatedly run the checkout workflow's reserve_inventory transaction
+# against the widget for a fixed duration, once per shard count, and we report
+# committed reservations per second. With one shard every reservation queues on
+# the same row lock; with more shards they proceed in parallel.
+
+# Usage: python3 -m benchmarks.inventory_shards --shards 1 2 4 8 16 --threads 32
+
+import argparse
+import threading
+import time
+
+import widget_store.main as store
+
+from .common import connect, write_results
+
+# Enough inventory that no run sells out.
+BENCHMARK_INVENTORY = 10_000_000
+
+
+def run(num_shards: int, num_threads: int, duration: float) -> dict:
+    store.INVENTORY_SHARDS = num_shards
+    store.ds.run_tx_step(
+        {"name": "consolidate_inventory"},
+        store.consolidate_inventory,
+        store.WIDGET_ID,
+        BENCHMARK_INVENTORY,
+    )
+
+    reserved = [0] * num_threads
+    deadline = time.monotonic() + duration
+
+    def reserve(thread_index: int) -> None:
+        while time.monotonic() < deadline:
+            if store.ds.run_tx_step(
+                {"name": "reserve_inventory", "isolation_level": "READ COMMITTED"},
+                store.reserve_inventory,
+                store.DEFAULT_CART,
+            ):
+                reserved[thread_index] += 1
+
+    threads = [threading.Thread(target=reserve, args=(i,)) for i in range(num_threads)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    return {
+        "shards": num_shards,
+        "threads": num_threads,
+        "reservations": sum(reserved),
+        "reservations_per_sec": round(sum(reserved) / elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    connect()
+    results = [run(n, args.threads, args.duration) for n in args.shards]
+
+    # Leave the store the way the app expects to find it.
+    store.INVENTORY_SHARDS = 1
+    store.ds.run_tx_step(
+        {"name": "consolidate_inventory"},
+        store.consolidate_inventory,
+        store.WIDGET_ID,
+        100,
+    )
+    write_results(results, args.output)
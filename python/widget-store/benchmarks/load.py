@@ -0,0 +1,232 @@
+# End-to-end load test of a running widget store: checkout, payment, and dispatch.
+
+# Simulated customers, --customers at a time, each repeatedly check out over HTTP and
+# then call the payment webhook, until --checkouts checkouts have been made. A
+# --failed-payments fraction of payments fail, and the rest are paid. Once the last
+# payment is made, we wait for every paid order to be dispatched. We report:
+# - checkouts completed per second,
+# - p50/p95/p99 latency of /checkout and /payment_webhook,
+# - how long dispatch took to catch up after the last payment,
+# - rows added to the DBOS system tables, in total and per checkout,
+# - time backends spent waiting on locks, sampled from pg_stat_activity.
+# Results are written as JSON along with the run's parameters. Pass --baseline with
+# an earlier run's results to also report how much each metric changed since then.
+
+# Start the app first (python3 -m widget_store.main), pointing both it and this
+# benchmark at the same scratch database.
+
+# Usage: python3 -m benchmarks.load --checkouts 2000 --customers 100 --output load.json
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import func, select, text
+
+import widget_store.main as store
+from widget_store.schema import OrderStatus, orders
+
+from .common import (
+    SYSTEM_TABLES,
+    connect,
+    count_system_rows,
+    percentile,
+    write_results,
+)
+
+LOCK_WAITERS = text(
+    "SELECT count(*) FROM pg_stat_activity"
+    " WHERE wait_event_type = 'Lock' AND datname = current_database()"
+)
+
+
+class LockWaitSampler:
+    # Samples how many backends are waiting on a lock every `interval` seconds.
+    # Each sample stands for `interval` seconds of waiting per waiting backend.
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.wait_seconds = 0.0
+        self.max_waiters = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "LockWaitSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        with store.ds.engine.connect() as connection:
+            while not self._stop.wait(self.interval):
+                waiters = connection.execute(LOCK_WAITERS).scalar_one()
+                connection.rollback()
+                self.wait_seconds += waiters * self.interval
+                self.max_waiters = max(self.max_waiters, waiters)
+
+
+class Customers:
+
+    def __init__(self, client: httpx.AsyncClient, failed_payments: float) -> None:
+        self.client = client
+        self.failed_payments = failed_payments
+        self.checkout_latencies: List[float] = []
+        self.payment_latencies: List[float] = []
+        self.paid_order_ids: List[int] = []
+        self.errors = 0
+
+    async def shop(self, checkouts: "asyncio.Queue[str]") -> None:
+        while not checkouts.empty():
+            try:
+                await self.check_out(checkouts.get_nowait())
+            except httpx.HTTPError:
+                self.errors += 1
+
+    async def check_out(self, idempotency_key: str) -> None:
+        start = time.perf_counter()
+        response = await self.client.post(f"/checkout/{idempotency_key}")
+        self.checkout_latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        payment_id = response.text
+
+        paid = random.random() >= self.failed_payments
+        status = "paid" if paid else "failed"
+        start = time.perf_counter()
+        response = await self.client.post(f"/payment_webhook/{payment_id}/{status}")
+        self.payment_latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        if paid:
+            self.paid_order_ids.append(int(response.text))
+
+
+def count_undispatched(order_ids: List[int]) -> int:
+    with store.ds.engine.connect() as connection:
+        return connection.execute(
+            select(func.count())
+            .select_from(orders)
+            .where(orders.c.order_id.in_(order_ids))
+            .where(orders.c.order_status != OrderStatus.DISPATCHED.value)
+        ).scalar_one()
+
+
+def wait_for_dispatch(order_ids: List[int], timeout: float) -> int:
+    # Wait until every paid order is dispatched, returning how many never were.
+    deadline = time.monotonic() + timeout
+    while True:
+        undispatched = count_undispatched(order_ids) if order_ids else 0
+        if undispatched == 0 or time.monotonic() > deadline:
+            return undispatched
+        time.sleep(0.5)
+
+
+def latency_metrics(name: str, latencies: List[float]) -> Dict[str, float]:
+    return {
+        f"{name}_p{p}_ms": round(percentile(latencies, p) * 1000, 2)
+        for p in (50, 95, 99)
+    }
+
+
+def compare(metrics: dict, baseline: dict) -> Dict[str, Optional[float]]:
+    # The relative change in each metric since the baseline run.
+    return {
+        name: (
+            round((value - baseline[name]) / baseline[name], 3)
+            if baseline.get(name)
+            else None
+        )
+        for name, value in metrics.items()
+    }
+
+
+async def run(args) -> dict:
+    ds = connect()
+    ds.run_tx_step(
+        {"name": "consolidate_inventory"},
+        store.consolidate_inventory,
+        store.WIDGET_ID,
+        args.checkouts,
+    )
+    checkouts: "asyncio.Queue[str]" = asyncio.Queue()
+    for _ in range(args.checkouts):
+        checkouts.put_nowait(str(uuid.uuid4()))
+    # One connection per request, so none reuses a connection the server has
+    # since closed as idle.
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+
+    rows_before = count_system_rows()
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=args.timeout
+    ) as client:
+        customers = Customers(client, args.failed_payments)
+        with LockWaitSampler() as lock_waits:
+            start = time.perf_counter()
+            await asyncio.gather(
+                *[customers.shop(checkouts) for _ in range(args.customers)]
+            )
+            elapsed = time.perf_counter() - start
+            dispatch_start = time.perf_counter()
+            undispatched = await asyncio.to_thread(
+                wait_for_dispatch, customers.paid_order_ids, args.dispatch_timeout
+            )
+            dispatch_seconds = time.perf_counter() - dispatch_start
+    rows_after = count_system_rows()
+    rows_written = {
+        table: rows_after[table] - rows_before[table] for table in SYSTEM_TABLES
+    }
+
+    completed = len(customers.payment_latencies)
+    metrics = {
+        "checkouts_per_sec": round(completed / elapsed, 1),
+        **latency_metrics("checkout", customers.checkout_latencies),
+        **latency_metrics("payment", customers.payment_latencies),
+        "dispatch_seconds": round(dispatch_seconds, 1),
+        "undispatched": undispatched,
+        "system_rows_per_checkout": round(
+            sum(rows_written.values()) / max(completed, 1), 2
+        ),
+        "lock_wait_seconds": round(lock_waits.wait_seconds, 2),
+        "max_lock_waiters": lock_waits.max_waiters,
+        "errors": customers.errors,
+    }
+    results = {
+        "parameters": {
+            "url": args.url,
+            "checkouts": args.checkouts,
+            "customers": args.customers,
+            "failed_payments": args.failed_payments,
+        },
+        "completed_checkouts": completed,
+        "paid_orders": len(customers.paid_order_ids),
+        "metrics": metrics,
+        "system_rows_written": rows_written,
+    }
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            results["change_since_baseline"] = compare(
+                metrics, json.load(file)["metrics"]
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--checkouts", type=int, default=1000)
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--failed-payments", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--dispatch-timeout", type=float, default=120.0)
+    parser.add_argument("--baseline", help="Compare against this earlier results file")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    write_results(asyncio.run(run(args)), args.output)
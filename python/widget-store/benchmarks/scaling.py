@@ -0,0 +1,106 @@
+# Checkout throughput of the widget store as it scales out to more app processes.
+
+# For each --processes count, we start the app with that many processes
+# (WIDGET_STORE_PROCESSES), each serving its own port. Simulated customers,
+# --customers in total and spread evenly across the processes as a load balancer
+# would, then make --checkouts checkouts over HTTP, failing each payment so its
+# inventory is returned. We report checkouts completed per second and p50/p99
+# checkout latency at each process count, and the speedup over the first count.
+
+# Usage: python3 -m benchmarks.scaling --processes 1 2 4 8 --checkouts 2000
+
+import argparse
+import asyncio
+import time
+import uuid
+from typing import List
+
+import httpx
+
+import widget_store.main as store
+
+from .common import App, connect, percentile, write_results
+from .load import Customers
+
+
+async def run(num_processes: int, args) -> dict:
+    ports = [args.port + index for index in range(num_processes)]
+    app = App(
+        args.log,
+        env={
+            "WIDGET_STORE_PROCESSES": str(num_processes),
+            "WIDGET_STORE_PORT": str(args.port),
+        },
+    )
+    checkouts: "asyncio.Queue[str]" = asyncio.Queue()
+    for _ in range(args.checkouts):
+        checkouts.put_nowait(str(uuid.uuid4()))
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+
+    clients = [
+        httpx.AsyncClient(
+            base_url=f"http://localhost:{port}", limits=limits, timeout=args.timeout
+        )
+        for port in ports
+    ]
+    app.start()
+    try:
+        await asyncio.gather(*[app.wait_until_up(client) for client in clients])
+        # Every customer fails their payment, so checkouts return their inventory.
+        customers = [Customers(client, failed_payments=1.0) for client in clients]
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                customers[i % num_processes].shop(checkouts)
+                for i in range(args.customers)
+            ]
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        app.stop()
+        for client in clients:
+            await client.aclose()
+
+    latencies: List[float] = [
+        latency for c in customers for latency in c.checkout_latencies
+    ]
+    completed = sum(len(c.payment_latencies) for c in customers)
+    return {
+        "processes": num_processes,
+        "checkouts": args.checkouts,
+        "customers": args.customers,
+        "checkouts_per_sec": round(completed / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "errors": sum(c.errors for c in customers),
+    }
+
+
+async def run_all(args) -> List[dict]:
+    ds = connect()
+    ds.run_tx_step(
+        {"name": "consolidate_inventory"},
+        store.consolidate_inventory,
+        store.WIDGET_ID,
+        args.checkouts,
+    )
+    results = [await run(num_processes, args) for num_processes in args.processes]
+    for result in results:
+        result["speedup"] = round(
+            result["checkouts_per_sec"] / results[0]["checkouts_per_sec"], 2
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--checkouts", type=int, default=2000)
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--log", default="scaling.log")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    write_results(asyncio.run(run_all(args)), args.output)
@@ -10,8 +10,12 @@ db_url = make_url(os.environ.get("DBOS_DATABASE_URL", "postgresql+psycopg://post
 engine = create_engine(db_url)
 
 with engine.connect() as connection:
-    # Delete all existing entries
+    # Delete all existing entries, archived orders included
+    connection.execute(delete(schema.order_items_archive))
+    connection.execute(delete(schema.orders_archive))
+    connection.execute(delete(schema.order_items))
     connection.execute(delete(schema.orders))
+    connection.execute(delete(schema.inventory_shards))
     connection.execute(delete(schema.products))
 
     # Insert seed entry
@@ -1,7 +1,13 @@
 import os
+from decimal import Decimal
+from unittest.mock import patch
 
 import pytest
-from dbos import DBOS, DBOSConfig
+from dbos import DBOS, DBOSConfig, SQLAlchemyDatasource
+from sqlalchemy import create_engine, insert
+
+import widget_store.main as widget_store
+from widget_store import schema
 
 
 @pytest.fixture()
@@ -23,3 +29,28 @@ def dbos(test_database_url):
     DBOS(config=config)
     DBOS.reset_system_database(truncate=True)
     DBOS.launch()
+
+
+@pytest.fixture()
+def store_ds(test_database_url):
+    # Create the app's tables in the test database, seed the widget, and point
+    # the app at a datasource on the test database.
+    engine = create_engine(test_database_url)
+    schema.metadata.drop_all(engine)
+    schema.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(schema.products).values(
+                product_id=widget_store.WIDGET_ID,
+                product="Premium Quality Widget",
+                description="Enhance your productivity with our top-rated widgets!",
+                inventory=100,
+                price=Decimal("99.99"),
+            )
+        )
+    engine.dispose()
+
+    ds = SQLAlchemyDatasource.create(test_database_url)
+    with patch.object(widget_store, "ds", ds, create=True):
+        yield ds
+    ds.engine.dispose()
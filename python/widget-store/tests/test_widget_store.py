@@ -1,9 +1,36 @@
-from unittest.mock import MagicMock, patch
+import asyncio
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from dbos import DBOS
+from dbos import DBOS, DBOSClient, DBOSConfig, EnqueueOptions, Queue, SetWorkflowID
+from fastapi.testclient import TestClient
+from sqlalchemy import case, column, create_engine, select, table
 
 import widget_store.main as widget_store
-from widget_store.schema import OrderStatus
+from widget_store.cache import ReadThroughCache
+from widget_store.notifications import Notifier
+from widget_store.recovery import RecoveryMonitor
+from widget_store.schema import (
+    OrderStatus,
+    inventory_shards,
+    order_items,
+    order_items_archive,
+    orders,
+    orders_archive,
+    products,
+)
+
+
+def get_inventory(ds, product_id):
+    return ds.run_tx_step(None, widget_store.get_product, product_id)["inventory"]
 
 
 def test_checkout_workflow(dbos):
@@ -15,13 +42,13 @@ def test_checkout_workflow(dbos):
 
     # Create a mock for each of the workflow's database transactions
     mock_create_order = MagicMock(return_value=order_id)
-    mock_reserve_inventory = MagicMock(return_value=True)
-    mock_undo_reserve_inventory = MagicMock()
-    mock_update_order_status = MagicMock()
+    mock_reserve_order_inventory = MagicMock(return_value=True)
+    mock_cancel_order = MagicMock()
+    mock_update_order_status = MagicMock(return_value=True)
     mocks = {
         widget_store.create_order: mock_create_order,
-        widget_store.reserve_inventory: mock_reserve_inventory,
-        widget_store.undo_reserve_inventory: mock_undo_reserve_inventory,
+        widget_store.reserve_order_inventory: mock_reserve_order_inventory,
+        widget_store.cancel_order: mock_cancel_order,
         widget_store.update_order_status: mock_update_order_status,
     }
 
@@ -33,29 +60,651 @@ def test_checkout_workflow(dbos):
     mock_ds = MagicMock()
     mock_ds.run_tx_step.side_effect = run_mocked_tx_step
 
-    # Also mock the payment message the workflow waits for and the
+    # Also mock the payment message the workflow waits for and the per-order
     # dispatch workflow it starts, then run the workflow.
     with (
         patch.object(widget_store, "ds", mock_ds, create=True),
+        patch.object(widget_store, "DISPATCH_MODE", "workflow"),
         patch.object(DBOS, "recv", return_value="paid") as mock_recv,
-        patch.object(DBOS, "start_workflow") as mock_start_workflow,
+        patch.object(widget_store.dispatch_queue, "enqueue") as mock_enqueue,
     ):
         widget_store.checkout_workflow()
 
     # Verify an order was created and inventory was reserved for it
-    mock_create_order.assert_called_once_with()
-    mock_reserve_inventory.assert_called_once_with()
+    mock_create_order.assert_called_once_with(widget_store.DEFAULT_CART)
+    mock_reserve_order_inventory.assert_called_once_with(
+        order_id, widget_store.DEFAULT_CART
+    )
 
     # Verify the workflow waited for the payment webhook
     mock_recv.assert_called_once_with(widget_store.PAYMENT_STATUS)
 
     # Verify the paid order was marked paid and handed to the dispatch workflow
     mock_update_order_status.assert_called_once_with(
-        order_id=order_id, status=OrderStatus.PAID.value
+        order_id=order_id,
+        status=OrderStatus.PAID.value,
+        from_status=OrderStatus.PENDING.value,
+    )
+    mock_enqueue.assert_called_once_with(widget_store.dispatch_order_workflow, order_id)
+
+    # Verify that because payment succeeded, the order was never cancelled
+    mock_cancel_order.assert_not_called()
+
+
+def test_checkout_endpoints(dbos, store_ds):
+    """
+    Test that the async checkout and payment endpoints drive a checkout
+    workflow from "buy now" through payment.
+    """
+    # Keep one event loop for every request: DBOS lends that loop its thread pool.
+    with TestClient(widget_store.app) as client:
+        response = client.post("/checkout/test-checkout")
+        assert response.status_code == 200
+        payment_id = response.text
+        assert payment_id == "test-checkout"
+
+        response = client.post(f"/payment_webhook/{payment_id}/paid")
+        assert response.status_code == 200
+        order_id = int(response.text)
+        assert client.get(f"/order/{order_id}").json()["order_status"] in (
+            OrderStatus.PAID.value,
+            OrderStatus.DISPATCHED.value,
+        )
+
+
+def test_sharded_inventory(store_ds):
+    """
+    Test that sharded reservations sweep past sold-out shards until the
+    product's inventory is exhausted, and that restocking spreads
+    inventory evenly across all shards.
+    """
+    cart = widget_store.DEFAULT_CART
+    with patch.object(widget_store, "INVENTORY_SHARDS", 4):
+        # Spread 3 widgets over 4 shards, so one shard starts out empty
+        store_ds.run_tx_step(
+            None, widget_store.consolidate_inventory, widget_store.WIDGET_ID, 3
+        )
+
+        # Every widget can be reserved no matter which shard is picked first
+        for _ in range(3):
+            assert store_ds.run_tx_step(None, widget_store.reserve_inventory, cart)
+        assert not store_ds.run_tx_step(None, widget_store.reserve_inventory, cart)
+        assert get_inventory(store_ds, widget_store.WIDGET_ID) == 0
+
+        # Restocking rebalances the inventory evenly across shards
+        store_ds.run_tx_step(None, widget_store.restock)
+        with store_ds.engine.connect() as connection:
+            shards = connection.execute(
+                inventory_shards.select().order_by(inventory_shards.c.shard_id)
+            ).mappings()
+            assert [s["inventory"] for s in shards] == [25, 25, 25, 25]
+        assert get_inventory(store_ds, widget_store.WIDGET_ID) == 100
+
+
+def test_reserve_and_create_orders(store_ds):
+    """
+    Test that combined and group-committed reservations create each order
+    as pending or cancelled depending on whether inventory remained, and
+    that retrying a batch returns the orders it already created.
+    """
+    store_ds.run_tx_step(None, widget_store.consolidate_inventory, 1, 3)
+    cart = widget_store.DEFAULT_CART
+
+    # A combined reservation creates a pending order while inventory remains
+    order_id, reserved = store_ds.run_tx_step(
+        None, widget_store.reserve_and_create_order, cart
+    )
+    assert reserved
+    order = store_ds.run_tx_step(None, widget_store.get_order, order_id)
+    assert order["order_status"] == OrderStatus.PENDING.value
+
+    # A batch reserves the last two widgets and cancels the third order
+    batch = store_ds.run_tx_step(
+        None,
+        widget_store.reserve_and_create_orders,
+        [("a", cart), ("b", cart), ("c", cart)],
+    )
+    assert [reserved for _, reserved in batch] == [True, True, False]
+    order = store_ds.run_tx_step(None, widget_store.get_order, batch[2][0])
+    assert order["order_status"] == OrderStatus.CANCELLED.value
+
+    # Retrying part of the batch returns the same orders without reserving again
+    retried = store_ds.run_tx_step(
+        None, widget_store.reserve_and_create_orders, [("c", cart), ("a", cart)]
+    )
+    assert retried == [batch[2], batch[0]]
+    assert get_inventory(store_ds, widget_store.WIDGET_ID) == 0
+
+    # Once inventory is gone, combined reservations create cancelled orders
+    order_id, reserved = store_ds.run_tx_step(
+        None, widget_store.reserve_and_create_order, cart
+    )
+    assert not reserved
+
+
+def test_cart_reservation(store_ds):
+    """
+    Test that a multi-product cart is reserved all-or-nothing, whether
+    reserved alone, alongside a sharded widget, or in a batch.
+    """
+    with store_ds.engine.begin() as connection:
+        connection.execute(
+            products.insert(),
+            [
+                {
+                    "product_id": product_id,
+                    "product": f"Gadget {product_id}",
+                    "description": "A gadget",
+                    "inventory": 2,
+                    "price": Decimal("9.99"),
+                }
+                for product_id in [2, 3]
+            ],
+        )
+
+    # Lines are merged and sorted by product ID
+    cart = widget_store.normalize_cart([(3, 1), (2, 1), (3, 1)])
+    assert cart == [(2, 1), (3, 2)]
+
+    # Gadget 3 sells out, so a second cart needing it reserves nothing
+    assert store_ds.run_tx_step(None, widget_store.reserve_inventory, cart)
+    assert not store_ds.run_tx_step(None, widget_store.reserve_inventory, cart)
+    assert not store_ds.run_tx_step(None, widget_store.reserve_inventory, [(4, 1)])
+    assert get_inventory(store_ds, 2) == 1
+    assert get_inventory(store_ds, 3) == 0
+
+    # Returning the cart's inventory restores every line
+    store_ds.run_tx_step(None, widget_store.undo_reserve_inventory, cart)
+    assert (get_inventory(store_ds, 2), get_inventory(store_ds, 3)) == (2, 2)
+
+    # With the widget sharded, a cart that can't get enough widgets
+    # doesn't keep the gadgets it reserved either
+    with patch.object(widget_store, "INVENTORY_SHARDS", 4):
+        store_ds.run_tx_step(
+            None, widget_store.consolidate_inventory, widget_store.WIDGET_ID, 6
+        )
+        assert store_ds.run_tx_step(
+            None, widget_store.reserve_inventory, [(1, 5), (2, 1)]
+        )
+        assert not store_ds.run_tx_step(
+            None, widget_store.reserve_inventory, [(1, 2), (2, 1)]
+        )
+        assert get_inventory(store_ds, widget_store.WIDGET_ID) == 1
+        assert get_inventory(store_ds, 2) == 1
+
+        # A batch fills carts first come, first served, from rows and shards alike
+        reserved = store_ds.run_tx_step(
+            None,
+            widget_store.reserve_carts,
+            [[(1, 1), (3, 1)], [(1, 1)], [(2, 1), (3, 1)], [(3, 1)]],
+        )
+        assert reserved == [True, False, True, False]
+        assert [get_inventory(store_ds, id) for id in [1, 2, 3]] == [0, 0, 0]
+
+    # Products can be fetched by ID and listed a page at a time
+    client = TestClient(widget_store.app)
+    assert client.get("/product/3").json()["product"] == "Gadget 3"
+    assert client.get("/product/4").status_code == 404
+    page = client.get("/products", params={"limit": 2, "after": 1}).json()
+    assert [product["product_id"] for product in page] == [2, 3]
+
+
+def test_reaper(dbos, store_ds):
+    """
+    Test that the reaper expires only reserved orders whose checkout is no
+    longer running, returning their inventory once, and that a checkout can
+    then neither cancel nor pay for an expired order.
+    """
+    cart = widget_store.DEFAULT_CART
+    # A checkout waiting for payment, and one cancelled while waiting
+    order_ids = []
+    for checkout_id in ["waiting", "cancelled"]:
+        with SetWorkflowID(checkout_id):
+            DBOS.start_workflow(widget_store.checkout_workflow)
+        assert DBOS.get_event(checkout_id, widget_store.PAYMENT_ID) == checkout_id
+        with store_ds.engine.connect() as connection:
+            order_ids.append(
+                connection.execute(
+                    select(orders.c.order_id).where(orders.c.checkout_id == checkout_id)
+                ).scalar_one()
+            )
+    waiting, cancelled = order_ids
+    DBOS.cancel_workflow("cancelled")
+    # An order whose inventory was never reserved
+    unreserved = store_ds.run_tx_step(None, widget_store.create_order, cart)
+    with store_ds.engine.begin() as connection:
+        connection.execute(
+            orders.update().values(
+                last_update_time=datetime.now() - timedelta(hours=1),
+                reserved_at=case(
+                    (orders.c.reserved_at.is_(None), None),
+                    else_=datetime.now() - timedelta(hours=1),
+                ),
+            )
+        )
+    assert get_inventory(store_ds, widget_store.WIDGET_ID) == 98
+
+    # Only the cancelled checkout's order expires, returning its widget
+    metrics = dict(widget_store.abandoned_checkout_metrics)
+    widget_store.reaper_workflow(datetime.now(), datetime.now())
+    widget_store.reaper_workflow(datetime.now(), datetime.now())
+    assert get_inventory(store_ds, widget_store.WIDGET_ID) == 99
+    statuses = [
+        store_ds.run_tx_step(None, widget_store.get_order, id)["order_status"]
+        for id in [waiting, cancelled, unreserved]
+    ]
+    assert statuses == [
+        OrderStatus.PENDING.value,
+        OrderStatus.CANCELLED.value,
+        OrderStatus.PENDING.value,
+    ]
+    assert widget_store.abandoned_checkout_metrics == {
+        "expired_orders": metrics["expired_orders"] + 1,
+        "reclaimed_units": metrics["reclaimed_units"] + 1,
+    }
+
+    # The expired order's inventory can't be returned, or paid for, twice
+    assert not store_ds.run_tx_step(None, widget_store.cancel_order, cancelled, cart)
+    assert not store_ds.run_tx_step(
+        None,
+        widget_store.update_order_status,
+        cancelled,
+        OrderStatus.PAID.value,
+        OrderStatus.PENDING.value,
     )
-    mock_start_workflow.assert_called_once_with(
-        widget_store.dispatch_order_workflow, order_id
+    assert get_inventory(store_ds, widget_store.WIDGET_ID) == 99
+
+    # The waiting checkout can still be paid for. The cancelled checkout stops
+    # once woken.
+    DBOS.send("cancelled", "failed", widget_store.PAYMENT_STATUS)
+    DBOS.send("waiting", "paid", widget_store.PAYMENT_STATUS)
+    DBOS.retrieve_workflow("waiting").get_result()
+    order = store_ds.run_tx_step(None, widget_store.get_order, waiting)
+    assert order["order_status"] == OrderStatus.PAID.value
+
+
+# Workflows for DBOS to recover, which wait to be released, and a queue that runs one
+# of them at a time.
+
+recovery_queue = Queue("recovery-test-queue", worker_concurrency=1)
+
+
+@DBOS.workflow()
+def waiting_workflow():
+    return DBOS.recv("release", timeout_seconds=30)
+
+
+@DBOS.workflow()
+def queued_workflow():
+    return DBOS.recv("release", timeout_seconds=30)
+
+
+def test_recovery_monitor(dbos, test_database_url):
+    """
+    Test that relaunching with a crashed process's executor ID recovers the
+    workflows it left pending, the queued ones within their queue's
+    concurrency limit, and that the recovery monitor reports the progress.
+    """
+    # Leave workflows pending as if a process had crashed running them
+    app_version = DBOS.application_version
+    client = DBOSClient(system_database_url=test_database_url)
+    crashed = [
+        ("waiting", "waiting_workflow", "local", None),
+        ("queued-1", "queued_workflow", "local", recovery_queue.name),
+        ("queued-2", "queued_workflow", "local", recovery_queue.name),
+        ("other-process", "waiting_workflow", "other", None),
+    ]
+    for workflow_id, workflow_name, _, _ in crashed:
+        options: EnqueueOptions = {
+            "queue_name": "crashed",
+            "workflow_name": workflow_name,
+            "workflow_id": workflow_id,
+        }
+        client.enqueue(options)
+        time.sleep(0.01)
+    client.destroy()
+    engine = create_engine(test_database_url)
+    workflow_status = table(
+        "workflow_status",
+        column("workflow_uuid"),
+        column("status"),
+        column("executor_id"),
+        column("queue_name"),
+        column("started_at_epoch_ms"),
+        column("application_version"),
+        schema="dbos",
     )
+    with engine.begin() as connection:
+        for workflow_id, _, executor_id, queue_name in crashed:
+            connection.execute(
+                workflow_status.update()
+                .where(workflow_status.c.workflow_uuid == workflow_id)
+                .values(
+                    status="PENDING",
+                    executor_id=executor_id,
+                    queue_name=queue_name,
+                    started_at_epoch_ms=1000 if queue_name else None,
+                    application_version=app_version,
+                )
+            )
+    engine.dispose()
+
+    # Launch again, as the crashed process
+    DBOS.destroy()
+    monitor = RecoveryMonitor()
+    monitor.start(test_database_url, "widget-store", "local", app_version)
+    config: DBOSConfig = {
+        "name": "widget-store",
+        "system_database_url": test_database_url,
+        "application_version": app_version,
+        "executor_id": "local",
+    }
+    DBOS(config=config)
+    DBOS.launch()
+
+    def status(workflow_id):
+        return DBOS.get_workflow_status(workflow_id).status
+
+    def wait_until(condition):
+        deadline = time.monotonic() + 10
+        while not condition():
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+    # The unqueued workflow and one queued workflow are recovered
+    wait_until(lambda: monitor.stats()["recovered"] == 2)
+    time.sleep(0.5)
+    stats = monitor.stats()
+    assert (stats["pending"], stats["recovered"], stats["finished"]) == (3, 2, False)
+    assert status("queued-2") == "ENQUEUED"
+
+    # The other queued workflow is recovered once the first finishes
+    DBOS.send("queued-1", "done", "release")
+    wait_until(lambda: monitor.stats()["finished"])
+    assert monitor.stats()["by_workflow"] == {
+        "waiting_workflow": {"pending": 1, "recovered": 1},
+        "queued_workflow": {"pending": 2, "recovered": 2},
+    }
+    for workflow_id in ["waiting", "queued-2"]:
+        DBOS.send(workflow_id, "done", "release")
+        assert DBOS.retrieve_workflow(workflow_id).get_result() == "done"
+    assert DBOS.retrieve_workflow("queued-1").get_result() == "done"
+    assert status("other-process") == "PENDING"
+
+
+def test_dispatch_sweeper(store_ds):
+    """
+    Test that each sweep advances every paid order by one step and
+    dispatches the orders that are fully progressed.
+    """
+    with store_ds.engine.begin() as connection:
+        connection.execute(
+            orders.insert(),
+            [
+                {"order_status": OrderStatus.PAID.value, "progress_remaining": 1},
+                {"order_status": OrderStatus.PAID.value, "progress_remaining": 2},
+                {"order_status": OrderStatus.PENDING.value, "progress_remaining": 2},
+            ],
+        )
+
+    assert store_ds.run_tx_step(None, widget_store.advance_paid_orders) == [1]
+    assert store_ds.run_tx_step(None, widget_store.advance_paid_orders) == [2]
+    assert store_ds.run_tx_step(None, widget_store.advance_paid_orders) == []
+
+    statuses = [
+        store_ds.run_tx_step(None, widget_store.get_order, order_id)["order_status"]
+        for order_id in [1, 2, 3]
+    ]
+    assert statuses == [
+        OrderStatus.DISPATCHED.value,
+        OrderStatus.DISPATCHED.value,
+        OrderStatus.PENDING.value,
+    ]
+
+
+def test_list_orders(store_ds):
+    """
+    Test that /orders pages through orders most recently updated first,
+    filters by status, and that /orders/stream streams every order.
+    An order is updated whenever its status changes.
+    """
+    start = datetime(2026, 1, 1)
+    with store_ds.engine.begin() as connection:
+        connection.execute(
+            orders.insert(),
+            [
+                {
+                    "order_status": status,
+                    "last_update_time": start + timedelta(minutes=minutes),
+                }
+                for minutes, status in enumerate(
+                    [OrderStatus.PAID.value, OrderStatus.DISPATCHED.value] * 3
+                )
+            ],
+        )
+    client = TestClient(widget_store.app)
+
+    # Follow the cursor until the last page
+    order_ids = []
+    cursor = None
+    while True:
+        params = {"limit": 4, "cursor": cursor} if cursor else {"limit": 4}
+        response = client.get("/orders", params=params)
+        order_ids += [order["order_id"] for order in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert order_ids == [6, 5, 4, 3, 2, 1]
+
+    # Filter by status
+    response = client.get("/orders", params={"status": OrderStatus.PAID.value})
+    assert [order["order_id"] for order in response.json()] == [5, 3, 1]
+
+    # Stream every order as newline-delimited JSON
+    response = client.get("/orders/stream")
+    streamed = [json.loads(line) for line in response.text.splitlines()]
+    assert [order["order_id"] for order in streamed] == [6, 5, 4, 3, 2, 1]
+
+    # Changing an order's status moves it to the front
+    store_ds.run_tx_step(
+        None, widget_store.update_order_status, 1, OrderStatus.CANCELLED.value
+    )
+    response = client.get("/orders", params={"limit": 2})
+    assert [order["order_id"] for order in response.json()] == [1, 6]
+
+
+def test_archive_orders(store_ds, test_database_url):
+    """
+    Test that old dispatched and cancelled orders, and their order lines,
+    move to the archive in batches, and are still found by /order/{id}
+    and /orders, and that resetting the database also empties the archive.
+    """
+    old = datetime.now() - timedelta(days=60)
+    with store_ds.engine.begin() as connection:
+        connection.execute(
+            orders.insert(),
+            [
+                {"order_status": OrderStatus.DISPATCHED.value, "last_update_time": old},
+                {"order_status": OrderStatus.CANCELLED.value, "last_update_time": old},
+                {"order_status": OrderStatus.PAID.value, "last_update_time": old},
+                {
+                    "order_status": OrderStatus.DISPATCHED.value,
+                    "last_update_time": datetime.now(),
+                },
+            ],
+        )
+        connection.execute(
+            order_items.insert(),
+            {"order_id": 1, "product_id": widget_store.WIDGET_ID, "quantity": 3},
+        )
+
+    # Only the two old, finished orders are archived, one batch at a time
+    archived_orders = widget_store.archive_metrics["archived_orders"]
+    assert store_ds.run_tx_step(None, widget_store.archive_orders, 30, 1) == 1
+    assert store_ds.run_tx_step(None, widget_store.archive_orders, 30, 1) == 1
+    assert store_ds.run_tx_step(None, widget_store.archive_orders, 30, 1) == 0
+    with store_ds.engine.connect() as connection:
+        live = connection.execute(orders.select()).all()
+        archived = connection.execute(orders_archive.select()).all()
+        archived_items = connection.execute(order_items_archive.select()).all()
+        assert [row.order_id for row in live] == [3, 4]
+        assert sorted(row.order_id for row in archived) == [1, 2]
+        assert connection.execute(order_items.select()).all() == []
+        assert [(row.order_id, row.quantity) for row in archived_items] == [(1, 3)]
+
+    client = TestClient(widget_store.app)
+    order = client.get("/order/1").json()
+    assert order["order_status"] == OrderStatus.DISPATCHED.value
+    assert client.get("/order/3").json()["order_status"] == OrderStatus.PAID.value
+    response = client.get("/orders", params={"limit": 3})
+    assert [order["order_id"] for order in response.json()] == [4, 3, 2]
+    response = client.get(
+        "/orders", params={"cursor": response.headers["X-Next-Cursor"]}
+    )
+    assert [order["order_id"] for order in response.json()] == [1]
+    assert widget_store.archive_metrics["archived_orders"] == archived_orders + 2
+
+    # Redeploying resets the database, archived orders included
+    subprocess.run(
+        [sys.executable, "-m", "migrations.reset_database"],
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        env={**os.environ, "DBOS_DATABASE_URL": test_database_url},
+        check=True,
+    )
+    with store_ds.engine.connect() as connection:
+        assert connection.execute(orders_archive.select()).all() == []
+        assert connection.execute(order_items_archive.select()).all() == []
+        assert connection.execute(orders.select()).all() == []
+    assert get_inventory(store_ds, widget_store.WIDGET_ID) == 100
+
+
+def test_product_cache(store_ds):
+    """
+    Test that /product is served from the cache until a change to the
+    product's inventory commits and invalidates it.
+    """
+    cache = ReadThroughCache(ttl_seconds=60)
+    with patch.object(widget_store, "product_cache", cache):
+        client = TestClient(widget_store.app)
+        assert client.get("/product").json()["inventory"] == 100
+        assert client.get("/product").json()["inventory"] == 100
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # Reserving inventory invalidates the cached product
+        store_ds.run_tx_step(
+            None, widget_store.reserve_inventory, widget_store.DEFAULT_CART
+        )
+        assert client.get("/product").json()["inventory"] == 99
+
+        stats = client.get("/metrics").json()["product_cache"]
+        assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+def test_listen_notify(store_ds, test_database_url):
+    """
+    Test that a listening notifier delivers notifications published by a
+    transaction through Postgres LISTEN/NOTIFY once it commits.
+    """
+    received = queue.Queue()
+    notifier = Notifier()
+    notifier.subscribe("widget_store_test", received.put)
+    notifier.listen(test_database_url)
+
+    def publish():
+        notifier.publish(store_ds.sql_session(), "widget_store_test", "hello")
+
+    # Keep publishing until the listener has connected and receives one
+    deadline = time.monotonic() + 10
+    while received.empty() and time.monotonic() < deadline:
+        store_ds.run_tx_step(None, publish)
+        time.sleep(0.1)
+    assert received.get(timeout=1) == "hello"
+
+
+def test_order_events(store_ds):
+    """
+    Test that /orders/events sends a watched order's current state, then
+    pushes each committed change to the order.
+    """
+    order_id = store_ds.run_tx_step(
+        None, widget_store.create_order, widget_store.DEFAULT_CART
+    )
+
+    async def watch_order():
+        # Consume the event stream the way the SSE response would
+        request = MagicMock()
+        request.is_disconnected = AsyncMock(return_value=False)
+        response = await widget_store.order_events_endpoint(request, [order_id])
+        events = response.body_iterator
+
+        async def next_event():
+            return json.loads((await anext(events)).removeprefix("data: "))
+
+        assert (await next_event())["order_status"] == OrderStatus.PENDING.value
+
+        await asyncio.to_thread(
+            store_ds.run_tx_step,
+            None,
+            widget_store.update_order_status,
+            order_id,
+            OrderStatus.PAID.value,
+        )
+        assert (await next_event())["order_status"] == OrderStatus.PAID.value
+
+        await asyncio.to_thread(
+            store_ds.run_tx_step, None, widget_store.advance_paid_orders
+        )
+        assert await next_event() == {
+            "order_id": order_id,
+            "order_status": OrderStatus.PAID.value,
+            "progress_remaining": 9,
+        }
+        await events.aclose()
+
+    asyncio.run(watch_order())
+    assert widget_store.order_broadcaster.subscriber_count() == 0
+
+
+def test_order_events_mark_new_orders(store_ds):
+    """
+    Test that a watcher of every order is told which updates are for newly
+    created orders, so it reloads its list for those alone.
+    """
+
+    async def watch_orders():
+        request = MagicMock()
+        request.is_disconnected = AsyncMock(return_value=False)
+        response = await widget_store.order_events_endpoint(request, None)
+        events = response.body_iterator
+
+        async def next_event():
+            return json.loads((await anext(events)).removeprefix("data: "))
+
+        # Start the stream, so it subscribes before the order is created.
+        first_event = asyncio.ensure_future(next_event())
+        await asyncio.sleep(0.1)
+        order_id = await asyncio.to_thread(
+            store_ds.run_tx_step,
+            None,
+            widget_store.create_order,
+            widget_store.DEFAULT_CART,
+        )
+        assert await first_event == {
+            "order_id": order_id,
+            "order_status": OrderStatus.PENDING.value,
+            "progress_remaining": 10,
+            "created": True,
+        }
+
+        await asyncio.to_thread(
+            store_ds.run_tx_step,
+            None,
+            widget_store.update_order_status,
+            order_id,
+            OrderStatus.PAID.value,
+        )
+        assert "created" not in await next_event()
+        await events.aclose()
 
-    # Verify that because payment succeeded, inventory was never returned
-    mock_undo_reserve_inventory.assert_not_called()
+    asyncio.run(watch_orders())
+    assert widget_store.order_broadcaster.subscriber_count() == 0
@@ -0,0 +1,92 @@
+# Fan-out of updates to many subscribers in this process, such as browsers
+# watching orders over Server-Sent Events.
+
+# Updates are published from any thread, keyed by what they are about (an order ID).
+# Each subscriber is an asyncio consumer watching a set of keys, or every key.
+
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+
+class Subscription:
+
+    def __init__(
+        self,
+        broadcaster: "Broadcaster",
+        keys: Optional[Set[Hashable]],
+        max_pending: int,
+    ):
+        self.broadcaster = broadcaster
+        self.keys = keys
+        self._loop = asyncio.get_running_loop()
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_pending)
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+    def offer(self, update: Any) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._put, update)
+        except RuntimeError:
+            # The subscriber's event loop has shut down.
+            self.broadcaster.unsubscribe(self)
+
+    def _put(self, update: Any) -> None:
+        # A subscriber that falls too far behind loses its oldest updates
+        # rather than holding up everyone else.
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(update)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.broadcaster.unsubscribe(self)
+
+
+class Broadcaster:
+
+    def __init__(self, max_pending: int = 100):
+        self.max_pending = max_pending
+        self._subscriptions: Set[Subscription] = set()
+        self._by_key: Dict[Hashable, Set[Subscription]] = defaultdict(set)
+        self._all_keys: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, keys: Optional[Iterable[Hashable]] = None) -> Subscription:
+        # Must be called from the event loop that will consume the subscription.
+        subscription = Subscription(
+            self, set(keys) if keys is not None else None, self.max_pending
+        )
+        with self._lock:
+            self._subscriptions.add(subscription)
+            if subscription.keys is None:
+                self._all_keys.add(subscription)
+            else:
+                for key in subscription.keys:
+                    self._by_key[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            if subscription.keys is None:
+                self._all_keys.discard(subscription)
+                return
+            for key in subscription.keys:
+                self._by_key[key].discard(subscription)
+                if not self._by_key[key]:
+                    del self._by_key[key]
+
+    def publish(self, key: Hashable, update: Any) -> None:
+        with self._lock:
+            subscriptions = self._all_keys | self._by_key.get(key, set())
+        for subscription in subscriptions:
+            subscription.offer(update)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscriptions)
@@ -0,0 +1,66 @@
+# Group commit: coalesce requests that arrive within a few milliseconds of each other
+# into one batch, so a single database transaction (and a single commit) serves them all.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class GroupCommitter(Generic[T, R]):
+    # `flush` receives every request in a batch and must return one result per
+    # request, in the same order. If it raises, every request in the batch fails.
+
+    def __init__(
+        self,
+        flush: Callable[[List[T]], List[R]],
+        window_seconds: float = 0.005,
+        max_batch_size: int = 100,
+    ):
+        self.flush = flush
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._requests: "queue.Queue[Tuple[T, Future[R]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, request: T) -> R:
+        # Block until the batch containing this request has committed.
+        future: "Future[R]" = Future()
+        self._requests.put((request, future))
+        self._ensure_started()
+        return future.result()
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            # Wait for a first request, then collect whatever else arrives
+            # within the window (or until the batch is full).
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.flush([request for request, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -6,14 +6,61 @@
 
 # First, let's do imports and create a FastAPI app.
 
+import asyncio
+import base64
+import json
+import multiprocessing
 import os
+import random
+import signal
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import uvicorn
-from dbos import DBOS, DBOSConfig, SetWorkflowID, SQLAlchemyDatasource
-from fastapi import FastAPI, HTTPException, Response
-from fastapi.responses import HTMLResponse
-
-from .schema import OrderStatus, orders, products
+from dbos import (
+    DBOS,
+    DBOSConfig,
+    Queue,
+    SetWorkflowID,
+    SQLAlchemyDatasource,
+    run_dbos_database_migrations,
+)
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import (
+    Integer,
+    Select,
+    Table,
+    case,
+    column,
+    event,
+    func,
+    select,
+    tuple_,
+    union_all,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+
+from .broadcast import Broadcaster
+from .cache import ReadThroughCache
+from .group_commit import GroupCommitter
+from .notifications import Notifier
+from .recovery import RecoveryMonitor
+from .schema import (
+    OrderStatus,
+    inventory_shards,
+    order_items,
+    order_items_archive,
+    orders,
+    orders_archive,
+    products,
+)
 
 app = FastAPI()
 
@@ -24,9 +71,91 @@ PAYMENT_STATUS = "payment_status"
 PAYMENT_ID = "payment_id"
 ORDER_ID = "order_id"
 
+# A cart is a list of (product_id, quantity) lines. A checkout without a cart buys
+# a single widget.
+Cart = List[Tuple[int, int]]
+DEFAULT_CART: Cart = [(WIDGET_ID, 1)]
+
+# During a flash sale, every checkout decrements the same product row, so they all
+# queue on one row lock. Setting WIDGET_STORE_INVENTORY_SHARDS above 1 splits the
+# widget's inventory across that many sub-counter rows so reservations can proceed
+# in parallel, one per shard.
+INVENTORY_SHARDS = int(os.environ.get("WIDGET_STORE_INVENTORY_SHARDS", "1"))
+
+# By default, checkout creates an order and reserves inventory in two separate
+# transactions. WIDGET_STORE_RESERVATION_MODE can instead be set to "combined",
+# which does both in a single transaction, or "group_commit", which also coalesces
+# reservations arriving within WIDGET_STORE_GROUP_COMMIT_WINDOW_MS of each other
+# into one transaction shared by all of them.
+RESERVATION_MODE = os.environ.get("WIDGET_STORE_RESERVATION_MODE", "separate")
+GROUP_COMMIT_WINDOW_MS = float(
+    os.environ.get("WIDGET_STORE_GROUP_COMMIT_WINDOW_MS", "5")
+)
+
+# Paid orders are dispatched by a sweeper that advances every paid order at once,
+# once per second. Set WIDGET_STORE_DISPATCH_MODE to "workflow" to instead start
+# one dispatch workflow per order.
+DISPATCH_MODE = os.environ.get("WIDGET_STORE_DISPATCH_MODE", "sweeper")
+
+# A checkout waits for payment as long as DBOS.recv waits by default, or
+# WIDGET_STORE_PAYMENT_TIMEOUT_SECONDS if set, before giving up, cancelling its order
+# and returning its inventory. A reaper separately expires, in bulk, pending orders
+# whose inventory was reserved more than WIDGET_STORE_ABANDONED_ORDER_SECONDS ago and
+# whose checkout is no longer running to give the inventory back itself.
+PAYMENT_TIMEOUT_SECONDS = (
+    float(os.environ["WIDGET_STORE_PAYMENT_TIMEOUT_SECONDS"])
+    if "WIDGET_STORE_PAYMENT_TIMEOUT_SECONDS" in os.environ
+    else None
+)
+ABANDONED_ORDER_SECONDS = float(
+    os.environ.get("WIDGET_STORE_ABANDONED_ORDER_SECONDS", "300")
+)
+REAPER_BATCH_SIZE = 1000
+
+# Every hour, orders dispatched or cancelled more than WIDGET_STORE_ARCHIVE_AFTER_DAYS
+# ago are moved from the orders table to an archive, ARCHIVE_BATCH_SIZE at a time.
+ARCHIVE_AFTER_DAYS = float(os.environ.get("WIDGET_STORE_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = 1000
+
+# Product pages are served from an in-process cache, invalidated whenever a
+# product's inventory changes and otherwise refreshed every
+# WIDGET_STORE_PRODUCT_CACHE_TTL_SECONDS. When running several app processes, set
+# WIDGET_STORE_LISTEN_NOTIFY so invalidations reach every process through Postgres
+# LISTEN/NOTIFY.
+PRODUCT_CACHE_TTL_SECONDS = float(
+    os.environ.get("WIDGET_STORE_PRODUCT_CACHE_TTL_SECONDS", "5")
+)
+USE_LISTEN_NOTIFY = os.environ.get("WIDGET_STORE_LISTEN_NOTIFY", "").lower() in (
+    "1",
+    "true",
+)
+PRODUCT_CHANNEL = "widget_store_product"
+
+# The checkout and payment endpoints wait up to WIDGET_STORE_CHECKOUT_TIMEOUT_SECONDS
+# for the checkout workflow to respond before giving up.
+CHECKOUT_TIMEOUT_SECONDS = float(
+    os.environ.get("WIDGET_STORE_CHECKOUT_TIMEOUT_SECONDS", "60")
+)
+
+# After a crash, the app process recovers the workflows it left pending when it is
+# restarted with the same WIDGET_STORE_EXECUTOR_ID, which must be unique to each
+# process sharing a database. Checkouts, whose customers may still be waiting to pay,
+# are recovered at once. Dispatch workflows run on a queue that runs no more than
+# WIDGET_STORE_DISPATCH_CONCURRENCY of them at once per process, so they are
+# recovered a few at a time rather than stampeding the database.
+EXECUTOR_ID = os.environ.get("WIDGET_STORE_EXECUTOR_ID", "local")
+DISPATCH_CONCURRENCY = int(os.environ.get("WIDGET_STORE_DISPATCH_CONCURRENCY", "100"))
+
+product_cache = ReadThroughCache(ttl_seconds=PRODUCT_CACHE_TTL_SECONDS)
+notifier = Notifier()
+notifier.subscribe(
+    PRODUCT_CHANNEL, lambda product_id: product_cache.invalidate(int(product_id))
+)
+
 # Next, let's write the checkout workflow.
-# This workflow is triggered whenever a customer buys a widget.
-# It creates a new order, then reserves inventory, then processes payment,
+# This workflow is triggered whenever a customer checks out a cart (by default,
+# a single widget). It creates a new order, then reserves inventory for every line
+# of the cart, then processes payment,
 # then marks the order as paid. If any step fails, it backs out,
 # returning reserved inventory and marking the order as cancelled.
 
@@ -38,22 +167,13 @@ ORDER_ID = "order_id"
 
 
 @DBOS.workflow()
-def checkout_workflow():
-    # Create a new order
-    order_id = ds.run_tx_step({"name": "create_order"}, create_order)
-
-    # Attempt to reserve inventory, cancelling the order if no inventory remains.
-    inventory_reserved = ds.run_tx_step(
-        {"name": "reserve_inventory"}, reserve_inventory
-    )
+def checkout_workflow(cart: Optional[Cart] = None):
+    # Create a new order and attempt to reserve inventory for it.
+    # If any line of the cart is out of stock, the order is cancelled.
+    cart = normalize_cart(cart or DEFAULT_CART)
+    order_id, inventory_reserved = create_order_and_reserve_inventory(cart)
     if not inventory_reserved:
         DBOS.logger.error(f"Failed to reserve inventory for order {order_id}")
-        ds.run_tx_step(
-            {"name": "update_order_status"},
-            update_order_status,
-            order_id=order_id,
-            status=OrderStatus.CANCELLED.value,
-        )
         DBOS.set_event(PAYMENT_ID, None)
         return
 
@@ -62,32 +182,104 @@ def checkout_workflow():
     DBOS.set_event(PAYMENT_ID, DBOS.workflow_id)
 
     # Wait for a message that the customer has completed payment.
-    payment_status = DBOS.recv(PAYMENT_STATUS)
+    # If none arrives in time, the checkout has been abandoned.
+    if PAYMENT_TIMEOUT_SECONDS is None:
+        payment_status = DBOS.recv(PAYMENT_STATUS)
+    else:
+        payment_status = DBOS.recv(
+            PAYMENT_STATUS, timeout_seconds=PAYMENT_TIMEOUT_SECONDS
+        )
 
-    # If payment succeeded, mark the order as paid and start the order dispatch workflow.
-    # Otherwise, return reserved inventory and cancel the order.
+    # If payment succeeded, mark the order as paid so it will be dispatched.
+    # Otherwise, cancel the order and return its reserved inventory.
+    # Either only happens if the order is still pending, as the reaper
+    # may have expired it already.
     if payment_status == "paid":
-        DBOS.logger.info(f"Payment successful for order {order_id}")
-        ds.run_tx_step(
+        paid = ds.run_tx_step(
             {"name": "update_order_status"},
             update_order_status,
             order_id=order_id,
             status=OrderStatus.PAID.value,
+            from_status=OrderStatus.PENDING.value,
         )
-        DBOS.start_workflow(dispatch_order_workflow, order_id)
+        if paid:
+            DBOS.logger.info(f"Payment successful for order {order_id}")
+            if DISPATCH_MODE == "workflow":
+                dispatch_queue.enqueue(dispatch_order_workflow, order_id)
+        else:
+            DBOS.logger.error(f"Payment received for expired order {order_id}")
     else:
         DBOS.logger.warning(f"Payment failed for order {order_id}")
-        ds.run_tx_step({"name": "undo_reserve_inventory"}, undo_reserve_inventory)
+        ds.run_tx_step({"name": "cancel_order"}, cancel_order, order_id, cart)
+
+    # Finally, send the order ID to the payment endpoint so it
+    # can redirect the customer to the order status page.
+    DBOS.set_event(ORDER_ID, str(order_id))
+
+
+def normalize_cart(cart: Cart) -> Cart:
+    # Merge repeated products and sort lines by product ID, the order in which
+    # every transaction locks products, so concurrent checkouts can't deadlock.
+    quantities: Dict[int, int] = defaultdict(int)
+    for product_id, quantity in cart:
+        quantities[product_id] += quantity
+    return sorted(quantities.items())
+
+
+# Creating the order and reserving its inventory are the first steps of every checkout,
+# so under load they dominate the store's database commits. Depending on
+# RESERVATION_MODE, they run as separate transactions, as one combined transaction,
+# or as part of a group commit shared with other checkouts.
+
+
+def create_order_and_reserve_inventory(cart: Cart) -> Tuple[int, bool]:
+    if RESERVATION_MODE == "combined":
+        return ds.run_tx_step(
+            {"name": "reserve_and_create_order", "isolation_level": "READ COMMITTED"},
+            reserve_and_create_order,
+            cart,
+        )
+    if RESERVATION_MODE == "group_commit":
+        return reserve_and_create_order_batched(cart)
+
+    order_id = ds.run_tx_step({"name": "create_order"}, create_order, cart)
+    inventory_reserved = ds.run_tx_step(
+        {"name": "reserve_inventory", "isolation_level": "READ COMMITTED"},
+        reserve_order_inventory,
+        order_id,
+        cart,
+    )
+    if not inventory_reserved:
         ds.run_tx_step(
             {"name": "update_order_status"},
             update_order_status,
             order_id=order_id,
             status=OrderStatus.CANCELLED.value,
         )
+    return order_id, inventory_reserved
+
+
+# This step waits for the group committer to run a batch containing this checkout.
+# A batch may commit and then crash before the step is checkpointed, so batches are
+# idempotent on the checkout's workflow ID and the step can safely be retried.
+
+
+@DBOS.step(retries_allowed=True)
+def reserve_and_create_order_batched(cart: Cart) -> Tuple[int, bool]:
+    return reservation_committer.submit((DBOS.workflow_id, cart))
+
+
+def flush_reservations(checkouts: List[Tuple[str, Cart]]) -> List[Tuple[int, bool]]:
+    return ds.run_tx_step(
+        {"name": "reserve_and_create_orders", "isolation_level": "READ COMMITTED"},
+        reserve_and_create_orders,
+        checkouts,
+    )
 
-    # Finally, send the order ID to the payment endpoint so it
-    # can redirect the customer to the order status page.
-    DBOS.set_event(ORDER_ID, str(order_id))
+
+reservation_committer = GroupCommitter(
+    flush_reservations, window_seconds=GROUP_COMMIT_WINDOW_MS / 1000
+)
 
 
 # Now, let's use FastAPI to write the HTTP endpoint for checkout.
@@ -98,16 +290,33 @@ def checkout_workflow():
 # so the browser can redirect the customer to the payments page.
 
 # The endpoint accepts an idempotency key so that even if the customer presses
-# "buy now" multiple times, only one checkout workflow is started.
+# "buy now" multiple times, only one checkout workflow is started. It also accepts
+# an optional cart as a JSON list of {"product_id", "quantity"} lines.
+
+# The endpoint is async, so waiting for the workflow doesn't tie up one of FastAPI's
+# (by default, 40) threadpool threads per checkout. The checkout workflow itself is
+# synchronous, so we start it from a worker thread (DBOS.start_workflow_async only
+# accepts coroutine workflows). The workflow ID carries over to that thread
+# because DBOS keeps it in a context variable.
+
+
+class CartLine(BaseModel):
+    product_id: int
+    quantity: int = Field(1, ge=1)
 
 
 @app.post("/checkout/{idempotency_key}")
-def checkout_endpoint(idempotency_key: str) -> Response:
+async def checkout_endpoint(
+    idempotency_key: str, cart: Optional[List[CartLine]] = Body(None, min_length=1)
+) -> Response:
+    lines = [(line.product_id, line.quantity) for line in cart] if cart else None
     # Idempotently start the checkout workflow in the background.
     with SetWorkflowID(idempotency_key):
-        handle = DBOS.start_workflow(checkout_workflow)
+        handle = await asyncio.to_thread(DBOS.start_workflow, checkout_workflow, lines)
     # Wait for the checkout workflow to send a payment ID, then return it.
-    payment_id = DBOS.get_event(handle.workflow_id, PAYMENT_ID)
+    payment_id = await DBOS.get_event_async(
+        handle.workflow_id, PAYMENT_ID, timeout_seconds=CHECKOUT_TIMEOUT_SECONDS
+    )
     if payment_id is None:
         raise HTTPException(status_code=404, detail="Checkout failed to start")
     return Response(payment_id)
@@ -120,11 +329,13 @@ def checkout_endpoint(idempotency_key: str) -> Response:
 
 
 @app.post("/payment_webhook/{payment_id}/{payment_status}")
-def payment_endpoint(payment_id: str, payment_status: str) -> Response:
+async def payment_endpoint(payment_id: str, payment_status: str) -> Response:
     # Send the payment status to the checkout workflow.
-    DBOS.send(payment_id, payment_status, PAYMENT_STATUS)
+    await DBOS.send_async(payment_id, payment_status, PAYMENT_STATUS)
     # Wait for the checkout workflow to send an order ID, then return it.
-    order_url = DBOS.get_event(payment_id, ORDER_ID)
+    order_url = await DBOS.get_event_async(
+        payment_id, ORDER_ID, timeout_seconds=CHECKOUT_TIMEOUT_SECONDS
+    )
     if order_url is None:
         raise HTTPException(status_code=404, detail="Payment failed to process")
     return Response(order_url)
@@ -136,34 +347,420 @@ def payment_endpoint(payment_id: str, payment_status: str) -> Response:
 # expose some of them as HTTP endpoints with FastAPI so the frontend can access them.
 
 
-def reserve_inventory() -> bool:
+# Reservations run at READ COMMITTED: each locks the rows it decrements, and Postgres
+# re-reads the latest version of a row after waiting for its lock, so stronger
+# isolation would only add serialization failures under contention.
+
+# Every transaction locks products in product ID order (carts are sorted by product
+# ID), then any shards, so checkouts of overlapping carts can't deadlock.
+
+
+def reserve_inventory(cart: Cart) -> bool:
+    # Reserve every line of a cart or, if any line is out of stock, none of them.
+    sharded = [(id, quantity) for id, quantity in cart if is_sharded(id)]
+    unsharded = [(id, quantity) for id, quantity in cart if not is_sharded(id)]
+    # A cart with a sharded line is reserved over several statements, so if
+    # one of them fails, roll back whatever the earlier ones reserved.
+    savepoint = ds.sql_session().begin_nested() if sharded and len(cart) > 1 else None
+    reserved = (not unsharded or reserve_product_inventory(unsharded)) and all(
+        reserve_sharded_inventory(id, quantity) for id, quantity in sharded
+    )
+    if savepoint is not None:
+        if reserved:
+            savepoint.commit()
+        else:
+            savepoint.rollback()
+    if not reserved:
+        return False
+    for product_id, _ in cart:
+        invalidate_product(product_id)
+    return True
+
+
+def reserve_order_inventory(order_id: int, cart: Cart) -> bool:
+    # Reserve inventory for an order, recording on the order that it was reserved
+    # so that only a reserved order's inventory is ever returned.
+    reserved = reserve_inventory(cart)
+    if reserved:
+        ds.sql_session().execute(
+            orders.update()
+            .where(orders.c.order_id == order_id)
+            .values(reserved_at=func.now())
+        )
+    return reserved
+
+
+def cart_values(cart: Cart):
+    return values(
+        column("product_id", Integer), column("quantity", Integer), name="cart"
+    ).data(cart)
+
+
+def reserve_product_inventory(cart: Cart) -> bool:
+    # Reserve every line of a cart in a single statement. It first locks the cart's
+    # products in product ID order, then decrements them all, but only if every
+    # product exists and has enough inventory.
+    lines = cart_values(cart)
+    locked = (
+        select(products.c.product_id, products.c.inventory, lines.c.quantity)
+        .join_from(products, lines, products.c.product_id == lines.c.product_id)
+        .order_by(products.c.product_id)
+        .with_for_update(of=products)
+        .cte("locked")
+    )
+    in_stock = (
+        select(func.count())
+        .select_from(locked)
+        .where(locked.c.inventory >= locked.c.quantity)
+        .correlate(None)
+        .scalar_subquery()
+    )
     rows_affected = ds.sql_session().execute(
         products.update()
-        .where(products.c.product_id == WIDGET_ID)
-        .where(products.c.inventory > 0)
-        .values(inventory=products.c.inventory - 1)
+        .where(products.c.product_id == locked.c.product_id)
+        .where(in_stock == len(cart))
+        .values(inventory=locked.c.inventory - locked.c.quantity)
     ).rowcount
-    return rows_affected > 0
+    return rows_affected == len(cart)
+
+
+# Only the widget, the product of our flash sales, is ever sharded.
+
+
+def is_sharded(product_id: int) -> bool:
+    return INVENTORY_SHARDS > 1 and product_id == WIDGET_ID
+
+
+def reserve_sharded_inventory(product_id: int, quantity: int = 1) -> bool:
+    if quantity > 1:
+        return reserve_from_shards(product_id, quantity)
+    # Start at a random shard so concurrent checkouts lock different rows,
+    # then sweep the remaining shards in case that one has sold out.
+    start = random.randrange(INVENTORY_SHARDS)
+    for offset in range(INVENTORY_SHARDS):
+        rows_affected = ds.sql_session().execute(
+            inventory_shards.update()
+            .where(inventory_shards.c.product_id == product_id)
+            .where(inventory_shards.c.shard_id == (start + offset) % INVENTORY_SHARDS)
+            .where(inventory_shards.c.inventory > 0)
+            .values(inventory=inventory_shards.c.inventory - 1)
+        ).rowcount
+        if rows_affected > 0:
+            return True
+    return False
+
+
+def reserve_from_shards(product_id: int, quantity: int) -> bool:
+    # A reservation of several units may need to take them from several shards,
+    # so lock the shards in order and take as many units as each one has.
+    session = ds.sql_session()
+    shards = session.execute(
+        select(inventory_shards.c.shard_id, inventory_shards.c.inventory)
+        .where(inventory_shards.c.product_id == product_id)
+        .where(inventory_shards.c.inventory > 0)
+        .order_by(inventory_shards.c.shard_id)
+        .with_for_update()
+    ).all()
+    if sum(shard.inventory for shard in shards) < quantity:
+        return False
+    for shard in shards:
+        taken = min(shard.inventory, quantity)
+        session.execute(
+            inventory_shards.update()
+            .where(inventory_shards.c.product_id == product_id)
+            .where(inventory_shards.c.shard_id == shard.shard_id)
+            .values(inventory=inventory_shards.c.inventory - taken)
+        )
+        quantity -= taken
+        if quantity == 0:
+            break
+    return True
+
+
+def undo_reserve_inventory(cart: Cart) -> None:
+    unsharded = [(id, quantity) for id, quantity in cart if not is_sharded(id)]
+    if unsharded:
+        lines = cart_values(unsharded)
+        locked = (
+            select(products.c.product_id, lines.c.quantity)
+            .join_from(products, lines, products.c.product_id == lines.c.product_id)
+            .order_by(products.c.product_id)
+            .with_for_update(of=products)
+            .cte("locked")
+        )
+        ds.sql_session().execute(
+            products.update()
+            .where(products.c.product_id == locked.c.product_id)
+            .values(inventory=products.c.inventory + locked.c.quantity)
+        )
+    for product_id, quantity in cart:
+        invalidate_product(product_id)
+        if is_sharded(product_id):
+            # Any shard will do, since inventory is the sum of all shards.
+            ds.sql_session().execute(
+                inventory_shards.update()
+                .where(inventory_shards.c.product_id == product_id)
+                .where(
+                    inventory_shards.c.shard_id == random.randrange(INVENTORY_SHARDS)
+                )
+                .values(inventory=inventory_shards.c.inventory + quantity)
+            )
+
+
+def consolidate_inventory(product_id: int, inventory: Optional[int] = None) -> None:
+    # Gather a product's inventory from its row and all its shards (or reset it to
+    # a new total), then spread it evenly across INVENTORY_SHARDS shards. When
+    # sharding is off, everything is moved back onto the product row.
+    session = ds.sql_session()
+    product_inventory = session.execute(
+        select(products.c.inventory)
+        .where(products.c.product_id == product_id)
+        .with_for_update()
+    ).scalar_one()
+    shard_inventory = (
+        session.execute(
+            select(inventory_shards.c.inventory)
+            .where(inventory_shards.c.product_id == product_id)
+            .order_by(inventory_shards.c.shard_id)
+            .with_for_update()
+        )
+        .scalars()
+        .all()
+    )
+    if inventory is None:
+        inventory = product_inventory + sum(shard_inventory)
+    invalidate_product(product_id)
+
+    num_shards = INVENTORY_SHARDS if INVENTORY_SHARDS > 1 else 0
+    session.execute(
+        inventory_shards.delete()
+        .where(inventory_shards.c.product_id == product_id)
+        .where(inventory_shards.c.shard_id >= num_shards)
+    )
+    if num_shards == 0:
+        session.execute(
+            products.update()
+            .where(products.c.product_id == product_id)
+            .values(inventory=inventory)
+        )
+        return
+
+    # Shards are updated in place rather than recreated, so reservations
+    # waiting on a shard's lock see its new inventory once we commit.
+    per_shard, remainder = divmod(inventory, num_shards)
+    shards = insert(inventory_shards).values(
+        [
+            {
+                "product_id": product_id,
+                "shard_id": shard_id,
+                "inventory": per_shard + (1 if shard_id < remainder else 0),
+            }
+            for shard_id in range(num_shards)
+        ]
+    )
+    session.execute(
+        shards.on_conflict_do_update(
+            index_elements=[inventory_shards.c.product_id, inventory_shards.c.shard_id],
+            set_={"inventory": shards.excluded.inventory},
+        )
+    )
+    session.execute(
+        products.update().where(products.c.product_id == product_id).values(inventory=0)
+    )
+
+
+def create_order(cart: Cart) -> int:
+    order = ds.sql_session().execute(
+        orders.insert()
+        .values(order_status=OrderStatus.PENDING.value, checkout_id=DBOS.workflow_id)
+        .returning(*ORDER_UPDATE_COLUMNS)
+    ).one()
+    create_order_items({order.order_id: cart})
+    publish_order_updates([order], created=True)
+    return order.order_id
 
 
-def undo_reserve_inventory() -> None:
+def create_order_items(carts: Dict[int, Cart]) -> None:
+    # Record the lines of each order's cart, by order ID.
     ds.sql_session().execute(
-        products.update()
-        .where(products.c.product_id == WIDGET_ID)
-        .values(inventory=products.c.inventory + 1)
+        order_items.insert().values(
+            [
+                {"order_id": order_id, "product_id": product_id, "quantity": quantity}
+                for order_id, cart in carts.items()
+                for product_id, quantity in cart
+            ]
+        )
     )
 
 
-def create_order() -> int:
-    result = ds.sql_session().execute(
-        orders.insert().values(order_status=OrderStatus.PENDING.value)
+def reserve_and_create_order(cart: Cart) -> Tuple[int, bool]:
+    # Create the order as pending if inventory was reserved for it, or as
+    # cancelled if not.
+    reserved = reserve_inventory(cart)
+    status = OrderStatus.PENDING if reserved else OrderStatus.CANCELLED
+    order = ds.sql_session().execute(
+        orders.insert()
+        .values(
+            order_status=status.value,
+            checkout_id=DBOS.workflow_id,
+            reserved_at=func.now() if reserved else None,
+        )
+        .returning(*ORDER_UPDATE_COLUMNS)
+    ).one()
+    create_order_items({order.order_id: cart})
+    publish_order_updates([order], created=True)
+    return order.order_id, reserved
+
+
+def reserve_and_create_orders(
+    checkouts: List[Tuple[str, Cart]]
+) -> List[Tuple[int, bool]]:
+    # Create orders and reserve inventory for a batch of checkouts in one transaction.
+    session = ds.sql_session()
+    checkout_ids = [checkout_id for checkout_id, _ in checkouts]
+
+    # A checkout whose order was created by an earlier attempt keeps that order,
+    # so retrying a batch never reserves inventory twice.
+    results = {
+        row.checkout_id: (row.order_id, row.order_status != OrderStatus.CANCELLED)
+        for row in session.execute(
+            select(orders.c.checkout_id, orders.c.order_id, orders.c.order_status)
+            .where(orders.c.checkout_id.in_(checkout_ids))
+        )
+    }
+    new_checkouts = {
+        checkout_id: cart
+        for checkout_id, cart in checkouts
+        if checkout_id not in results
+    }
+
+    if new_checkouts:
+        # Reserve inventory for as many of the new orders as possible.
+        reserved = reserve_carts(list(new_checkouts.values()))
+        inserted = session.execute(
+            orders.insert()
+            .values(
+                [
+                    {
+                        "checkout_id": checkout_id,
+                        "order_status": (
+                            OrderStatus.PENDING.value
+                            if is_reserved
+                            else OrderStatus.CANCELLED.value
+                        ),
+                        "reserved_at": func.now() if is_reserved else None,
+                    }
+                    for checkout_id, is_reserved in zip(new_checkouts, reserved)
+                ]
+            )
+            .returning(orders.c.checkout_id, *ORDER_UPDATE_COLUMNS)
+        ).all()
+        create_order_items(
+            {row.order_id: new_checkouts[row.checkout_id] for row in inserted}
+        )
+        publish_order_updates(inserted, created=True)
+        order_ids = {row.checkout_id: row.order_id for row in inserted}
+        for checkout_id, is_reserved in zip(new_checkouts, reserved):
+            results[checkout_id] = (order_ids[checkout_id], is_reserved)
+
+    return [results[checkout_id] for checkout_id in checkout_ids]
+
+
+def reserve_carts(carts: List[Cart]) -> List[bool]:
+    # Reserve inventory for many carts at once, first come, first served. We lock
+    # every product and shard the carts need, decide which carts can be filled,
+    # then write each product's new inventory back with a single statement.
+    session = ds.sql_session()
+    product_ids = sorted({product_id for cart in carts for product_id, _ in cart})
+    product_inventory = dict(
+        session.execute(
+            select(products.c.product_id, products.c.inventory)
+            .where(products.c.product_id.in_(product_ids))
+            .order_by(products.c.product_id)
+            .with_for_update()
+        ).all()
     )
-    return result.inserted_primary_key[0]
+    shards = session.execute(
+        select(
+            inventory_shards.c.product_id,
+            inventory_shards.c.shard_id,
+            inventory_shards.c.inventory,
+        )
+        .where(inventory_shards.c.product_id.in_(product_ids))
+        .order_by(inventory_shards.c.product_id, inventory_shards.c.shard_id)
+        .with_for_update()
+    ).all()
+    available = dict(product_inventory)
+    for shard in shards:
+        available[shard.product_id] += shard.inventory
+
+    reserved = []
+    reserved_units: Dict[int, int] = defaultdict(int)
+    for cart in carts:
+        in_stock = all(available.get(id, 0) >= quantity for id, quantity in cart)
+        if in_stock:
+            for product_id, quantity in cart:
+                available[product_id] -= quantity
+                reserved_units[product_id] += quantity
+        reserved.append(in_stock)
+
+    # Take each product's reserved units from its own row first, then its shards.
+    to_take = dict(reserved_units)
+    new_product_inventory = []
+    for product_id, inventory in product_inventory.items():
+        taken = min(inventory, to_take.get(product_id, 0))
+        if taken > 0:
+            new_product_inventory.append((product_id, inventory - taken))
+            to_take[product_id] -= taken
+    new_shard_inventory = []
+    for shard in shards:
+        taken = min(shard.inventory, to_take.get(shard.product_id, 0))
+        if taken > 0:
+            new_shard_inventory.append(
+                (shard.product_id, shard.shard_id, shard.inventory - taken)
+            )
+            to_take[shard.product_id] -= taken
+
+    if new_product_inventory:
+        new_inventory = values(
+            column("product_id", Integer),
+            column("inventory", Integer),
+            name="new_inventory",
+        ).data(new_product_inventory)
+        session.execute(
+            products.update()
+            .where(products.c.product_id == new_inventory.c.product_id)
+            .values(inventory=new_inventory.c.inventory)
+        )
+    if new_shard_inventory:
+        new_inventory = values(
+            column("product_id", Integer),
+            column("shard_id", Integer),
+            column("inventory", Integer),
+            name="new_inventory",
+        ).data(new_shard_inventory)
+        session.execute(
+            inventory_shards.update()
+            .where(inventory_shards.c.product_id == new_inventory.c.product_id)
+            .where(inventory_shards.c.shard_id == new_inventory.c.shard_id)
+            .values(inventory=new_inventory.c.inventory)
+        )
+    for product_id in reserved_units:
+        invalidate_product(product_id)
+    return reserved
 
 
 def get_order(order_id: int):
+    # Look the order up among both live and archived orders.
     return (
-        ds.sql_session().execute(orders.select().where(orders.c.order_id == order_id))
+        ds.sql_session()
+        .execute(
+            orders.select()
+            .where(orders.c.order_id == order_id)
+            .union_all(
+                orders_archive.select().where(orders_archive.c.order_id == order_id)
+            )
+        )
         .mappings()
         .first()
     )
@@ -174,33 +771,305 @@ def order_endpoint(order_id: int):
     return ds.run_tx_step({"name": "get_order"}, get_order, order_id)
 
 
-def update_order_status(order_id: int, status: int) -> None:
-    ds.sql_session().execute(
-        orders.update().where(orders.c.order_id == order_id).values(order_status=status)
+def update_order_status(
+    order_id: int, status: int, from_status: Optional[int] = None
+) -> bool:
+    # If from_status is given, only update the order if it still has that status.
+    update = orders.update().where(orders.c.order_id == order_id)
+    if from_status is not None:
+        update = update.where(orders.c.order_status == from_status)
+    updated = (
+        ds.sql_session()
+        .execute(
+            update.values(order_status=status, last_update_time=func.now()).returning(
+                *ORDER_UPDATE_COLUMNS
+            )
+        )
+        .all()
+    )
+    publish_order_updates(updated)
+    return len(updated) > 0
+
+
+def cancel_order(order_id: int, cart: Cart) -> bool:
+    # Cancel a pending order and return its inventory. Whichever of the checkout
+    # and the reaper cancels the order first returns the inventory.
+    cancelled = update_order_status(
+        order_id, OrderStatus.CANCELLED.value, from_status=OrderStatus.PENDING.value
     )
+    if cancelled:
+        undo_reserve_inventory(cart)
+    return cancelled
+
+
+# Rather than polling /order/{order_id}, the frontend can watch orders change over
+# Server-Sent Events. Every transaction that changes an order publishes the order's
+# new status and progress, and once it commits, each app process fans the update out
+# to all of its subscribers that are watching that order. Updates for newly created
+# orders are marked as such, so a watcher knows when to list orders again.
+
+ORDER_CHANNEL = "widget_store_orders"
+ORDER_UPDATE_COLUMNS = (
+    orders.c.order_id,
+    orders.c.order_status,
+    orders.c.progress_remaining,
+)
+# Postgres limits NOTIFY payloads to 8000 bytes, so large batches
+# of updates are split across several notifications.
+ORDER_UPDATES_PER_NOTIFICATION = 100
+
+order_broadcaster = Broadcaster()
+
+
+def publish_order_updates(rows, created: bool = False) -> None:
+    updates = [
+        {
+            "order_id": row.order_id,
+            "order_status": row.order_status,
+            "progress_remaining": row.progress_remaining,
+            "created": created,
+        }
+        for row in rows
+    ]
+    for i in range(0, len(updates), ORDER_UPDATES_PER_NOTIFICATION):
+        notifier.publish(
+            ds.sql_session(),
+            ORDER_CHANNEL,
+            json.dumps(updates[i : i + ORDER_UPDATES_PER_NOTIFICATION]),
+        )
 
 
-def get_product():
-    return ds.sql_session().execute(products.select()).mappings().first()
+def broadcast_order_updates(payload: str) -> None:
+    for update in json.loads(payload):
+        order_broadcaster.publish(update["order_id"], update)
+
+
+notifier.subscribe(ORDER_CHANNEL, broadcast_order_updates)
+
+
+# Subscribers can watch specific orders (?order_id=1&order_id=2), which are sent
+# their current state first, or every order.
+
+
+def format_order_event(order, created: bool = False) -> str:
+    update = {column.name: order[column.name] for column in ORDER_UPDATE_COLUMNS}
+    if created:
+        update["created"] = True
+    return f"data: {json.dumps(update)}\n\n"
+
+
+@app.get("/orders/events")
+async def order_events_endpoint(
+    request: Request, order_id: Optional[List[int]] = Query(None)
+):
+    subscription = order_broadcaster.subscribe(order_id)
+
+    async def events():
+        with subscription:
+            for id in order_id or []:
+                order = await asyncio.to_thread(
+                    ds.run_tx_step, {"name": "get_order"}, get_order, id
+                )
+                if order is not None:
+                    yield format_order_event(order)
+            while not await request.is_disconnected():
+                try:
+                    update = await asyncio.wait_for(subscription.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep idle connections open through proxies.
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_order_event(update, update["created"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def products_query() -> Select:
+    # A product's inventory is whatever remains on its row plus all its shards.
+    shard_inventory = (
+        select(func.coalesce(func.sum(inventory_shards.c.inventory), 0))
+        .where(inventory_shards.c.product_id == products.c.product_id)
+        .scalar_subquery()
+    )
+    return select(
+        products.c.product_id,
+        products.c.product,
+        products.c.description,
+        (products.c.inventory + shard_inventory).label("inventory"),
+        products.c.price,
+    )
+
+
+def get_product(product_id: int):
+    return (
+        ds.sql_session()
+        .execute(products_query().where(products.c.product_id == product_id))
+        .mappings()
+        .first()
+    )
+
+
+# Every page load fetches the product, but it only changes when inventory is reserved,
+# returned, or restocked. So, we serve it from a cache, and every transaction that
+# changes a product's inventory invalidates the product once it commits.
+
+
+def invalidate_product(product_id: int) -> None:
+    notifier.publish(ds.sql_session(), PRODUCT_CHANNEL, str(product_id))
+
+
+def load_product(product_id: int):
+    product = ds.run_tx_step({"name": "get_product"}, get_product, product_id)
+    return dict(product) if product is not None else None
 
 
 @app.get("/product")
 def product_endpoint():
-    return ds.run_tx_step({"name": "get_product"}, get_product)
+    return product_cache.get(WIDGET_ID, lambda: load_product(WIDGET_ID))
+
+
+@app.get("/product/{product_id}")
+def product_by_id_endpoint(product_id: int):
+    product = product_cache.get(product_id, lambda: load_product(product_id))
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+
+# The catalog is listed a page at a time in product ID order, using the last
+# product ID on the previous page as the cursor.
+
+
+def get_products(limit: int, after: Optional[int] = None):
+    query = products_query().order_by(products.c.product_id).limit(limit)
+    if after is not None:
+        query = query.where(products.c.product_id > after)
+    return [dict(row) for row in ds.sql_session().execute(query).mappings()]
+
+
+@app.get("/products")
+def products_endpoint(
+    limit: int = Query(100, ge=1, le=1000), after: Optional[int] = None
+):
+    return ds.run_tx_step({"name": "get_products"}, get_products, limit, after)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return {
+        "product_cache": product_cache.stats(),
+        "order_event_subscribers": order_broadcaster.subscriber_count(),
+        "abandoned_checkouts": dict(abandoned_checkout_metrics),
+        "recovery": recovery_monitor.stats(),
+        "archived_orders": archive_metrics["archived_orders"],
+    }
 
 
-def get_orders():
-    rows = ds.sql_session().execute(orders.select())
+# Order history grows forever, so orders are listed a page at a time, most recently
+# updated first: an order's last_update_time is set when it is created and whenever
+# its status changes, though not as a paid order's progress advances. Pages use
+# keyset pagination: the cursor is the (last_update_time, order_id) of the last
+# order on the previous page, so fetching any page is a short index range scan
+# however deep into the history it is. An order whose status changes while a client
+# is paging moves to the front of the history, so the client may miss it. Archived orders are listed
+# too: Postgres merges the live and archived orders' index scans, reading only as
+# far into each as the page needs.
+
+ORDERS_PAGE_SIZE = 100
+
+
+def orders_query(
+    after: Optional[Tuple[datetime, int]] = None,
+    statuses: Optional[List[int]] = None,
+) -> Select:
+    def filtered(table: Table) -> Select:
+        query = table.select()
+        if statuses:
+            query = query.where(table.c.order_status.in_(statuses))
+        if after is not None:
+            query = query.where(
+                tuple_(table.c.last_update_time, table.c.order_id) < tuple_(*after)
+            )
+        return query
+
+    history = union_all(filtered(orders), filtered(orders_archive)).subquery()
+    return select(history).order_by(
+        history.c.last_update_time.desc(), history.c.order_id.desc()
+    )
+
+
+def get_orders(
+    limit: int = ORDERS_PAGE_SIZE,
+    after: Optional[Tuple[datetime, int]] = None,
+    statuses: Optional[List[int]] = None,
+):
+    rows = ds.sql_session().execute(orders_query(after, statuses).limit(limit))
     return [dict(row) for row in rows.mappings()]
 
 
+def encode_cursor(order) -> str:
+    key = f"{order['last_update_time'].isoformat()}|{order['order_id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if cursor is None:
+        return None
+    try:
+        last_update_time, order_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(last_update_time), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# If there are more orders after this page, the cursor for the next page
+# is returned in the X-Next-Cursor header.
+
+
 @app.get("/orders")
-def orders_endpoint():
-    return ds.run_tx_step({"name": "get_orders"}, get_orders)
+def orders_endpoint(
+    response: Response,
+    limit: int = Query(ORDERS_PAGE_SIZE, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[List[OrderStatus]] = Query(None),
+):
+    page = ds.run_tx_step(
+        {"name": "get_orders"}, get_orders, limit, decode_cursor(cursor), status
+    )
+    if len(page) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(page[-1])
+    return page
+
+
+# To export the full order history, this endpoint streams every matching order as
+# newline-delimited JSON. It reads from a server-side cursor outside of any
+# transaction step, so neither the app nor the database buffers the whole result.
+
+
+def stream_orders(statuses: Optional[List[int]]) -> Iterator[str]:
+    with ds.engine.connect() as connection:
+        rows = connection.execution_options(
+            stream_results=True, yield_per=1000
+        ).execute(orders_query(statuses=statuses))
+        for row in rows.mappings():
+            yield json.dumps(jsonable_encoder(dict(row))) + "\n"
+
+
+@app.get("/orders/stream")
+def orders_stream_endpoint(status: Optional[List[OrderStatus]] = Query(None)):
+    return StreamingResponse(
+        stream_orders(status), media_type="application/x-ndjson"
+    )
 
 
 def restock():
-    ds.sql_session().execute(products.update().values(inventory=100))
+    consolidate_inventory(WIDGET_ID, inventory=100)
 
 
 @app.post("/restock")
@@ -209,8 +1078,50 @@ def restock_endpoint():
 
 
 # Now, let's write a workflow to dispatch orders that have been paid for.
-# Every second, it updates the progress of a paid order,
-# then dispatches orders that are fully progressed.
+# It runs every second, updating the progress of every paid order in a single
+# transaction and dispatching orders that are fully progressed. This costs the same
+# handful of durable steps per second however many orders are in flight.
+@DBOS.workflow()
+def dispatch_sweeper_workflow(scheduled_time: datetime, actual_time: datetime):
+    dispatched = ds.run_tx_step({"name": "advance_paid_orders"}, advance_paid_orders)
+    if dispatched:
+        DBOS.logger.info(f"Dispatched orders {dispatched}")
+
+
+def advance_paid_orders() -> List[int]:
+    progress_remaining = orders.c.progress_remaining - 1
+    rows = ds.sql_session().execute(
+        orders.update()
+        .where(orders.c.order_status == OrderStatus.PAID.value)
+        .where(orders.c.progress_remaining > 0)
+        .values(
+            progress_remaining=progress_remaining,
+            order_status=case(
+                (progress_remaining <= 0, OrderStatus.DISPATCHED.value),
+                else_=orders.c.order_status,
+            ),
+            last_update_time=case(
+                (progress_remaining <= 0, func.now()),
+                else_=orders.c.last_update_time,
+            ),
+        )
+        .returning(*ORDER_UPDATE_COLUMNS)
+    ).all()
+    publish_order_updates(rows)
+    return [
+        row.order_id
+        for row in rows
+        if row.order_status == OrderStatus.DISPATCHED.value
+    ]
+
+
+# Alternatively, each paid order can get its own dispatch workflow.
+# Every second, it updates the progress of its order,
+# then dispatches the order once it is fully progressed.
+# Dispatch workflows run on a queue, so each process runs a bounded number at once.
+dispatch_queue = Queue("dispatch-queue", worker_concurrency=DISPATCH_CONCURRENCY)
+
+
 @DBOS.workflow()
 def dispatch_order_workflow(order_id):
     for _ in range(10):
@@ -222,20 +1133,214 @@ def dispatch_order_workflow(order_id):
 
 def update_order_progress(order_id):
     # Update the progress of paid orders.
-    progress_remaining = ds.sql_session().execute(
+    order = ds.sql_session().execute(
         orders.update()
         .where(orders.c.order_id == order_id)
         .values(progress_remaining=orders.c.progress_remaining - 1)
-        .returning(orders.c.progress_remaining)
-    ).scalar_one()
+        .returning(*ORDER_UPDATE_COLUMNS)
+    ).one()
 
     # Dispatch if the order is fully-progressed.
-    if progress_remaining == 0:
-        ds.sql_session().execute(
+    if order.progress_remaining == 0:
+        order = ds.sql_session().execute(
             orders.update()
             .where(orders.c.order_id == order_id)
-            .values(order_status=OrderStatus.DISPATCHED.value)
+            .values(
+                order_status=OrderStatus.DISPATCHED.value, last_update_time=func.now()
+            )
+            .returning(*ORDER_UPDATE_COLUMNS)
+        ).one()
+    publish_order_updates([order])
+
+
+# Customers often abandon checkout without paying. A checkout that times out waiting
+# for payment cancels its own order, but a checkout that stops running first, for
+# example because it failed or was cancelled, leaves its order pending, holding its
+# inventory forever. Every ten seconds, a reaper finds up to REAPER_BATCH_SIZE
+# pending orders whose inventory was reserved more than ABANDONED_ORDER_SECONDS ago,
+# and expires those whose checkout is no longer running: in one transaction, it
+# cancels them all and returns all their inventory. Orders whose checkout is still
+# running, including checkouts waiting to be recovered after a crash, are left to
+# their checkout.
+
+abandoned_checkout_metrics = {
+    "expired_orders": 0,
+    "reclaimed_units": 0,
+}
+
+
+def count_on_commit(metrics: Dict[str, int], **increments: int) -> None:
+    # Add to metrics once the current transaction commits. Metrics are counted in
+    # transaction steps, not workflows: when DBOS recovers a workflow, it replays
+    # the workflow's code, but returns its completed steps' recorded outputs.
+    def add(session) -> None:
+        for name, increment in increments.items():
+            metrics[name] += increment
+
+    event.listen(ds.sql_session(), "after_commit", add, once=True)
+
+
+@DBOS.workflow()
+def reaper_workflow(scheduled_time: datetime, actual_time: datetime):
+    reserved = ds.run_tx_step(
+        {"name": "find_reserved_orders"}, find_reserved_orders, ABANDONED_ORDER_SECONDS
+    )
+    if not reserved:
+        return
+    running = {
+        workflow.workflow_id
+        for workflow in DBOS.list_workflows(
+            workflow_ids=[id for _, id in reserved if id is not None],
+            status=["PENDING", "ENQUEUED"],
+            load_input=False,
+            load_output=False,
         )
+    }
+    abandoned = [order_id for order_id, id in reserved if id not in running]
+    if not abandoned:
+        return
+    expired, reclaimed_units = ds.run_tx_step(
+        {"name": "expire_orders"}, expire_orders, abandoned
+    )
+    if expired:
+        DBOS.logger.info(
+            f"Expired {expired} abandoned orders,"
+            f" reclaiming {reclaimed_units} units of inventory"
+        )
+
+
+def find_reserved_orders(
+    older_than_seconds: float, limit: int = REAPER_BATCH_SIZE
+) -> List[Tuple[int, Optional[str]]]:
+    # The (order_id, checkout_id) of pending orders reserved before the cutoff
+    rows = ds.sql_session().execute(
+        select(orders.c.order_id, orders.c.checkout_id)
+        .where(orders.c.order_status == OrderStatus.PENDING.value)
+        .where(
+            orders.c.reserved_at < func.now() - timedelta(seconds=older_than_seconds)
+        )
+        .order_by(orders.c.reserved_at)
+        .limit(limit)
+    )
+    return [(row.order_id, row.checkout_id) for row in rows]
+
+
+def expire_orders(order_ids: List[int]) -> Tuple[int, int]:
+    # Cancel those of these orders that are still pending and return their reserved
+    # inventory. Orders locked by a checkout that is paying for them right now are
+    # skipped.
+    session = ds.sql_session()
+    stale = (
+        select(orders.c.order_id)
+        .where(orders.c.order_id.in_(order_ids))
+        .where(orders.c.order_status == OrderStatus.PENDING.value)
+        .where(orders.c.reserved_at.is_not(None))
+        .with_for_update(skip_locked=True)
+    )
+    expired = session.execute(
+        orders.update()
+        .where(orders.c.order_id.in_(stale.scalar_subquery()))
+        .values(order_status=OrderStatus.CANCELLED.value, last_update_time=func.now())
+        .returning(*ORDER_UPDATE_COLUMNS)
+    ).all()
+    if not expired:
+        return 0, 0
+    publish_order_updates(expired)
+
+    # Return the inventory of every expired order at once. Orders placed before
+    # carts existed have no items, and were always for a single widget.
+    expired_ids = [row.order_id for row in expired]
+    items = session.execute(
+        select(order_items.c.order_id, order_items.c.product_id, order_items.c.quantity)
+        .where(order_items.c.order_id.in_(expired_ids))
+    ).all()
+    quantities: Dict[int, int] = defaultdict(int)
+    for item in items:
+        quantities[item.product_id] += item.quantity
+    without_items = set(expired_ids) - {item.order_id for item in items}
+    if without_items:
+        quantities[WIDGET_ID] += len(without_items)
+    undo_reserve_inventory(normalize_cart(list(quantities.items())))
+
+    reclaimed_units = sum(quantities.values())
+    count_on_commit(
+        abandoned_checkout_metrics,
+        expired_orders=len(expired),
+        reclaimed_units=reclaimed_units,
+    )
+    return len(expired), reclaimed_units
+
+
+# Every hour, an archiver moves orders that were dispatched or cancelled more than
+# ARCHIVE_AFTER_DAYS ago, along with their order lines, from the live tables to the
+# archive. It moves ARCHIVE_BATCH_SIZE orders per transaction, so no transaction
+# holds many locks for long, until none are left to move. Archived orders are still
+# found by /order/{order_id}, /orders, and /orders/stream.
+
+archive_metrics = {"archived_orders": 0}
+
+
+@DBOS.workflow()
+def archive_workflow(scheduled_time: datetime, actual_time: datetime):
+    archived = 0
+    while True:
+        batch = ds.run_tx_step(
+            {"name": "archive_orders"}, archive_orders, ARCHIVE_AFTER_DAYS
+        )
+        archived += batch
+        if batch < ARCHIVE_BATCH_SIZE:
+            break
+    if archived:
+        DBOS.logger.info(f"Archived {archived} orders")
+
+
+def archive_orders(older_than_days: float, limit: int = ARCHIVE_BATCH_SIZE) -> int:
+    # Move a batch of old, finished orders and their order lines to the archive.
+    session = ds.sql_session()
+    order_ids = (
+        session.execute(
+            select(orders.c.order_id)
+            .where(
+                orders.c.order_status.in_(
+                    [OrderStatus.DISPATCHED.value, OrderStatus.CANCELLED.value]
+                )
+            )
+            .where(
+                orders.c.last_update_time
+                < func.now() - timedelta(days=older_than_days)
+            )
+            .order_by(orders.c.last_update_time)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        .scalars()
+        .all()
+    )
+    if not order_ids:
+        return 0
+    session.execute(
+        insert(orders_archive).from_select(
+            list(orders.c.keys()),
+            orders.select().where(orders.c.order_id.in_(order_ids)),
+        )
+    )
+    session.execute(
+        insert(order_items_archive).from_select(
+            list(order_items.c.keys()),
+            order_items.select().where(order_items.c.order_id.in_(order_ids)),
+        )
+    )
+    session.execute(order_items.delete().where(order_items.c.order_id.in_(order_ids)))
+    session.execute(orders.delete().where(orders.c.order_id.in_(order_ids)))
+    count_on_commit(archive_metrics, archived_orders=len(order_ids))
+    return len(order_ids)
+
+
+# After a crash, every checkout and dispatch workflow the app left pending must be
+# recovered. DBOS recovers them when the app launches again, and the recovery
+# monitor reports its progress in /metrics.
+
+recovery_monitor = RecoveryMonitor()
 
 
 # Next, let's serve the app's frontend from an HTML file using FastAPI.
@@ -259,7 +1364,19 @@ def crash_application():
 
 # Finally, configure and launch DBOS, then launch the FastAPI server.
 
-if __name__ == "__main__":
+# By default, the app runs as a single process serving WIDGET_STORE_PORT. Set
+# WIDGET_STORE_PROCESSES to run that many app processes instead, each serving its own
+# port counting up from WIDGET_STORE_PORT, behind a load balancer of your choice.
+# The processes share nothing but the database: each has its own executor ID
+# (WIDGET_STORE_EXECUTOR_ID plus its index) so after a crash it recovers only its
+# own workflows, and product cache invalidations and order updates reach every
+# process through Postgres LISTEN/NOTIFY. A process that crashes is restarted.
+PROCESSES = int(os.environ.get("WIDGET_STORE_PROCESSES", "1"))
+PORT = int(os.environ.get("WIDGET_STORE_PORT", "8000"))
+
+
+def serve(port: int, executor_id: str, listen_notify: bool) -> None:
+    global ds
     database_url = os.environ.get("DBOS_DATABASE_URL")
     if database_url is None:
         raise Exception("DBOS_DATABASE_URL not set")
@@ -268,7 +1385,58 @@ if __name__ == "__main__":
         "name": "widget-store",
         "application_version": "0.1.0",
         "system_database_url": database_url,
+        "executor_id": executor_id,
     }
     DBOS(config=config)
+    # Only run the dispatch sweeper if it is in charge of dispatching orders.
+    if DISPATCH_MODE == "sweeper":
+        DBOS.scheduled("* * * * * *")(dispatch_sweeper_workflow)
+    DBOS.scheduled("*/10 * * * * *")(reaper_workflow)
+    DBOS.scheduled("0 * * * *")(archive_workflow)
+    # Create DBOS's system tables if this is the first launch, so the recovery
+    # monitor can look for workflows to recover before DBOS launches.
+    run_dbos_database_migrations(database_url)
+    recovery_monitor.start(
+        database_url, config["name"], executor_id, config["application_version"]
+    )
     DBOS.launch()
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if listen_notify:
+        notifier.listen(database_url)
+    # Spread the widget's inventory across the configured number of shards
+    # (or gather it back onto the product row if sharding was turned off).
+    ds.run_tx_step({"name": "consolidate_inventory"}, consolidate_inventory, WIDGET_ID)
+    uvicorn.run(app, host="0.0.0.0", port=port)
+
+
+def supervise(processes: int) -> None:
+    # Run each app process in a fresh interpreter, restarting any that exits.
+    context = multiprocessing.get_context("spawn")
+
+    def start(index: int) -> multiprocessing.process.BaseProcess:
+        process = context.Process(
+            target=serve,
+            args=(PORT + index, f"{EXECUTOR_ID}-{index}", True),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    workers = [start(index) for index in range(processes)]
+    # Exiting on SIGTERM stops the app processes too, as they are daemons.
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    while True:
+        time.sleep(1)
+        for index, worker in enumerate(workers):
+            if not worker.is_alive():
+                DBOS.logger.warning(
+                    f"App process {index} exited with code {worker.exitcode},"
+                    " restarting"
+                )
+                workers[index] = start(index)
+
+
+if __name__ == "__main__":
+    if PROCESSES > 1:
+        supervise(PROCESSES)
+    else:
+        serve(PORT, EXECUTOR_ID, USE_LISTEN_NOTIFY)
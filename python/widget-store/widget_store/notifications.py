@@ -0,0 +1,76 @@
+# Notifications about committed changes, such as "this product's inventory changed".
+
+# Transactions publish notifications as they make changes, and they are delivered to
+# subscribers only once (and only if) the transaction commits. By default, delivery
+# stays inside this process. When several app processes share a database, call
+# `listen` so notifications go through Postgres LISTEN/NOTIFY and reach every process.
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import psycopg
+from sqlalchemy import event, func, make_url, select
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class Notifier:
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+        self._listener: Optional[threading.Thread] = None
+
+    @property
+    def listening(self) -> bool:
+        return self._listener is not None
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._subscribers[channel].append(callback)
+
+    def publish(self, session: Session, channel: str, payload: str) -> None:
+        # Deliver the notification once the session's transaction commits.
+        if self.listening:
+            # Postgres delivers NOTIFY to listeners (including us) on commit.
+            session.execute(select(func.pg_notify(channel, payload)))
+        else:
+            event.listen(
+                session,
+                "after_commit",
+                lambda _: self._deliver(channel, payload),
+                once=True,
+            )
+
+    def listen(self, database_url: str) -> None:
+        # Start a background thread that LISTENs on every subscribed channel.
+        conninfo = make_url(database_url).set(drivername="postgresql")
+        self._listener = threading.Thread(
+            target=self._listen,
+            args=(conninfo.render_as_string(hide_password=False),),
+            daemon=True,
+        )
+        self._listener.start()
+
+    def _listen(self, conninfo: str) -> None:
+        while True:
+            try:
+                with psycopg.connect(conninfo, autocommit=True) as connection:
+                    for channel in self._subscribers:
+                        connection.execute(f'LISTEN "{channel}"')
+                    for notify in connection.notifies():
+                        self._deliver(notify.channel, notify.payload)
+            except Exception as e:
+                # Notifications sent while disconnected are lost, so subscribers
+                # must tolerate missed notifications (for example, caches expire).
+                logger.warning(f"Notification listener disconnected: {e}")
+                time.sleep(1)
+
+    def _deliver(self, channel: str, payload: str) -> None:
+        for callback in self._subscribers.get(channel, []):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"Error handling notification on {channel}: {e}")
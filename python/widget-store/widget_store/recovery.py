@@ -0,0 +1,108 @@
+# Reporting the recovery of the workflows a crashed app process left pending.
+
+# When DBOS launches, it recovers every pending workflow of its executor ID from
+# earlier launches, returning each to the queue it ran on, or to DBOS's internal
+# queue if it ran on none, to run again. The app keeps its executor ID across
+# launches so this happens, and bounds recovery with queues: checkouts run on no
+# queue, so they are recovered at once (a recovered checkout replays its checkpointed
+# steps and goes back to waiting for payment), while dispatch workflows run on a
+# queue that limits how many run at once, so they are recovered a few at a time.
+
+# The recovery monitor tracks that progress. Just before launch, it notes the
+# workflows DBOS is about to recover. Each counts as recovered once it has been
+# dequeued again since, or is no longer pending at all.
+
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+from dbos import DBOS, DBOSClient
+
+
+class RecoveryMonitor:
+
+    def __init__(self) -> None:
+        # The name and last dequeue time of each workflow left pending, by ID
+        self.pending: Dict[str, Tuple[str, Optional[int]]] = {}
+        self.recovered: Set[str] = set()
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        system_database_url: str,
+        app_name: str,
+        executor_id: str,
+        app_version: str,
+    ) -> None:
+        # Note the workflows DBOS will recover when this executor launches. Call this
+        # just before DBOS.launch.
+        self._started_at = time.monotonic()
+        client = DBOSClient(
+            system_database_url=system_database_url, application_name=app_name
+        )
+        try:
+            workflows = client.list_workflows(
+                status="PENDING",
+                executor_id=executor_id,
+                app_version=app_version,
+                load_input=False,
+                load_output=False,
+            )
+        finally:
+            client.destroy()
+        with self._lock:
+            self.pending = {
+                workflow.workflow_id: (workflow.name, workflow.dequeued_at)
+                for workflow in workflows
+            }
+        if workflows:
+            DBOS.logger.info(f"Recovering {len(workflows)} workflows")
+        else:
+            self._finished_at = self._started_at
+
+    def check(self) -> None:
+        # Count the workflows recovered since the last check
+        with self._lock:
+            if self._started_at is None or self._finished_at is not None:
+                return
+            recovering = [
+                workflow_id
+                for workflow_id in self.pending
+                if workflow_id not in self.recovered
+            ]
+            unrecovered = {
+                workflow.workflow_id
+                for workflow in DBOS.list_workflows(
+                    workflow_ids=recovering,
+                    status=["ENQUEUED", "PENDING"],
+                    load_input=False,
+                    load_output=False,
+                )
+                if workflow.status == "ENQUEUED"
+                or workflow.dequeued_at == self.pending[workflow.workflow_id][1]
+            }
+            self.recovered.update(set(recovering) - unrecovered)
+            if not unrecovered:
+                self._finished_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        self.check()
+        with self._lock:
+            by_workflow: Dict[str, Dict[str, int]] = {}
+            for workflow_id, (name, _) in self.pending.items():
+                counts = by_workflow.setdefault(name, {"pending": 0, "recovered": 0})
+                counts["pending"] += 1
+                counts["recovered"] += workflow_id in self.recovered
+        if self._started_at is None:
+            seconds = 0.0
+        else:
+            seconds = (self._finished_at or time.monotonic()) - self._started_at
+        return {
+            "pending": len(self.pending),
+            "recovered": len(self.recovered),
+            "finished": self._finished_at is not None,
+            "seconds": round(seconds, 2),
+            "by_workflow": by_workflow,
+        }
@@ -1,13 +1,32 @@
 from datetime import datetime
 from decimal import Decimal
 from enum import IntEnum
-from typing import TypedDict
+from typing import Optional, TypedDict
 
-from sqlalchemy import DECIMAL, Column, DateTime, Integer, MetaData, String, Table, Text
+from sqlalchemy import (
+    DECIMAL,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+)
 from sqlalchemy.sql import func
 
 metadata = MetaData()
 
+
+class OrderStatus(IntEnum):
+    CANCELLED = -1
+    PENDING = 0
+    DISPATCHED = 1
+    PAID = 2
+
+
 products = Table(
     "products",
     metadata,
@@ -23,8 +42,99 @@ orders = Table(
     metadata,
     Column("order_id", Integer, primary_key=True, autoincrement=True),
     Column("order_status", Integer, nullable=False),
+    # When the order was created or last changed status
     Column("last_update_time", DateTime, nullable=False, server_default=func.now()),
     Column("progress_remaining", Integer, nullable=False, server_default="10"),
+    # The ID of the checkout workflow that created the order
+    Column("checkout_id", String(255), unique=True),
+    # When the order's inventory was reserved, or NULL if it never was
+    Column("reserved_at", DateTime),
+)
+
+# The dispatch sweeper updates every paid order each second. This partial index
+# lets it find them without scanning the whole order history.
+Index(
+    "ix_orders_paid",
+    orders.c.order_id,
+    postgresql_where=orders.c.order_status == OrderStatus.PAID.value,
+)
+
+# Orders are listed most recently updated first, optionally filtered by status.
+Index("ix_orders_last_update_time", orders.c.last_update_time, orders.c.order_id)
+Index(
+    "ix_orders_status_last_update_time",
+    orders.c.order_status,
+    orders.c.last_update_time,
+    orders.c.order_id,
+)
+
+# A hot product's inventory can be split across several sub-counter rows ("shards")
+# so concurrent checkouts decrement different rows instead of queueing on one lock.
+# A product's total inventory is its own inventory plus the sum of its shards.
+inventory_shards = Table(
+    "inventory_shards",
+    metadata,
+    Column(
+        "product_id",
+        Integer,
+        ForeignKey("products.product_id"),
+        primary_key=True,
+    ),
+    Column("shard_id", Integer, primary_key=True),
+    Column("inventory", Integer, nullable=False),
+)
+
+
+# The products in each order, one line per product. A product's order lines are
+# indexed so they can be found without scanning every order.
+order_items = Table(
+    "order_items",
+    metadata,
+    Column("order_id", Integer, ForeignKey("orders.order_id"), primary_key=True),
+    Column("product_id", Integer, ForeignKey("products.product_id"), primary_key=True),
+    Column("quantity", Integer, nullable=False),
+)
+
+Index("ix_order_items_product_id", order_items.c.product_id)
+
+# Orders that were dispatched or cancelled long ago are moved out of the orders table
+# into an archive with the same columns, along with their order lines, so the live
+# tables (and their indexes) only hold recent and in-progress orders.
+orders_archive = Table(
+    "orders_archive",
+    metadata,
+    Column("order_id", Integer, primary_key=True, autoincrement=False),
+    Column("order_status", Integer, nullable=False),
+    Column("last_update_time", DateTime, nullable=False),
+    Column("progress_remaining", Integer, nullable=False),
+    Column("checkout_id", String(255)),
+    Column("reserved_at", DateTime),
+)
+
+# Like live orders, archived orders are listed most recently updated first.
+Index(
+    "ix_orders_archive_last_update_time",
+    orders_archive.c.last_update_time,
+    orders_archive.c.order_id,
+)
+Index(
+    "ix_orders_archive_status_last_update_time",
+    orders_archive.c.order_status,
+    orders_archive.c.last_update_time,
+    orders_archive.c.order_id,
+)
+
+order_items_archive = Table(
+    "order_items_archive",
+    metadata,
+    Column(
+        "order_id",
+        Integer,
+        ForeignKey("orders_archive.order_id"),
+        primary_key=True,
+    ),
+    Column("product_id", Integer, ForeignKey("products.product_id"), primary_key=True),
+    Column("quantity", Integer, nullable=False),
 )
 
 
@@ -40,10 +150,12 @@ class order(TypedDict):
     order_id: int
     order_status: int
     last_update_time: datetime
+    progress_remaining: int
+    checkout_id: Optional[str]
+    reserved_at: Optional[datetime]
 
 
-class OrderStatus(IntEnum):
-    CANCELLED = -1
-    PENDING = 0
-    DISPATCHED = 1
-    PAID = 2
+class order_item(TypedDict):
+    order_id: int
+    product_id: int
+    quantity: int